@@ -18,64 +18,13 @@ class Base(DeclarativeBase):
 
 db = SQLAlchemy(model_class=Base)
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "laari-archaeological-secret-key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure the database
-database_url = os.environ.get("DATABASE_URL", "sqlite:///laari.db")
-
-# Railway PostgreSQL URL fix
-if database_url and database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-
-if database_url.startswith("sqlite"):
-    database_url += "?charset=utf8mb4"
-    
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-    "connect_args": {"charset": "utf8mb4"} if database_url.startswith("sqlite") else {}
-}
-
-# Configure upload settings (Replit-optimized)
-upload_folder = os.path.join(os.getcwd(), 'static', 'uploads')
-os.makedirs(upload_folder, exist_ok=True)
-# Create all upload subdirectories
-upload_subdirs = ['photos', '3d_models', 'profiles', '3d_scans', 'gallery']
-for subdir in upload_subdirs:
-    os.makedirs(os.path.join(upload_folder, subdir), exist_ok=True)
-
-app.config['UPLOAD_FOLDER'] = upload_folder
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Disable cache in development for immediate updates
-app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
-
-# Add cache control headers
-@app.after_request
-def add_header(response):
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '-1'
-    return response
-
-# Initialize extensions
-db.init_app(app)
+# Extensions are created unbound and attached to the app in create_app()
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Por favor, faça login para acessar esta página.'
 
-# Initialize CSRF protection
 csrf = CSRFProtect()
-csrf.init_app(app)
-
-# Initialize Babel
 babel = Babel()
-babel.init_app(app)
 
 # Supported languages
 LANGUAGES = {
@@ -93,10 +42,15 @@ def get_locale():
     return request.accept_languages.best_match(LANGUAGES.keys()) or 'pt'
 
 
-# Configure Babel
-app.config['LANGUAGES'] = LANGUAGES
-app.config['BABEL_DEFAULT_LOCALE'] = 'pt'
-app.config['BABEL_DEFAULT_TIMEZONE'] = 'UTC'
+# Add cache control headers
+def add_header(response):
+    # Responses that opt into public caching (e.g. the gallery API with its ETag) keep their own policy
+    if response.cache_control.public:
+        return response
+    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '-1'
+    return response
 
 # Simple translation function for demo (replacing full Babel)
 def simple_translate(text, lang=None):
@@ -407,7 +361,6 @@ def simple_translate(text, lang=None):
     return text
 
 # Template context processor to make gettext available in templates
-@app.context_processor
 def inject_conf_vars():
     return {
         'LANGUAGES': LANGUAGES,
@@ -417,7 +370,6 @@ def inject_conf_vars():
     }
 
 # Template filter to get proper image URL
-@app.template_filter('image_url')
 def image_url_filter(path, default='/static/images/default-placeholder.svg'):
     """
     Convert storage path/URL to a displayable image URL.
@@ -454,7 +406,16 @@ def image_url_filter(path, default='/static/images/default-placeholder.svg'):
     
     return default
 
-@app.template_filter('file_url')
+def resized_image_filter(path, size='card', default='/static/images/default-placeholder.svg'):
+    """
+    Convert storage path/URL to an image URL scaled down for a display context.
+    Usage: {{ photo.image_path|resized_image('card') }} with size thumb, card or detail.
+    Cloudinary URLs get a width/f_auto/q_auto transformation; local uploads go through
+    the /imagem/<size>/ resize-and-cache endpoint.
+    """
+    from storage import resized_display_url
+    return resized_display_url(image_url_filter(path, default), size)
+
 def file_url_filter(path):
     """
     Convert storage path/URL to a direct file URL.
@@ -478,57 +439,150 @@ def file_url_filter(path):
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    from auth_cache import load_cached_user
+    return load_cached_user(int(user_id))
+
+
+def create_app():
+    """
+    Create and configure the Flask application.
+
+    No database I/O happens here, so gunicorn workers boot without DDL
+    round-trips. Schema creation and admin seeding are the `init-db` and
+    `seed-admins` CLI commands.
+    """
+    flask_app = Flask(__name__)
+    flask_app.secret_key = os.environ.get("SESSION_SECRET", "laari-archaeological-secret-key")
+    flask_app.wsgi_app = ProxyFix(flask_app.wsgi_app, x_proto=1, x_host=1)
+
+    # Configure the database
+    database_url = os.environ.get("DATABASE_URL", "sqlite:///laari.db")
+
+    # Railway PostgreSQL URL fix
+    if database_url and database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    if database_url.startswith("sqlite"):
+        database_url += "?charset=utf8mb4"
 
-# Create database tables and admin user
-with app.app_context():
-    # Import models
+    flask_app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+        "connect_args": {"charset": "utf8mb4"} if database_url.startswith("sqlite") else {}
+    }
+
+    # Configure upload settings (Replit-optimized)
+    upload_folder = os.path.join(os.getcwd(), 'static', 'uploads')
+    os.makedirs(upload_folder, exist_ok=True)
+    # Create all upload subdirectories
+    upload_subdirs = ['photos', '3d_models', 'profiles', '3d_scans', 'gallery']
+    for subdir in upload_subdirs:
+        os.makedirs(os.path.join(upload_folder, subdir), exist_ok=True)
+
+    flask_app.config['UPLOAD_FOLDER'] = upload_folder
+    flask_app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # Artifact photos are resized in the browser (and re-checked on the server) to this size/quality
+    flask_app.config['PHOTO_MAX_DIMENSION'] = int(os.environ.get('PHOTO_MAX_DIMENSION', 2048))
+    flask_app.config['PHOTO_JPEG_QUALITY'] = int(os.environ.get('PHOTO_JPEG_QUALITY', 82))
+
+    # Disable cache in development for immediate updates
+    flask_app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+    flask_app.after_request(add_header)
+
+    # Configure Babel
+    flask_app.config['LANGUAGES'] = LANGUAGES
+    flask_app.config['BABEL_DEFAULT_LOCALE'] = 'pt'
+    flask_app.config['BABEL_DEFAULT_TIMEZONE'] = 'UTC'
+
+    # Initialize extensions
+    db.init_app(flask_app)
+    login_manager.init_app(flask_app)
+    csrf.init_app(flask_app)
+    babel.init_app(flask_app)
+
+    flask_app.context_processor(inject_conf_vars)
+    flask_app.add_template_filter(image_url_filter, 'image_url')
+    flask_app.add_template_filter(resized_image_filter, 'resized_image')
+    flask_app.add_template_filter(file_url_filter, 'file_url')
+
+    return flask_app
+
+
+def init_db():
+    """Create all database tables (run via `flask init-db`)."""
     import models
     db.create_all()
-    
-    # Create admin user if configured via environment variables
+
+
+def seed_admin_users():
+    """
+    Create admin users configured through environment variables (run via `flask seed-admins`).
+
+    ADMIN_EMAIL/ADMIN_PASSWORD/ADMIN_USERNAME define the main admin.
+    Additional admins use the format:
+    ADMIN_USERS_JSON='[{"username":"Name","email":"email@example.com","password":"pass"}]'
+
+    Returns:
+        list: Usernames of the admins created
+    """
+    import json
     from models import User
     from werkzeug.security import generate_password_hash
-    
+
+    admins = []
+
     admin_email = os.environ.get('ADMIN_EMAIL')
     admin_password = os.environ.get('ADMIN_PASSWORD')
-    
     if admin_email and admin_password:
-        admin = User.query.filter_by(email=admin_email).first()
-        if not admin:
-            admin_user = User(
-                username=os.environ.get('ADMIN_USERNAME', 'Admin'),
-                email=admin_email,
-                password_hash=generate_password_hash(admin_password),
-                is_admin=True
-            )
-            db.session.add(admin_user)
-            db.session.commit()
-            logging.info("Admin user created from environment variables")
-    
-    # Create additional admin users from environment variables
-    # Format: ADMIN_USERS_JSON='[{"username":"Name","email":"email@example.com","password":"pass"}]'
-    import json
+        admins.append({
+            'username': os.environ.get('ADMIN_USERNAME', 'Admin'),
+            'email': admin_email,
+            'password': admin_password
+        })
+
     admin_users_json = os.environ.get('ADMIN_USERS_JSON')
-    
     if admin_users_json:
         try:
-            additional_admins = json.loads(admin_users_json)
-            for admin_data in additional_admins:
-                existing_admin = User.query.filter_by(email=admin_data['email']).first()
-                if not existing_admin:
-                    new_admin = User(
-                        username=admin_data['username'],
-                        email=admin_data['email'],
-                        password_hash=generate_password_hash(admin_data['password']),
-                        is_admin=True
-                    )
-                    db.session.add(new_admin)
-                    db.session.commit()
-                    logging.info(f"Admin user {admin_data['username']} created")
+            admins.extend(json.loads(admin_users_json))
         except json.JSONDecodeError:
             logging.error("Invalid ADMIN_USERS_JSON format")
 
+    if not admins:
+        return []
+
+    # One lookup for every configured email, one commit for every new admin
+    existing_emails = {
+        email for (email,) in db.session.query(User.email).filter(
+            User.email.in_([admin_data['email'] for admin_data in admins])
+        )
+    }
+
+    created = []
+    for admin_data in admins:
+        if admin_data['email'] in existing_emails:
+            continue
+        db.session.add(User(
+            username=admin_data['username'],
+            email=admin_data['email'],
+            password_hash=generate_password_hash(admin_data['password']),
+            is_admin=True
+        ))
+        existing_emails.add(admin_data['email'])
+        created.append(admin_data['username'])
+
+    if created:
+        db.session.commit()
+        for username in created:
+            logging.info(f"Admin user {username} created")
+
+    return created
+
+
+app = create_app()
+
 # Import routes
 import routes
+
+# Register CLI commands
+import cli
@@ -0,0 +1,92 @@
+"""
+Per-worker identity cache for Flask-Login.
+
+load_user only needs the columns used for authentication and permission checks,
+so it selects those few columns and keeps them for AUTH_CACHE_TTL seconds instead
+of loading the full User row on every request. Admin actions that change status,
+roles or CV/institution approval call invalidate(); other workers pick the change
+up when their entry expires.
+"""
+import os
+import threading
+import time
+
+from flask_login import UserMixin
+
+from app import db
+from models import User
+
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 30))
+AUTH_CACHE_MAX_ENTRIES = 5000
+
+# Columns read through current_user in routes and templates
+AUTH_COLUMNS = ('id', 'username', 'email', 'is_admin', 'is_active_user',
+                'account_type', 'cv_status', 'institution_status')
+
+_entries = {}
+_lock = threading.Lock()
+
+
+class CachedUser(UserMixin):
+    """Read-only identity built from the cached auth columns of a User.
+
+    Attributes outside AUTH_COLUMNS fall back to loading the full User row once
+    for the current request.
+    """
+
+    def __init__(self, values):
+        self.__dict__.update(zip(AUTH_COLUMNS, values))
+
+    # Same permission rule as the model
+    can_catalog_artifacts = User.can_catalog_artifacts
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        full_user = self.__dict__.get('_full_user')
+        if full_user is None:
+            full_user = db.session.get(User, self.__dict__['id'])
+            self.__dict__['_full_user'] = full_user
+        return getattr(full_user, name)
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+def load_cached_user(user_id):
+    """
+    Return a CachedUser for Flask-Login, hitting the database at most once per TTL.
+
+    Args:
+        user_id: Id stored in the login session
+
+    Returns:
+        CachedUser, or None if the user no longer exists
+    """
+    now = time.monotonic()
+    entry = _entries.get(user_id)
+    if entry and entry[0] > now:
+        return CachedUser(entry[1])
+
+    values = db.session.execute(
+        db.select(*(getattr(User, column) for column in AUTH_COLUMNS)).where(User.id == user_id)
+    ).first()
+    if values is None:
+        invalidate(user_id)
+        return None
+
+    with _lock:
+        if len(_entries) >= AUTH_CACHE_MAX_ENTRIES:
+            _entries.clear()
+        _entries[user_id] = (now + AUTH_CACHE_TTL, tuple(values))
+    return CachedUser(values)
+
+
+def invalidate(*user_ids):
+    """Drop cached identities, e.g. after an admin changes status, role or approval"""
+    with _lock:
+        for user_id in user_ids:
+            _entries.pop(user_id, None)
@@ -0,0 +1,174 @@
+"""
+Flask CLI commands for L.A.A.R.I maintenance tasks.
+Run with `flask --app app <command>`.
+"""
+import os
+import subprocess
+import sys
+
+import click
+
+from app import app
+
+# Modules that should only load on first use, never at application import
+LAZY_MODULES = ['cloudinary', 'qrcode', 'PIL', 'pandas', 'openpyxl', 'pyarrow', 'numpy']
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create database tables. Run once per deploy, before starting workers."""
+    from app import init_db
+
+    init_db()
+    click.echo('Tabelas do banco de dados criadas/verificadas.')
+
+
+@app.cli.command('seed-admins')
+def seed_admins_command():
+    """Create admin users from ADMIN_EMAIL/ADMIN_PASSWORD and ADMIN_USERS_JSON."""
+    from app import seed_admin_users
+
+    created = seed_admin_users()
+    if created:
+        click.echo(f'Administradores criados: {", ".join(created)}')
+    else:
+        click.echo('Nenhum administrador novo a criar.')
+
+
+@app.cli.command('run-maintenance')
+@click.option('--job', help='Run only this job (default: all registered jobs).')
+def run_maintenance_command(job):
+    """Run scheduled maintenance jobs once, e.g. from cron when SCHEDULER_ENABLED=0."""
+    from scheduler import maintenance_scheduler
+
+    if job and job not in maintenance_scheduler.jobs:
+        raise click.ClickException(f'Tarefa desconhecida: {job}. Disponíveis: {", ".join(maintenance_scheduler.jobs)}')
+
+    results = maintenance_scheduler.run_pending(force=True, only=job)
+    for name, result in results.items():
+        click.echo(f'{name}: {result}')
+
+
+@app.cli.command('import-report')
+@click.option('--module', default='main', show_default=True, help='Module to import, as gunicorn workers do.')
+@click.option('--top', type=int, default=15, show_default=True, help='Number of slowest modules to list.')
+@click.option('--max-ms', type=float, help='Exit with an error if the total import time exceeds this many milliseconds.')
+def import_report_command(module, top, max_ms):
+    """Report cold-start import time using python -X importtime in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True,
+        env=dict(os.environ),
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise click.ClickException(f'Falha ao importar {module}:\n{result.stderr[-2000:]}')
+
+    # Lines look like "import time: <self us> | <cumulative us> | <indented module name>"
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        timings.append((int(parts[1]), int(parts[0]), parts[2].strip()))
+
+    target = next((t for t in timings if t[2] == module), None)
+    total_ms = (target[0] if target else sum(t[1] for t in timings)) / 1000
+
+    click.echo(f'Tempo de importação de {module}: {total_ms:.1f} ms')
+    click.echo(f'{"cumulativo (ms)":>16}  {"próprio (ms)":>12}  módulo')
+    # Top-level packages (flask, sqlalchemy, routes, storage, ...) show where cold-start time goes
+    candidates = [t for t in timings if '.' not in t[2] and t[2] != module]
+    for cumulative, own, name in sorted(candidates, key=lambda t: t[0], reverse=True)[:top]:
+        click.echo(f'{cumulative / 1000:>16.1f}  {own / 1000:>12.1f}  {name}')
+
+    loaded_lazy = sorted({t[2].split('.')[0] for t in timings} & set(LAZY_MODULES))
+    if loaded_lazy:
+        click.echo(f'Aviso: módulos pesados carregados na importação: {", ".join(loaded_lazy)}', err=True)
+
+    if max_ms is not None and total_ms > max_ms:
+        raise click.ClickException(f'Tempo de importação {total_ms:.1f} ms excede o limite de {max_ms:.1f} ms')
+
+
+@app.cli.command('export-artifacts')
+@click.option('--format', 'export_format', type=click.Choice(['csv', 'jsonl', 'xlsx']), default='csv', show_default=True)
+@click.option('--output', '-o', type=click.Path(dir_okay=False), help='Output file (defaults to stdout for CSV/JSONL).')
+@click.option('--search', help='Filter by artifact name (case-insensitive substring).')
+@click.option('--artifact-type', help='Filter by artifact type (ceramica, litico, ...).')
+@click.option('--conservation-state', help='Filter by conservation state (excelente, bom, ...).')
+def export_artifacts_command(export_format, output, search, artifact_type, conservation_state):
+    """Export the artifact collection, streaming rows from a server-side cursor."""
+    from exports import build_artifact_export_query, iter_rows, generate_csv, generate_jsonl, write_xlsx
+
+    stmt = build_artifact_export_query(
+        search=search,
+        artifact_type=artifact_type,
+        conservation_state=conservation_state
+    )
+    rows = iter_rows(stmt)
+
+    if export_format == 'xlsx':
+        if not output:
+            raise click.UsageError('XLSX export requires --output.')
+        write_xlsx(rows, output)
+        click.echo(f'Acervo exportado para {output}', err=True)
+        return
+
+    generator = generate_csv if export_format == 'csv' else generate_jsonl
+    if output:
+        with open(output, 'w', encoding='utf-8', newline='') as f:
+            for chunk in generator(rows):
+                f.write(chunk)
+        click.echo(f'Acervo exportado para {output}', err=True)
+    else:
+        for chunk in generator(rows):
+            sys.stdout.write(chunk)
+
+
+@app.cli.command('ingest-columnar')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user-email', required=True, help='Email of the user the imported artifacts are attributed to.')
+@click.option('--batch-size', type=int, default=5000, show_default=True, help='Rows per Arrow record batch.')
+@click.option('--dry-run', is_flag=True, help='Validate the file without writing to the database.')
+def ingest_columnar_command(path, user_email, batch_size, dry_run):
+    """Bulk-load a Parquet/Arrow file that follows the Excel import column contract."""
+    from models import User
+    from importer import ingest_columnar_file
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise click.ClickException('pyarrow não está instalado. Instale com: pip install pyarrow')
+
+    user = User.query.filter_by(email=user_email).first()
+    if not user:
+        raise click.ClickException(f'Usuário não encontrado: {user_email}')
+
+    try:
+        summary = ingest_columnar_file(path, user.id, batch_size=batch_size, dry_run=dry_run)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    for row, error in summary['errors']:
+        click.echo(f'Registro {row}: {error}', err=True)
+
+    if dry_run:
+        click.echo(f"Validação concluída: {summary['valid']} de {summary['total_rows']} registros válidos, {summary['rejected']} rejeitados.")
+    else:
+        click.echo(f"Importação concluída (Lote: {summary['batch_code']}): {summary['imported']} de {summary['total_rows']} registros importados, {summary['rejected']} rejeitados.")
+
+
+@app.cli.command('optimize-3d-models')
+@click.option('--scan-id', type=int, multiple=True, help='Convert only these scans (again, even if already optimized).')
+def optimize_3d_models_command(scan_id):
+    """Convert 3D scans to optimized GLB files for the viewer."""
+    import mesh_pipeline
+
+    scan_ids = list(scan_id) or mesh_pipeline.pending_scan_ids()
+    for current_id in scan_ids:
+        status = mesh_pipeline.optimize_scan(current_id, force=bool(scan_id))
+        click.echo(f'Scan {current_id}: {status or "ignorado"}')
+    click.echo(f'{len(scan_ids)} modelo(s) processado(s).')
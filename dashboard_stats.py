@@ -0,0 +1,298 @@
+"""
+Maintained counters behind the dashboard statistics.
+
+Instead of counting Artifact, Professional and Transport rows on every visit,
+the dashboard reads the small dashboard_counter table. An after_flush listener
+turns the ORM inserts, deletes and updates of those models into counter deltas
+applied with an upsert on the same connection, so the counters commit or roll
+back together with the change. Bulk statements that bypass the ORM (the
+spreadsheet/columnar importer and batch rollback) call apply_artifact_deltas
+themselves, and rebuild_counters recomputes everything from scratch (migration,
+nightly reconcile job).
+"""
+from collections import Counter
+
+from sqlalchemy import bindparam, event, func, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import db
+from models import Artifact, DashboardCounter, Professional, Transport, User
+
+TOTAL_KEY = ''
+# Written only by rebuild_counters: flush upserts can create any other row (including the
+# totals) on a database whose counters were never built, so only this row proves they were
+INITIALIZED_KEY = ('meta', 'initialized')
+PENDING_TRANSPORT_STATUS = 'pendente'
+TOP_CATALOGERS_LIMIT = 5
+
+# Artifact column -> counter scope
+ARTIFACT_SCOPES = {
+    'artifact_type': 'artifact_type',
+    'conservation_state': 'conservation_state',
+    'user_id': 'cataloger',
+}
+
+
+def _counter_key(value):
+    return TOTAL_KEY if value is None else str(value)[:200]
+
+
+def _artifact_deltas(values, sign):
+    """Counter deltas for one artifact given its column values"""
+    deltas = Counter({('artifacts', TOTAL_KEY): sign})
+    for column, scope in ARTIFACT_SCOPES.items():
+        deltas[(scope, _counter_key(values.get(column)))] += sign
+    return deltas
+
+
+def _attribute_values(obj, names, previous):
+    """Current or pre-flush values of the given attributes"""
+    state = inspect(obj)
+    values = {}
+    for name in names:
+        history = state.attrs[name].history
+        if previous and history.has_changes():
+            values[name] = history.deleted[0] if history.deleted else None
+        else:
+            values[name] = getattr(obj, name)
+    return values
+
+
+def _collect_deltas(session):
+    deltas = Counter()
+    artifact_columns = list(ARTIFACT_SCOPES)
+
+    for obj in session.new:
+        if isinstance(obj, Artifact):
+            deltas.update(_artifact_deltas(_attribute_values(obj, artifact_columns, False), 1))
+        elif isinstance(obj, Professional):
+            deltas[('professionals', TOTAL_KEY)] += 1
+        elif isinstance(obj, Transport):
+            deltas[('transport_status', _counter_key(obj.status))] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Artifact):
+            deltas.update(_artifact_deltas(_attribute_values(obj, artifact_columns, True), -1))
+        elif isinstance(obj, Professional):
+            deltas[('professionals', TOTAL_KEY)] -= 1
+        elif isinstance(obj, Transport):
+            deltas[('transport_status', _counter_key(_attribute_values(obj, ['status'], True)['status']))] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Artifact):
+            state = inspect(obj)
+            if any(state.attrs[column].history.has_changes() for column in artifact_columns):
+                deltas.update(_artifact_deltas(_attribute_values(obj, artifact_columns, True), -1))
+                deltas.update(_artifact_deltas(_attribute_values(obj, artifact_columns, False), 1))
+        elif isinstance(obj, Transport) and inspect(obj).attrs.status.history.has_changes():
+            deltas[('transport_status', _counter_key(_attribute_values(obj, ['status'], True)['status']))] -= 1
+            deltas[('transport_status', _counter_key(obj.status))] += 1
+
+    return deltas
+
+
+def _upsert_statement(dialect_name, replace=False):
+    """INSERT ... ON CONFLICT adding the value to an existing counter (or replacing it)"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = DashboardCounter.__table__
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.scope, table.c.key],
+        set_={'value': stmt.excluded.value if replace else table.c.value + stmt.excluded.value}
+    )
+
+
+def _apply_deltas(connection, deltas):
+    rows = [
+        {'scope': scope, 'key': key, 'value': delta}
+        for (scope, key), delta in sorted(deltas.items())
+        if delta
+    ]
+    if rows:
+        connection.execute(_upsert_statement(connection.dialect.name), rows)
+
+
+def _track_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+# active_history loads the old value on assignment even when the attribute was
+# expired (e.g. after a commit), so history.deleted holds what to decrement
+for _attribute in (Artifact.artifact_type, Artifact.conservation_state, Artifact.user_id, Transport.status):
+    event.listen(_attribute, 'set', _track_previous_value, retval=True, active_history=True)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_counters_after_flush(session, flush_context):
+    # new/deleted/dirty and attribute history still describe the flushed changes here
+    deltas = _collect_deltas(session)
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+def apply_artifact_deltas(rows, sign=1):
+    """
+    Record artifacts inserted or deleted by a bulk statement that bypasses the ORM.
+
+    Args:
+        rows: Iterable of dicts (or row mappings) with artifact_type, conservation_state and user_id
+        sign: 1 for inserted rows, -1 for deleted rows
+    """
+    deltas = Counter()
+    for values in rows:
+        deltas.update(_artifact_deltas(values, sign))
+    _apply_deltas(db.session.connection(), deltas)
+
+
+def artifact_group_counts(*conditions):
+    """
+    Artifact counts grouped by the counter columns, e.g. for the artifacts a bulk DELETE will remove.
+
+    Returns:
+        List of (values dict, count) pairs
+    """
+    columns = [getattr(Artifact, column) for column in ARTIFACT_SCOPES]
+    rows = db.session.execute(
+        db.select(*columns, func.count(Artifact.id)).where(*conditions).group_by(*columns)
+    ).all()
+    return [(dict(zip(ARTIFACT_SCOPES, row[:-1])), row[-1]) for row in rows]
+
+
+def apply_artifact_group_deltas(groups, sign=-1):
+    """Apply deltas from artifact_group_counts (one entry per group instead of per row)"""
+    deltas = Counter()
+    for values, count in groups:
+        for counter_key, delta in _artifact_deltas(values, sign).items():
+            deltas[counter_key] += delta * count
+    _apply_deltas(db.session.connection(), deltas)
+
+
+def _lock_counters(connection):
+    """
+    Block counter writes until the current transaction ends.
+
+    SHARE ROW EXCLUSIVE conflicts with the ROW EXCLUSIVE lock every upsert
+    takes, but not with reads, so the dashboard keeps working. Taking it waits
+    for transactions that already wrote counters, whose rows the recount then
+    sees. Writers arriving later wait and apply their deltas on top of the
+    rebuilt values. Row locks alone would not cover keys inserted meanwhile.
+
+    On SQLite an empty UPDATE takes the database write lock up front, which
+    gives the same guarantee.
+    """
+    table = DashboardCounter.__table__
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text(f'LOCK TABLE {table.name} IN SHARE ROW EXCLUSIVE MODE'))
+    else:
+        connection.execute(db.update(table).where(table.c.id == -1).values(value=table.c.value))
+
+
+def rebuild_counters():
+    """
+    Recompute every counter from the source tables and correct the stored ones.
+
+    Runs under a lock on the counter table and only updates the rows whose
+    value differs (inserting missing keys, deleting keys that no longer
+    occur), so no concurrent delta is lost. The caller commits.
+
+    Returns:
+        Number of counters after the rebuild
+    """
+    connection = db.session.connection()
+    _lock_counters(connection)
+
+    deltas = Counter({
+        ('artifacts', TOTAL_KEY): db.session.execute(db.select(func.count(Artifact.id))).scalar(),
+        ('professionals', TOTAL_KEY): db.session.execute(db.select(func.count(Professional.id))).scalar(),
+    })
+    for values, count in artifact_group_counts():
+        for column, scope in ARTIFACT_SCOPES.items():
+            deltas[(scope, _counter_key(values[column]))] += count
+    for status, count in db.session.execute(
+        db.select(Transport.status, func.count(Transport.id)).group_by(Transport.status)
+    ).all():
+        deltas[('transport_status', _counter_key(status))] += count
+    deltas[INITIALIZED_KEY] = 1
+
+    table = DashboardCounter.__table__
+    stored = {
+        (row.scope, row.key): row.value
+        for row in connection.execute(db.select(table.c.scope, table.c.key, table.c.value))
+    }
+
+    # Totals are written even when zero so an empty collection is not mistaken for missing counters
+    changed = [
+        {'b_scope': scope, 'b_key': key, 'b_value': value}
+        for (scope, key), value in sorted(deltas.items())
+        if (scope, key) in stored and stored[(scope, key)] != value
+    ]
+    missing = [
+        {'scope': scope, 'key': key, 'value': value}
+        for (scope, key), value in sorted(deltas.items())
+        if (scope, key) not in stored
+    ]
+    stale = [{'b_scope': scope, 'b_key': key} for scope, key in sorted(stored) if (scope, key) not in deltas]
+
+    key_matches = (table.c.scope == bindparam('b_scope'), table.c.key == bindparam('b_key'))
+    if changed:
+        connection.execute(db.update(table).where(*key_matches).values(value=bindparam('b_value')), changed)
+    if missing:
+        connection.execute(_upsert_statement(connection.dialect.name, replace=True), missing)
+    if stale:
+        connection.execute(db.delete(table).where(*key_matches), stale)
+    return len(deltas)
+
+
+def _breakdown(counters, scope):
+    rows = [(key or None, value) for (row_scope, key), value in counters.items() if row_scope == scope and value > 0]
+    return sorted(rows, key=lambda row: (-row[1], row[0] or ''))
+
+
+def dashboard_stats():
+    """
+    Dashboard statistics read from the maintained counters.
+
+    Returns:
+        Dict with artifacts, professionals and pending_transports totals, plus
+        by_type and by_conservation ((value, count) pairs, None for unset) and
+        top_catalogers ((username, count) pairs)
+    """
+    counters = {
+        (row.scope, row.key): row.value
+        for row in db.session.execute(
+            db.select(DashboardCounter.scope, DashboardCounter.key, DashboardCounter.value)
+            .where(DashboardCounter.scope != 'cataloger')
+        )
+    }
+    if INITIALIZED_KEY not in counters:
+        # Database created before the counters existed (or migrate_dashboard_counters.py never ran)
+        try:
+            rebuild_counters()
+            db.session.commit()
+        except IntegrityError:
+            # Another worker rebuilt them at the same time
+            db.session.rollback()
+        return dashboard_stats()
+
+    top_rows = db.session.execute(
+        db.select(DashboardCounter.key, DashboardCounter.value)
+        .where(DashboardCounter.scope == 'cataloger', DashboardCounter.key != TOTAL_KEY, DashboardCounter.value > 0)
+        .order_by(DashboardCounter.value.desc())
+        .limit(TOP_CATALOGERS_LIMIT)
+    ).all()
+    usernames = dict(db.session.execute(
+        db.select(User.id, User.username).where(User.id.in_([int(key) for key, _ in top_rows]))
+    ).all()) if top_rows else {}
+
+    return {
+        'artifacts': counters[('artifacts', TOTAL_KEY)],
+        'professionals': counters.get(('professionals', TOTAL_KEY), 0),
+        'pending_transports': counters.get(('transport_status', PENDING_TRANSPORT_STATUS), 0),
+        'by_type': _breakdown(counters, 'artifact_type'),
+        'by_conservation': _breakdown(counters, 'conservation_state'),
+        'top_catalogers': [(usernames[int(key)], value) for key, value in top_rows if int(key) in usernames],
+    }
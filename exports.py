@@ -0,0 +1,185 @@
+"""
+Streaming export utilities for the artifact collection and the user list.
+Rows are read through a server-side cursor (yield_per) and written
+incrementally, so memory use stays constant regardless of collection size.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from app import db
+from models import Artifact, User
+
+# Number of rows fetched from the database cursor per round-trip
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'acervo.csv'),
+    'jsonl': ('application/x-ndjson', 'acervo.jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'acervo.xlsx'),
+}
+
+# Export column names follow the Excel import contract so exported files can be re-imported
+ARTIFACT_EXPORT_COLUMNS = [
+    ('id', Artifact.id),
+    ('nome_artefato', Artifact.name),
+    ('codigo_artefato', Artifact.code),
+    ('qr_code', Artifact.qr_code),
+    ('data_descoberta', Artifact.discovery_date),
+    ('tipo', Artifact.artifact_type),
+    ('local_origem', Artifact.origin_location),
+    ('localizacao_arqueologica', Artifact.archaeological_site),
+    ('profundidade', Artifact.depth),
+    ('nivel_estratigrafico', Artifact.level),
+    ('coordenadas', Artifact.coordinates),
+    ('estado_conservacao', Artifact.conservation_state),
+    ('observacoes', Artifact.observations),
+    ('catalogado_por', User.username),
+    ('criado_em', Artifact.created_at),
+]
+
+EXPORT_HEADERS = [name for name, _ in ARTIFACT_EXPORT_COLUMNS]
+
+USER_EXPORT_FORMATS = {
+    'csv': ('text/csv', 'usuarios.csv'),
+    'jsonl': ('application/x-ndjson', 'usuarios.jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'usuarios.xlsx'),
+}
+
+# (CSV/XLSX header, JSONL key, column); only these columns are selected
+USER_EXPORT_COLUMNS = [
+    ('ID', 'id', User.id),
+    ('Nome', 'nome', User.username),
+    ('Email', 'email', User.email),
+    ('Tipo de Conta', 'tipo_conta', User.account_type),
+    ('Status', 'status', User.is_active_user),
+    ('Data de Cadastro', 'data_cadastro', User.created_at),
+    ('Status do CV', 'status_cv', User.cv_status),
+]
+
+USER_EXPORT_HEADERS = [header for header, _, _ in USER_EXPORT_COLUMNS]
+USER_EXPORT_KEYS = [key for _, key, _ in USER_EXPORT_COLUMNS]
+
+
+def build_artifact_export_query(search=None, artifact_type=None, conservation_state=None):
+    """
+    Build the projected export query, applying the same facets as the acervo page.
+
+    Args:
+        search: Case-insensitive substring matched against the artifact name
+        artifact_type: Exact artifact type (ceramica, litico, ...)
+        conservation_state: Exact conservation state (excelente, bom, ...)
+
+    Returns:
+        Select: A column-projected statement configured to stream in batches
+    """
+    stmt = select(*[column for _, column in ARTIFACT_EXPORT_COLUMNS]).outerjoin(
+        User, Artifact.user_id == User.id
+    )
+
+    if search:
+        stmt = stmt.where(Artifact.name.ilike(f'%{search.strip()}%'))
+    if artifact_type:
+        stmt = stmt.where(Artifact.artifact_type == artifact_type)
+    if conservation_state:
+        stmt = stmt.where(Artifact.conservation_state == conservation_state)
+
+    return stmt.order_by(Artifact.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+def iter_rows(stmt):
+    """Yield export rows from a server-side cursor, one batch in memory at a time."""
+    result = db.session.execute(stmt)
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def build_user_export_query(conditions=()):
+    """
+    Build the projected user export query.
+
+    Args:
+        conditions: SQL conditions to filter by (e.g. from user_admin.user_filter_conditions)
+
+    Returns:
+        Select: A column-projected statement configured to stream in batches
+    """
+    stmt = select(*[column for _, _, column in USER_EXPORT_COLUMNS]).where(*conditions)
+    return stmt.order_by(User.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+def iter_user_rows(stmt):
+    """Yield user export rows formatted like the admin CSV has always been."""
+    for user_id, username, email, account_type, is_active_user, created_at, cv_status in iter_rows(stmt):
+        yield (
+            user_id,
+            username,
+            email,
+            account_type or 'N/A',
+            'Ativo' if is_active_user else 'Inativo',
+            created_at.strftime('%d/%m/%Y %H:%M') if created_at else 'N/A',
+            cv_status or 'N/A',
+        )
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def generate_csv(rows, headers=EXPORT_HEADERS):
+    """Yield CSV chunks (semicolon-delimited, like the user export) row by row."""
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=';')
+
+    writer.writerow(headers)
+    yield output.getvalue()
+    output.seek(0)
+    output.truncate(0)
+
+    for row in rows:
+        writer.writerow([_format_value(value) for value in row])
+        yield output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+
+
+def generate_jsonl(rows, keys=EXPORT_HEADERS):
+    """Yield one JSON document per line."""
+    for row in rows:
+        record = dict(zip(keys, (_format_value(value) for value in row)))
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def write_xlsx(rows, target, headers=EXPORT_HEADERS, sheet_title='Acervo'):
+    """
+    Write rows to an XLSX workbook using openpyxl write-only mode.
+
+    Write-only worksheets flush rows to disk as they are appended instead of
+    keeping the whole sheet in memory.
+
+    Args:
+        rows: Iterable of export rows
+        target: File path or binary file object to save the workbook to
+        headers: Header row
+        sheet_title: Worksheet name
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_title)
+    worksheet.append(headers)
+
+    for row in rows:
+        worksheet.append([_format_value(value) for value in row])
+
+    workbook.save(target)
@@ -116,6 +116,7 @@ class ArtifactForm(FlaskForm):
     
     observations = TextAreaField('Observações')
     photo = FileField('Foto', validators=[FileAllowed(['jpg', 'jpeg', 'png', 'gif'], 'Apenas imagens são permitidas!')])
+    keep_original_photo = BooleanField('Manter foto original (sem redução)')
     model_3d = FileField('Modelo 3D', validators=[FileAllowed(['obj', 'ply', 'stl', 'fbx'], 'Apenas modelos 3D são permitidos!')])
     iphan_form = FileField('Ficha IPHAN', validators=[FileAllowed(['pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png'], 'Apenas PDF, DOC, DOCX ou imagens são permitidos!')])
 
@@ -147,7 +148,8 @@ class Scanner3DForm(FlaskForm):
     artifact_id = SelectField('Artefato', coerce=int, validators=[DataRequired()])
     scanner_type = StringField('Tipo de Scanner', validators=[Length(max=100)])
     resolution = StringField('Resolução', validators=[Length(max=50)])
-    scan_file = FileField('Arquivo do Scan', validators=[FileAllowed(['obj', 'ply', 'stl', 'fbx'], 'Apenas arquivos 3D são permitidos!')])
+    # FBX is stored for download only (not converted, no viewer preview)
+    scan_file = FileField('Arquivo do Scan', validators=[FileAllowed(['obj', 'ply', 'stl', 'fbx', 'glb', 'gltf'], 'Apenas arquivos 3D são permitidos!')])
     notes = TextAreaField('Observações')
 
 class AdminUserForm(FlaskForm):
@@ -0,0 +1,297 @@
+"""
+Queries and response caching for the photo gallery.
+
+Photos are paged with a keyset cursor on (created_at, id), newest first, so
+every page costs the same regardless of depth and no COUNT(*) is needed. The
+public /api/galeria/photos responses are cached per worker and keyed by the
+gallery version (latest updated_at and row count of photo_gallery), which every
+worker reads from the database: a change made through any worker therefore
+invalidates the cached pages everywhere, and the admin gallery routes also call
+invalidate_cache() to drop this worker's entries immediately.
+
+Bulk uploads validate and store the images on a bounded thread pool and insert
+the PhotoGallery rows in one commit.
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import joinedload
+
+from app import db
+from models import PhotoGallery, User
+
+GALLERY_PAGE_SIZE = 12
+GALLERY_API_PAGE_SIZE = 24
+GALLERY_API_MAX_PAGE_SIZE = 100
+GALLERY_CACHE_MAX_ENTRIES = 200
+
+# Bulk upload: files per request (the client splits larger selections) and concurrent uploads
+GALLERY_BULK_MAX_FILES = 50
+GALLERY_UPLOAD_WORKERS = int(os.environ.get('GALLERY_UPLOAD_WORKERS', 4))
+GALLERY_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
+GALLERY_MAX_IMAGE_BYTES = 16 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+_response_cache = {}
+_cache_lock = threading.Lock()
+
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by encode_cursor"""
+
+
+def encode_cursor(photo):
+    """Opaque cursor pointing just after `photo` in newest-first order"""
+    raw = f'{photo.created_at.isoformat()}|{photo.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from encode_cursor.
+
+    Returns:
+        Tuple (created_at, id)
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, photo_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(photo_id)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def photo_page(query, cursor=None, limit=GALLERY_API_PAGE_SIZE):
+    """
+    One keyset page of photos, newest first.
+
+    Args:
+        query: PhotoGallery query with the visibility/category filters applied
+        cursor: Cursor returned with the previous page, or None for the first page
+        limit: Photos per page
+
+    Returns:
+        Tuple (photos, next_cursor); next_cursor is None on the last page
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    if cursor:
+        created_at, photo_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            PhotoGallery.created_at < created_at,
+            and_(PhotoGallery.created_at == created_at, PhotoGallery.id < photo_id)
+        ))
+
+    rows = query.options(joinedload(PhotoGallery.created_by).load_only(User.id, User.username)) \
+        .order_by(PhotoGallery.created_at.desc(), PhotoGallery.id.desc()) \
+        .limit(limit + 1).all()
+
+    photos = rows[:limit]
+    next_cursor = encode_cursor(photos[-1]) if len(rows) > limit else None
+    return photos, next_cursor
+
+
+def gallery_version():
+    """
+    Latest modification and row count of photo_gallery, shared by all workers.
+
+    Returns:
+        Tuple (last_modified, row count); last_modified is None for an empty gallery
+    """
+    last_modified, total = db.session.execute(
+        db.select(func.max(PhotoGallery.updated_at), func.count(PhotoGallery.id))
+    ).one()
+    return last_modified, total
+
+
+def make_etag(version, *key):
+    """Strong ETag for a cached response of the given gallery version and request key"""
+    last_modified, total = version
+    raw = f'{last_modified.isoformat() if last_modified else "-"}:{total}:{":".join(map(str, key))}'
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def serialize_photo(photo):
+    from storage import get_resized_image_url
+
+    return {
+        'id': photo.id,
+        'title': photo.title,
+        'description': photo.description or '',
+        'image_path': photo.image_path,
+        'thumbnail_url': get_resized_image_url(photo.image_path, 'card'),
+        'placeholder': photo.image_placeholder or '',
+        'image_url': get_resized_image_url(photo.image_path, 'detail'),
+        'category': photo.category,
+        'event_name': photo.event_name or '',
+        'created_at': photo.created_at.strftime('%d/%m/%Y'),
+        'created_by': photo.created_by.username if photo.created_by else 'Desconhecido'
+    }
+
+
+def public_team_photos(version, cursor=None, limit=GALLERY_API_PAGE_SIZE):
+    """
+    JSON body for a page of published team photos, cached per gallery version.
+
+    Args:
+        version: Result of gallery_version() for this request
+        cursor: Cursor of the previous page, or None
+        limit: Photos per page
+
+    Returns:
+        Serialized JSON string
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    key = (version, cursor, limit)
+    body = _response_cache.get(key)
+    if body is not None:
+        return body
+
+    query = PhotoGallery.query.filter_by(is_published=True, category='equipe')
+    photos, next_cursor = photo_page(query, cursor, limit)
+    photos_data = [serialize_photo(photo) for photo in photos]
+    body = json.dumps({
+        'success': True,
+        'photos': photos_data,
+        'total': len(photos_data),  # Photos in this page
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    })
+
+    with _cache_lock:
+        # Entries of older versions are never hit again
+        stale = [cached_key for cached_key in _response_cache if cached_key[0] != version]
+        for cached_key in stale:
+            del _response_cache[cached_key]
+        if len(_response_cache) >= GALLERY_CACHE_MAX_ENTRIES:
+            _response_cache.clear()
+        _response_cache[key] = body
+    return body
+
+
+def invalidate_cache():
+    """Drop this worker's cached gallery responses after a gallery change"""
+    with _cache_lock:
+        _response_cache.clear()
+
+
+def _store_image(image):
+    """
+    Validate one uploaded file and send it to storage (runs on the upload pool).
+
+    Returns:
+        Tuple (image_path, placeholder, error message); image_path or the error is None
+    """
+    from storage import image_placeholder, upload_gallery_photo
+
+    filename = image.filename or ''
+    if not filename:
+        return None, None, 'Nenhuma imagem foi selecionada.'
+    if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in GALLERY_IMAGE_EXTENSIONS:
+        return None, None, 'Formato de imagem inválido. Use JPG, PNG ou GIF.'
+
+    image.seek(0, os.SEEK_END)
+    file_size = image.tell()
+    image.seek(0)
+    if file_size == 0:
+        return None, None, 'Arquivo vazio. Por favor, selecione uma imagem válida.'
+    if file_size > GALLERY_MAX_IMAGE_BYTES:
+        return None, None, 'Arquivo muito grande. Tamanho máximo: 16MB'
+
+    placeholder = image_placeholder(image)
+    try:
+        image_path = upload_gallery_photo(image)
+    except Exception:
+        logger.exception('Erro ao enviar %s para o armazenamento', filename)
+        image_path = None
+    if not image_path:
+        return None, None, 'Erro ao fazer upload da imagem. Tente novamente.'
+    return image_path, placeholder, None
+
+
+def bulk_upload_photos(images, user_id, category='geral', title='', description='', event_name=None,
+                       is_published=False):
+    """
+    Upload many gallery photos concurrently and insert them in one commit.
+
+    Validation, size checks and storage uploads run on a pool of at most
+    GALLERY_UPLOAD_WORKERS threads; the PhotoGallery rows for the files that
+    succeeded are then added and committed together.
+
+    Args:
+        images: List of FileStorage objects (at most GALLERY_BULK_MAX_FILES)
+        user_id: Id of the admin uploading the photos
+        category: geral, equipe or evento
+        title: Common title; numbered per file when several are sent. Defaults to the file name
+        description: Common description
+        event_name: Event name for the evento category
+        is_published: Publish the photos on the gallery immediately
+
+    Returns:
+        List of per-file result dicts with filename, success and either photo_id or error
+    """
+    if not images:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(GALLERY_UPLOAD_WORKERS, len(images))) as pool:
+        outcomes = list(pool.map(_store_image, images))
+
+    results = []
+    photos = []
+    for index, (image, (image_path, placeholder, error)) in enumerate(zip(images, outcomes), start=1):
+        result = {'filename': image.filename or '', 'success': error is None}
+        results.append(result)
+        if error:
+            result['error'] = error
+            continue
+
+        if title:
+            photo_title = f'{title} ({index})' if len(images) > 1 else title
+        else:
+            photo_title = os.path.splitext(image.filename)[0].replace('_', ' ')
+        photo = PhotoGallery(
+            title=photo_title[:200],
+            description=description,
+            category=category,
+            event_name=event_name if category == 'evento' else None,
+            is_published=is_published,
+            user_id=user_id,
+            image_path=image_path,
+            image_placeholder=placeholder
+        )
+        photos.append((photo, result))
+
+    if not photos:
+        return results
+
+    try:
+        db.session.add_all([photo for photo, _ in photos])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception('Erro ao gravar %d fotos da galeria', len(photos))
+        from storage import delete_file
+        for photo, result in photos:
+            delete_file(photo.image_path)
+            result['success'] = False
+            result['error'] = 'Erro ao salvar a foto. Tente novamente.'
+        return results
+
+    for photo, result in photos:
+        result['photo_id'] = photo.id
+    invalidate_cache()
+    return results
@@ -0,0 +1,455 @@
+"""
+Helpers for the spreadsheet import workflow.
+Validation is set-based: artifact codes are checked against the database
+with one IN query per chunk instead of relying on the unique constraint
+to abort the whole batch at commit time. Imported artifacts reference their
+ImportBatch through an indexed FK, so batch statistics and rollback are
+index seeks rather than scans over the observations text.
+"""
+import os
+import uuid
+from datetime import datetime
+
+from sqlalchemy import func
+
+from app import db
+from models import Artifact, Transport, Scanner3D, ImportBatch
+from dashboard_stats import apply_artifact_deltas, apply_artifact_group_deltas, artifact_group_counts
+
+# Keeps IN lists well below SQLite's bound-parameter limit
+CODE_LOOKUP_CHUNK_SIZE = 500
+
+# Rows per Arrow record batch for columnar ingest
+COLUMNAR_BATCH_SIZE = 5000
+
+# Column contract shared by the spreadsheet and columnar import paths
+REQUIRED_IMPORT_COLUMNS = ['nome_artefato', 'tipo', 'estado_conservacao']
+
+# Text column -> max length, mirroring the spreadsheet preview truncation
+IMPORT_TEXT_COLUMNS = {
+    'nome_artefato': 200,
+    'codigo_artefato': 100,
+    'tipo': 100,
+    'local_origem': 200,
+    'localizacao_arqueologica': 200,
+    'profundidade': 50,
+    'nivel_estratigrafico': 100,
+    'coordenadas': 100,
+    'estado_conservacao': 50,
+    'observacoes': 1000,
+}
+
+CONSERVATION_MAP = {
+    'excelente': 'excelente',
+    'bom': 'bom',
+    'regular': 'regular',
+    'ruim': 'ruim',
+    'inteiro': 'excelente',
+    'íntegro': 'excelente',
+    'fragmentado': 'regular',
+    'restaurado': 'bom',
+    'danificado': 'ruim'
+}
+
+
+def find_existing_codes(codes):
+    """
+    Return the subset of codes that already exist in the collection.
+
+    Args:
+        codes: Iterable of artifact codes
+
+    Returns:
+        set: Codes already used by an Artifact
+    """
+    unique_codes = sorted({code for code in codes if code})
+    existing = set()
+
+    for start in range(0, len(unique_codes), CODE_LOOKUP_CHUNK_SIZE):
+        chunk = unique_codes[start:start + CODE_LOOKUP_CHUNK_SIZE]
+        rows = db.session.execute(
+            db.select(Artifact.code).where(Artifact.code.in_(chunk))
+        ).scalars()
+        existing.update(rows)
+
+    return existing
+
+
+def flag_code_conflicts(artifacts_data):
+    """
+    Append per-row errors for codes repeated within the sheet or already cataloged.
+
+    Rows without a code are left alone (a code is generated at import time).
+    The first occurrence of a repeated code stays importable; later ones are flagged.
+
+    Args:
+        artifacts_data: List of row dicts with 'row', 'codigo_artefato' and 'errors'
+
+    Returns:
+        int: Number of rows that received a conflict error
+    """
+    existing_codes = find_existing_codes(item.get('codigo_artefato') for item in artifacts_data)
+    first_seen = {}
+    conflicts = 0
+
+    for item in artifacts_data:
+        code = (item.get('codigo_artefato') or '').strip()
+        if not code:
+            continue
+
+        conflict = None
+        if code in existing_codes:
+            conflict = f'código {code} já cadastrado no acervo'
+        elif code in first_seen:
+            conflict = f'código {code} duplicado na planilha (linha {first_seen[code]})'
+        else:
+            first_seen[code] = item['row']
+
+        if conflict:
+            item['errors'].append(conflict)
+            conflicts += 1
+
+    return conflicts
+
+
+def batch_artifact_counts(batch_ids):
+    """
+    Count the artifacts still attached to each batch with one GROUP BY on the indexed FK.
+
+    Args:
+        batch_ids: Iterable of ImportBatch ids
+
+    Returns:
+        dict: {batch_id: artifact_count}
+    """
+    batch_ids = list(batch_ids)
+    if not batch_ids:
+        return {}
+
+    rows = db.session.execute(
+        db.select(Artifact.import_batch_id, func.count(Artifact.id))
+        .where(Artifact.import_batch_id.in_(batch_ids))
+        .group_by(Artifact.import_batch_id)
+    )
+    return dict(rows.all())
+
+
+def batch_statistics(batch):
+    """
+    Summarize a batch: artifacts per type and conservation state, plus records that depend on them.
+
+    Args:
+        batch: ImportBatch instance
+
+    Returns:
+        dict: Counts keyed by 'artifacts', 'by_type', 'by_conservation', 'transports' and 'scans_3d'
+    """
+    by_type = dict(db.session.execute(
+        db.select(Artifact.artifact_type, func.count(Artifact.id))
+        .where(Artifact.import_batch_id == batch.id)
+        .group_by(Artifact.artifact_type)
+    ).all())
+
+    by_conservation = dict(db.session.execute(
+        db.select(Artifact.conservation_state, func.count(Artifact.id))
+        .where(Artifact.import_batch_id == batch.id)
+        .group_by(Artifact.conservation_state)
+    ).all())
+
+    transports = db.session.execute(
+        db.select(func.count(Transport.id))
+        .join(Artifact, Transport.artifact_id == Artifact.id)
+        .where(Artifact.import_batch_id == batch.id)
+    ).scalar()
+
+    scans_3d = db.session.execute(
+        db.select(func.count(Scanner3D.id))
+        .join(Artifact, Scanner3D.artifact_id == Artifact.id)
+        .where(Artifact.import_batch_id == batch.id)
+    ).scalar()
+
+    return {
+        'artifacts': sum(by_type.values()),
+        'by_type': {key or 'N/A': value for key, value in by_type.items()},
+        'by_conservation': {key or 'N/A': value for key, value in by_conservation.items()},
+        'transports': transports,
+        'scans_3d': scans_3d,
+    }
+
+
+def rollback_import_batch(batch, user_id):
+    """
+    Remove every artifact of a batch with a single DELETE ... WHERE import_batch_id = ?.
+
+    The caller must check that no transports or 3D scans reference the batch
+    (see batch_statistics) and commit the session.
+
+    Args:
+        batch: ImportBatch instance
+        user_id: Id of the user performing the rollback
+
+    Returns:
+        tuple: (deleted_count, file_paths) where file_paths are photos and QR code images to remove from storage after commit
+    """
+    file_paths = [
+        path
+        for row in db.session.execute(
+            db.select(Artifact.photo_path, Artifact.qr_code_image_path)
+            .where(Artifact.import_batch_id == batch.id)
+        )
+        for path in row
+        if path
+    ]
+
+    # Counted before the DELETE, which bypasses the ORM flush events that maintain the counters
+    apply_artifact_group_deltas(artifact_group_counts(Artifact.import_batch_id == batch.id), sign=-1)
+
+    deleted = db.session.execute(
+        db.delete(Artifact)
+        .where(Artifact.import_batch_id == batch.id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    batch.status = 'Revertido'
+    batch.rolled_back_at = datetime.utcnow()
+    batch.rolled_back_by = user_id
+
+    return deleted, file_paths
+
+
+def iter_columnar_batches(path, batch_size=COLUMNAR_BATCH_SIZE):
+    """
+    Yield Arrow record batches from a Parquet or Arrow IPC (.arrow/.feather) file.
+
+    Only the import contract columns are read from Parquet files.
+
+    Args:
+        path: Path to the .parquet, .arrow, .feather or .ipc file
+        batch_size: Maximum rows per yielded batch
+
+    Yields:
+        pyarrow.RecordBatch
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if path.lower().endswith('.parquet'):
+        parquet_file = pq.ParquetFile(path)
+        columns = [name for name in parquet_file.schema_arrow.names if name in IMPORT_TEXT_COLUMNS or name == 'data_descoberta']
+        _check_required_columns(columns)
+        yield from parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+        return
+
+    with pa.memory_map(path, 'r') as source:
+        try:
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            source.seek(0)
+            reader = pa.ipc.open_stream(source)
+            batches = iter(reader)
+        _check_required_columns(reader.schema.names)
+
+        for record_batch in batches:
+            for offset in range(0, record_batch.num_rows, batch_size):
+                yield record_batch.slice(offset, batch_size)
+
+
+def _check_required_columns(columns):
+    missing_columns = [col for col in REQUIRED_IMPORT_COLUMNS if col not in columns]
+    if missing_columns:
+        raise ValueError(f'Colunas obrigatórias ausentes: {", ".join(missing_columns)}')
+
+
+def _text_column(record_batch, name, max_length):
+    """Return a trimmed, truncated string column (all nulls when the column is absent)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if name not in record_batch.schema.names:
+        return pa.nulls(record_batch.num_rows, pa.string())
+
+    column = record_batch.column(name)
+    if not pa.types.is_string(column.type) and not pa.types.is_large_string(column.type):
+        column = pc.cast(column, pa.string())
+    column = pc.utf8_trim_whitespace(column)
+    return pc.utf8_slice_codeunits(column, 0, max_length)
+
+
+def _date_column(record_batch):
+    """Return discovery dates as date32, parsing YYYY-MM-DD strings; unparseable values become null."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if 'data_descoberta' not in record_batch.schema.names:
+        return pa.nulls(record_batch.num_rows, pa.date32())
+
+    column = record_batch.column('data_descoberta')
+    if pa.types.is_temporal(column.type):
+        return pc.cast(column, pa.date32())
+
+    column = pc.utf8_trim_whitespace(pc.cast(column, pa.string()))
+    timestamps = pc.strptime(column, format='%Y-%m-%d', unit='s', error_is_null=True)
+    return pc.cast(timestamps, pa.date32())
+
+
+def validate_columnar_batch(record_batch, seen_codes):
+    """
+    Validate and transform one Arrow record batch into Artifact rows with vectorized kernels.
+
+    Args:
+        record_batch: pyarrow.RecordBatch following the import column contract
+        seen_codes: Set of codes already accepted earlier in the same file (updated in place)
+
+    Returns:
+        tuple: (pyarrow.Table of Artifact column values for valid rows,
+                list of (batch_row_index, error) for rejected rows)
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    num_rows = record_batch.num_rows
+    columns = {name: _text_column(record_batch, name, limit) for name, limit in IMPORT_TEXT_COLUMNS.items()}
+
+    # Required name
+    name_missing = pc.fill_null(pc.equal(pc.fill_null(columns['nome_artefato'], ''), ''), True)
+
+    # Codes: one IN query per chunk against the collection (distinct codes only)
+    codes = columns['codigo_artefato']
+    has_code = pc.not_equal(pc.fill_null(codes, ''), '')
+    distinct_codes = pc.unique(pc.filter(codes, has_code))
+    existing_codes = find_existing_codes(distinct_codes.to_pylist())
+    code_taken = pc.and_(has_code, pc.is_in(codes, value_set=pa.array(sorted(existing_codes), pa.string())))
+
+    # In-file duplicates: codes accepted by earlier batches, then repeats within this
+    # batch among the rows still eligible (the first occurrence is kept)
+    eligible = pc.and_(pc.invert(pc.or_(name_missing, code_taken)), has_code)
+    seen_before = pc.and_(eligible, pc.is_in(codes, value_set=pa.array(sorted(seen_codes), pa.string())))
+    candidates = pc.and_(eligible, pc.invert(seen_before))
+    row_index = pa.array(range(num_rows), pa.int64())
+    first_rows = pa.table({'code': pc.filter(codes, candidates), 'row': pc.filter(row_index, candidates)}) \
+        .group_by('code').aggregate([('row', 'min')]).column('row_min')
+    repeated = pc.and_(candidates, pc.invert(pc.is_in(row_index, value_set=first_rows)))
+    duplicate = pc.or_(seen_before, repeated)
+
+    invalid = pc.or_(pc.or_(name_missing, code_taken), duplicate)
+    valid = pc.invert(invalid)
+    seen_codes.update(pc.filter(codes, pc.and_(valid, has_code)).to_pylist())
+
+    # Messages are only built for the rejected rows
+    errors = []
+    rejected = pc.indices_nonzero(invalid)
+    for i, code, missing, taken in zip(rejected.to_pylist(), pc.take(codes, rejected).to_pylist(),
+                                       pc.take(name_missing, rejected).to_pylist(),
+                                       pc.take(code_taken, rejected).to_pylist()):
+        if missing:
+            errors.append((i, 'nome do artefato ausente'))
+        elif taken:
+            errors.append((i, f'código {code} já cadastrado no acervo'))
+        else:
+            errors.append((i, f'código {code} duplicado no arquivo'))
+
+    # Conservation state: map aliases through a lookup array, default 'regular'
+    keys = pa.array(list(CONSERVATION_MAP.keys()))
+    values = pa.array(list(CONSERVATION_MAP.values()))
+    lookup = pc.index_in(pc.utf8_lower(columns['estado_conservacao']), value_set=keys)
+    conservation = pc.fill_null(pc.take(values, lookup), 'regular')
+
+    generated_codes = pa.array([f"LAR-{uuid.uuid4().hex[:12].upper()}" for _ in range(num_rows)])
+    qr_codes = pa.array([f"LAARI-{uuid.uuid4().hex[:12].upper()}" for _ in range(num_rows)])
+
+    location = pc.fill_null(columns['localizacao_arqueologica'], '')
+    observations = pc.binary_join_element_wise(
+        pc.binary_join_element_wise('Localização arqueológica: ', location, ''),
+        pc.fill_null(columns['observacoes'], ''),
+        '\n'
+    )
+
+    table = pa.table({
+        'name': columns['nome_artefato'],
+        'code': pc.if_else(has_code, codes, generated_codes),
+        'discovery_date': _date_column(record_batch),
+        'artifact_type': pc.fill_null(columns['tipo'], ''),
+        'origin_location': pc.fill_null(columns['local_origem'], ''),
+        'depth': pc.fill_null(columns['profundidade'], ''),
+        'level': pc.fill_null(columns['nivel_estratigrafico'], ''),
+        'coordinates': pc.fill_null(columns['coordenadas'], ''),
+        'conservation_state': conservation,
+        'observations': observations,
+        'qr_code': qr_codes,
+    })
+
+    return table.filter(valid), errors
+
+
+def ingest_columnar_file(path, user_id, batch_size=COLUMNAR_BATCH_SIZE, dry_run=False, max_reported_errors=100):
+    """
+    Bulk-load a Parquet/Arrow file into the collection as one ImportBatch.
+
+    Each record batch is validated as a whole and inserted with a single
+    executemany INSERT, then committed, so memory and transaction size stay
+    bounded. A failed run can be undone with rollback_import_batch.
+
+    Args:
+        path: Path to the columnar file
+        user_id: Id of the user the artifacts and batch are attributed to
+        batch_size: Rows per record batch
+        dry_run: Validate only, without writing to the database
+        max_reported_errors: Cap on the per-row errors returned
+
+    Returns:
+        dict: Summary with 'batch_code', 'total_rows', 'valid', 'imported', 'rejected'
+              and 'errors' ((row, error) pairs)
+    """
+    batch_code = f"IMPORT-{uuid.uuid4().hex[:8].upper()}"
+    import_batch = None
+    seen_codes = set()
+    summary = {'batch_code': batch_code, 'total_rows': 0, 'valid': 0, 'imported': 0, 'rejected': 0, 'errors': []}
+
+    for record_batch in iter_columnar_batches(path, batch_size):
+        # Created on the first batch so a file rejected up front leaves no empty ImportBatch
+        if import_batch is None and not dry_run:
+            import_batch = ImportBatch(
+                batch_code=batch_code,
+                source_filename=os.path.basename(path),
+                user_id=user_id,
+                total_rows=0,
+                imported_count=0,
+                skipped_count=0
+            )
+            db.session.add(import_batch)
+            db.session.commit()
+
+        offset = summary['total_rows']
+        rows, errors = validate_columnar_batch(record_batch, seen_codes)
+
+        summary['total_rows'] += record_batch.num_rows
+        summary['rejected'] += len(errors)
+        for index, error in errors:
+            if len(summary['errors']) >= max_reported_errors:
+                break
+            summary['errors'].append((offset + index + 1, error))
+
+        summary['valid'] += rows.num_rows
+        if dry_run or rows.num_rows == 0:
+            continue
+
+        records = rows.to_pylist()
+        for record in records:
+            record['user_id'] = user_id
+            record['import_batch_id'] = import_batch.id
+        db.session.execute(db.insert(Artifact), records)
+        apply_artifact_deltas(records)  # executemany INSERTs bypass the ORM flush events
+
+        summary['imported'] += len(records)
+        import_batch.total_rows = summary['total_rows']
+        import_batch.imported_count = summary['imported']
+        import_batch.skipped_count = summary['rejected']
+        db.session.commit()
+
+    if import_batch is not None:
+        import_batch.total_rows = summary['total_rows']
+        import_batch.skipped_count = summary['rejected']
+        db.session.commit()
+
+    return summary
@@ -0,0 +1,1075 @@
+"""
+Conversion of uploaded 3D scans to compact binary glTF (GLB) for the viewer.
+
+Scanner3D keeps the uploaded file in file_path; this module writes an
+optimized GLB next to it (optimized_file_path) that view_3d_model loads with
+three.js' GLTFLoader. OBJ, PLY and STL meshes are parsed with NumPy, welded
+(duplicate vertices merged, degenerate triangles dropped), reordered so the
+vertex buffer is read in index order, and written with quantized attributes
+(KHR_mesh_quantization): 16-bit positions, 8-bit normals and 8-bit colors,
+roughly a third of the float32 size before any transfer compression. GLB and
+glTF uploads are already viewer-ready and are used as they are.
+
+Large meshes also get coarser levels of detail (Scanner3DLod) built by
+quadric-error vertex clustering, so the viewer can show a rough model within
+moments and refine it while the finer levels download.
+
+Every converted scan, and every GLB upload, also gets a small JPEG preview
+(preview_path) rendered on the CPU by render_preview, so the scan list and
+the acervo can show the model without loading it.
+
+Parsing and encoding are CPU-bound, so conversions run in a small process
+pool (MESH_CONVERSION_WORKERS processes, started with spawn so they never
+inherit the web worker's threads or connections). queue_scan_optimization
+hands a scan to the pool after the upload commits; the optimize_3d_models
+maintenance job picks up scans left pending by a worker restart and the
+`flask optimize-3d-models` command converts existing scans.
+"""
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import struct
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+import numpy as np
+
+MESH_CONVERSION_WORKERS = int(os.environ.get('MESH_CONVERSION_WORKERS', 2))
+# A conversion still running after this long is abandoned and its process killed
+MESH_CONVERSION_TIMEOUT = int(os.environ.get('MESH_CONVERSION_TIMEOUT', 600))
+OPTIMIZED_FOLDER = 'uploads/3d_optimized'
+
+CONVERTIBLE_EXTENSIONS = {'obj', 'ply', 'stl'}
+VIEWER_READY_EXTENSIONS = {'glb', 'gltf'}
+# Shown as uploaded but still processed for the preview image (glTF files reference external buffers)
+PREVIEW_ONLY_EXTENSIONS = {'glb'}
+
+# Scanner3D.optimization_status values
+STATUS_PENDING = 'pendente'
+STATUS_PROCESSING = 'processando'
+STATUS_DONE = 'otimizado'
+STATUS_SKIPPED = 'original'  # Original file is already GLB/glTF
+STATUS_UNSUPPORTED = 'nao_suportado'
+STATUS_FAILED = 'falhou'
+
+# A conversion still "processing" after this long was lost with its worker
+PROCESSING_TIMEOUT = timedelta(hours=1)
+# Claims that never finished (worker killed mid-conversion) before a scan is given up as failed
+MAX_OPTIMIZATION_ATTEMPTS = 3
+
+# Levels of detail: cluster cell sizes of 2**shift quantization steps (32 to 512 cells across the model)
+LOD_CLUSTER_SHIFTS = (11, 10, 9, 8, 7)
+LOD_MIN_TRIANGLES = 20000  # Smaller models load fast enough without LODs
+LOD_MIN_LEVEL_TRIANGLES = 500
+LOD_MAX_RATIO = 0.5
+
+# Preview images for the scan list and acervo (see render_preview)
+PREVIEW_FOLDER = 'uploads/3d_previews'
+PREVIEW_SIZE = 256
+PREVIEW_SUPERSAMPLING = 2
+PREVIEW_JPEG_QUALITY = 85
+PREVIEW_MAX_TRIANGLES = 60000
+PREVIEW_MARGIN = 0.06
+PREVIEW_VIEW_DIRECTION = (5, 2.5, 5)  # Initial camera position of view_3d_model
+PREVIEW_LIGHTS = (((5, 10, 7), 0.65), ((-5, 5, -5), 0.25))
+PREVIEW_AMBIENT = 0.35
+PREVIEW_BASE_COLOR = (204, 179, 148)  # Material color of optimized GLBs without vertex colors
+PREVIEW_BACKGROUND = (26, 26, 46)  # Viewer background
+
+logger = logging.getLogger(__name__)
+
+# positions: float (N, 3); triangles: int (T, 3) vertex indices; colors: uint8 (N, 4) or None
+Mesh = namedtuple('Mesh', ['positions', 'triangles', 'colors'])
+
+
+class MeshFormatError(ValueError):
+    """Raised for a file that cannot be parsed as a mesh"""
+
+
+def file_extension(path):
+    """Lower-case extension of a storage path/URL without query string"""
+    name = (path or '').split('?', 1)[0].rsplit('/', 1)[-1]
+    return name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+
+
+def initial_status(file_path):
+    """Optimization status for a newly uploaded scan file"""
+    extension = file_extension(file_path)
+    if extension in CONVERTIBLE_EXTENSIONS or extension in PREVIEW_ONLY_EXTENSIONS:
+        return STATUS_PENDING
+    if extension in VIEWER_READY_EXTENSIONS:
+        return STATUS_SKIPPED
+    return STATUS_UNSUPPORTED
+
+
+def viewer_file_paths(scan):
+    """
+    Stored files the 3D viewer should load for a scan, coarsest level of detail first.
+
+    Returns:
+        List of storage paths, ending with the full-detail model; empty if there is none yet
+    """
+    if scan.optimized_file_path:
+        return [lod.file_path for lod in scan.lods] + [scan.optimized_file_path]
+    if file_extension(scan.file_path) in VIEWER_READY_EXTENSIONS:
+        return [scan.file_path]
+    return []
+
+
+# ---------------------------------------------------------------------------
+# Parsers
+# ---------------------------------------------------------------------------
+
+def _fan_triangles(polygons):
+    """Triangulate polygons (lists of vertex indices) as fans"""
+    triangles = []
+    for polygon in polygons:
+        first = polygon[0]
+        for i in range(1, len(polygon) - 1):
+            triangles.append((first, polygon[i], polygon[i + 1]))
+    return np.array(triangles, dtype=np.int64).reshape(-1, 3)
+
+
+def parse_obj(data):
+    """Parse a Wavefront OBJ file (positions, polygon faces; materials and UVs are ignored)"""
+    positions = []
+    polygons = []
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        if line.startswith('v '):
+            positions.append(line.split()[1:4])
+        elif line.startswith('f '):
+            vertex_count = len(positions)
+            polygon = []
+            for token in line.split()[1:]:
+                index = int(token.split('/', 1)[0])
+                polygon.append(index - 1 if index > 0 else vertex_count + index)
+            if len(polygon) >= 3:
+                polygons.append(polygon)
+
+    if not positions or not polygons:
+        raise MeshFormatError('Arquivo OBJ sem vértices ou faces')
+    return Mesh(np.array(positions, dtype=np.float64), _fan_triangles(polygons), None)
+
+
+_PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+
+def _ply_header(data):
+    end = data.find(b'end_header')
+    if not data.startswith(b'ply') or end < 0:
+        raise MeshFormatError('Cabeçalho PLY inválido')
+    body_start = data.index(b'\n', end) + 1
+
+    fmt = None
+    elements = []  # [name, count, [(property name, dtype) or (name, (count dtype, item dtype))]]
+    for line in data[:end].decode('ascii', errors='replace').splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        if parts[0] == 'format':
+            fmt = parts[1]
+        elif parts[0] == 'element':
+            elements.append([parts[1], int(parts[2]), []])
+        elif parts[0] == 'property' and elements:
+            if parts[1] == 'list':
+                elements[-1][2].append((parts[4], (_PLY_TYPES[parts[2]], _PLY_TYPES[parts[3]])))
+            else:
+                elements[-1][2].append((parts[2], _PLY_TYPES[parts[1]]))
+    if fmt not in ('ascii', 'binary_little_endian', 'binary_big_endian'):
+        raise MeshFormatError(f'Formato PLY não suportado: {fmt}')
+    return fmt, elements, body_start
+
+
+def _ply_vertex_mesh(vertices, triangles):
+    names = vertices.dtype.names
+    positions = np.column_stack([vertices['x'], vertices['y'], vertices['z']]).astype(np.float64)
+    colors = None
+    if all(channel in names for channel in ('red', 'green', 'blue')):
+        rgb = [vertices[channel] for channel in ('red', 'green', 'blue')]
+        if vertices['red'].dtype.kind == 'f':
+            rgb = [np.clip(channel * 255, 0, 255) for channel in rgb]
+        alpha = vertices['alpha'] if 'alpha' in names else np.full(len(vertices), 255)
+        colors = np.column_stack(rgb + [alpha]).astype(np.uint8)
+    return Mesh(positions, triangles, colors)
+
+
+def parse_ply(data):
+    """Parse an ASCII or binary PLY file with vertex (x, y, z, optional colors) and face elements"""
+    fmt, elements, offset = _ply_header(data)
+    if not elements or elements[0][0] != 'vertex':
+        raise MeshFormatError('PLY sem elemento vertex')
+
+    if fmt == 'ascii':
+        lines = data[offset:].decode('ascii', errors='replace').split('\n')
+        position = 0
+        vertices = triangles = None
+        for name, count, properties in elements:
+            rows = lines[position:position + count]
+            position += count
+            if name == 'vertex':
+                dtype = np.dtype([(prop, kind) for prop, kind in properties])
+                values = np.array([row.split()[:len(properties)] for row in rows], dtype=np.float64)
+                vertices = np.empty(count, dtype=dtype)
+                for column, prop in enumerate(dtype.names):
+                    vertices[prop] = values[:, column]
+            elif name == 'face':
+                polygons = []
+                for row in rows:
+                    tokens = row.split()
+                    polygons.append([int(token) for token in tokens[1:1 + int(tokens[0])]])
+                triangles = _fan_triangles(polygons)
+        if triangles is None:
+            raise MeshFormatError('PLY sem faces')
+        return _ply_vertex_mesh(vertices, triangles)
+
+    endian = '<' if fmt == 'binary_little_endian' else '>'
+    vertices = triangles = None
+    for name, count, properties in elements:
+        if name == 'face':
+            list_props = [(prop, kind) for prop, kind in properties if isinstance(kind, tuple)]
+            if len(list_props) != 1 or len(properties) != 1:
+                raise MeshFormatError('Faces PLY com propriedades extras não são suportadas')
+            count_type, index_type = list_props[0][1]
+            # Fast path: every face is a triangle
+            tri_dtype = np.dtype([('n', endian + count_type), ('i', endian + index_type, 3)])
+            end = offset + tri_dtype.itemsize * count
+            if end <= len(data):
+                faces = np.frombuffer(data, dtype=tri_dtype, count=count, offset=offset)
+                if np.all(faces['n'] == 3):
+                    triangles = faces['i'].astype(np.int64)
+                    offset = end
+                    continue
+            # General case: polygons of varying size
+            count_size = np.dtype(count_type).itemsize
+            index_dtype = np.dtype(endian + index_type)
+            polygons = []
+            for _ in range(count):
+                n = int(np.frombuffer(data, dtype=endian + count_type, count=1, offset=offset)[0])
+                offset += count_size
+                polygons.append(np.frombuffer(data, dtype=index_dtype, count=n, offset=offset).tolist())
+                offset += n * index_dtype.itemsize
+            triangles = _fan_triangles(polygons)
+        else:
+            if any(isinstance(kind, tuple) for _, kind in properties):
+                raise MeshFormatError(f'Elemento PLY {name} com listas não é suportado')
+            dtype = np.dtype([(prop, endian + kind) for prop, kind in properties])
+            records = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += dtype.itemsize * count
+            if name == 'vertex':
+                vertices = records
+    if triangles is None:
+        raise MeshFormatError('PLY sem faces')
+    return _ply_vertex_mesh(vertices, triangles)
+
+
+_STL_VERTEX = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
+
+
+def parse_stl(data):
+    """Parse a binary or ASCII STL file"""
+    if len(data) >= 84:
+        (count,) = struct.unpack_from('<I', data, 80)
+        if 84 + count * 50 == len(data):
+            records = np.frombuffer(data, dtype=np.dtype([
+                ('normal', '<f4', 3), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')
+            ]), count=count, offset=84)
+            positions = records['vertices'].reshape(-1, 3).astype(np.float64)
+            return Mesh(positions, np.arange(len(positions), dtype=np.int64).reshape(-1, 3), None)
+
+    matches = _STL_VERTEX.findall(data)
+    if not matches or len(matches) % 3:
+        raise MeshFormatError('Arquivo STL inválido')
+    positions = np.array(matches, dtype=np.float64)
+    return Mesh(positions, np.arange(len(positions), dtype=np.int64).reshape(-1, 3), None)
+
+
+PARSERS = {'obj': parse_obj, 'ply': parse_ply, 'stl': parse_stl}
+
+
+def load_mesh(data, extension):
+    """
+    Parse mesh bytes.
+
+    Args:
+        data: File content
+        extension: obj, ply or stl
+
+    Returns:
+        Mesh
+
+    Raises:
+        MeshFormatError: If the file cannot be parsed
+    """
+    parser = PARSERS.get(extension)
+    if parser is None:
+        raise MeshFormatError(f'Formato não suportado para conversão: {extension}')
+    try:
+        mesh = parser(data)
+    except MeshFormatError:
+        raise
+    except (ValueError, IndexError, KeyError, struct.error) as exc:
+        raise MeshFormatError(f'Arquivo {extension.upper()} inválido: {exc}') from exc
+
+    triangles = mesh.triangles
+    if len(triangles) == 0 or triangles.min() < 0 or triangles.max() >= len(mesh.positions):
+        raise MeshFormatError('Índices de faces fora do intervalo de vértices')
+    if not np.all(np.isfinite(mesh.positions)):
+        raise MeshFormatError('Coordenadas de vértices inválidas')
+    return mesh
+
+
+# ---------------------------------------------------------------------------
+# Optimization and GLB encoding
+# ---------------------------------------------------------------------------
+
+def quantize_positions(positions):
+    """
+    Map positions to int16 on a uniform grid over the bounding box.
+
+    Returns:
+        Tuple (quantized int16 (N, 3), translation, scale) with
+        position ≈ quantized * scale + translation
+    """
+    low = positions.min(axis=0)
+    high = positions.max(axis=0)
+    translation = (low + high) / 2
+    extent = float((high - low).max())
+    scale = extent / 65534 if extent > 0 else 1.0
+    quantized = np.rint((positions - translation) / scale)
+    return np.clip(quantized, -32767, 32767).astype(np.int16), translation, scale
+
+
+def weld(quantized, triangles, colors=None):
+    """
+    Merge vertices that quantize to the same position (and color), drop
+    degenerate triangles and reorder vertices by first use in the index buffer.
+
+    Returns:
+        Tuple (quantized positions, triangles, colors or None)
+    """
+    keys = quantized.astype(np.int64)
+    if colors is not None:
+        keys = np.column_stack([keys, colors.astype(np.int64)])
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    triangles = inverse[triangles]
+
+    degenerate = ((triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2])
+                  | (triangles[:, 0] == triangles[:, 2]))
+    triangles = triangles[~degenerate]
+    if len(triangles) == 0:
+        raise MeshFormatError('A malha não possui triângulos válidos')
+
+    # Vertex fetch order: vertices appear in the order the triangles use them
+    used, first_use = np.unique(triangles.reshape(-1), return_index=True)
+    order = used[np.argsort(first_use)]
+    remap = np.empty(len(first), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+
+    source = first[order]  # Original vertex index of each output vertex
+    return (quantized[source], remap[triangles],
+            colors[source] if colors is not None else None)
+
+
+def vertex_normals(positions, triangles):
+    """Area-weighted vertex normals, quantized to int8 (normalized)"""
+    a, b, c = (positions[triangles[:, i]] for i in range(3))
+    face_normals = np.cross(b - a, c - a)
+    normals = np.zeros_like(positions)
+    for i in range(3):
+        np.add.at(normals, triangles[:, i], face_normals)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    return np.rint(normals * 127).astype(np.int8)
+
+
+def _pad(data, fill=b'\x00'):
+    return data + fill * (-len(data) % 4)
+
+
+def write_glb(quantized, triangles, translation, scale, colors=None):
+    """
+    Encode a welded, quantized mesh as GLB with KHR_mesh_quantization.
+
+    Positions are SHORT (padded to an 8-byte stride), normals normalized BYTE
+    and colors normalized UNSIGNED_BYTE (4-byte strides); indices use
+    UNSIGNED_SHORT when the vertex count allows.
+
+    Returns:
+        bytes
+    """
+    vertex_count = len(quantized)
+    normals = vertex_normals(quantized.astype(np.float64), triangles)
+
+    position_data = np.zeros((vertex_count, 4), dtype=np.int16)
+    position_data[:, :3] = quantized
+    normal_data = np.zeros((vertex_count, 4), dtype=np.int8)
+    normal_data[:, :3] = normals
+    index_type = np.uint16 if vertex_count <= 65535 else np.uint32
+
+    buffers = [
+        (position_data.tobytes(), 8, 34962),
+        (normal_data.tobytes(), 4, 34962),
+    ]
+    if colors is not None:
+        buffers.append((np.ascontiguousarray(colors, dtype=np.uint8).tobytes(), 4, 34962))
+    buffers.append((triangles.astype(index_type).tobytes(), None, 34963))
+
+    binary = b''
+    buffer_views = []
+    for data, stride, target in buffers:
+        view = {'buffer': 0, 'byteOffset': len(binary), 'byteLength': len(data), 'target': target}
+        if stride:
+            view['byteStride'] = stride
+        buffer_views.append(view)
+        binary += _pad(data)
+
+    accessors = [
+        {'bufferView': 0, 'componentType': 5122, 'count': vertex_count, 'type': 'VEC3',
+         'min': quantized.min(axis=0).tolist(), 'max': quantized.max(axis=0).tolist()},
+        {'bufferView': 1, 'componentType': 5120, 'normalized': True, 'count': vertex_count, 'type': 'VEC3'},
+    ]
+    attributes = {'POSITION': 0, 'NORMAL': 1}
+    if colors is not None:
+        accessors.append({'bufferView': 2, 'componentType': 5121, 'normalized': True,
+                          'count': vertex_count, 'type': 'VEC4'})
+        attributes['COLOR_0'] = 2
+    accessors.append({'bufferView': len(buffer_views) - 1,
+                      'componentType': 5123 if index_type is np.uint16 else 5125,
+                      'count': int(triangles.size), 'type': 'SCALAR'})
+
+    document = {
+        'asset': {'version': '2.0', 'generator': 'L.A.A.R.I mesh_pipeline'},
+        'extensionsUsed': ['KHR_mesh_quantization'],
+        'extensionsRequired': ['KHR_mesh_quantization'],
+        'scene': 0,
+        'scenes': [{'nodes': [0]}],
+        'nodes': [{'mesh': 0, 'translation': [float(v) for v in translation], 'scale': [float(scale)] * 3}],
+        'meshes': [{'primitives': [{'attributes': attributes, 'indices': len(accessors) - 1, 'material': 0}]}],
+        'materials': [{
+            'pbrMetallicRoughness': {
+                # Vertex colors multiply the base color, so white keeps them as scanned
+                'baseColorFactor': [1, 1, 1, 1] if colors is not None else [0.8, 0.7, 0.58, 1],
+                'metallicFactor': 0,
+                'roughnessFactor': 0.85,
+            },
+            'doubleSided': True,
+        }],
+        'accessors': accessors,
+        'bufferViews': buffer_views,
+        'buffers': [{'byteLength': len(binary)}],
+    }
+
+    json_chunk = _pad(json.dumps(document, separators=(',', ':')).encode('utf-8'), b' ')
+    total = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return b''.join([
+        struct.pack('<4sII', b'glTF', 2, total),
+        struct.pack('<I4s', len(json_chunk), b'JSON'), json_chunk,
+        struct.pack('<I4s', len(binary), b'BIN\x00'), binary,
+    ])
+
+
+# ---------------------------------------------------------------------------
+# Levels of detail
+# ---------------------------------------------------------------------------
+
+def _bincount3(index, values, size):
+    return np.column_stack([np.bincount(index, weights=values[:, i], minlength=size) for i in range(values.shape[1])])
+
+
+def decimate(quantized, triangles, colors, shift):
+    """
+    Simplify a quantized mesh by quadric-error vertex clustering.
+
+    Vertices are grouped into cubic cells of 2**shift quantization steps and
+    each cell collapses to the point minimizing the summed plane quadrics
+    (area-weighted) of the triangles touching it, regularized towards the
+    cell's mean so flat regions stay put. Triangles whose corners fall in
+    fewer than three cells disappear. Everything is vectorized, so
+    multi-million triangle scans simplify in seconds.
+
+    Args:
+        quantized: int16 (N, 3) positions from quantize_positions
+        triangles: int (T, 3) indices
+        colors: uint8 (N, 4) or None
+        shift: Cell size exponent; 16 - shift bits of each coordinate survive
+
+    Returns:
+        Tuple (quantized positions, triangles, colors or None) after weld(),
+        or None if nothing is left
+    """
+    bits = 16 - shift
+    cells = (quantized.astype(np.int64) + 32767) >> shift
+    keys = (cells[:, 0] << (2 * bits)) | (cells[:, 1] << bits) | cells[:, 2]
+    cell_keys, vertex_cell = np.unique(keys, return_inverse=True)
+    vertex_cell = vertex_cell.reshape(-1)
+    cell_count = len(cell_keys)
+
+    points = quantized.astype(np.float64)
+    a, b, c = (points[triangles[:, i]] for i in range(3))
+    normals = np.cross(b - a, c - a)
+    double_area = np.linalg.norm(normals, axis=1)
+    normals = np.divide(normals, double_area[:, None], out=np.zeros_like(normals), where=double_area[:, None] > 0)
+    offsets = -np.einsum('ij,ij->i', normals, a)
+    weights = double_area / 2
+
+    # Sum of w * (n n^T) and w * n * d over the faces touching each cell
+    corner_cells = vertex_cell[triangles].reshape(-1)
+    pairs = [(0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (2, 2)]
+    quadric = np.zeros((cell_count, 3, 3))
+    for i, j in pairs:
+        entry = np.bincount(corner_cells, weights=np.repeat(weights * normals[:, i] * normals[:, j], 3),
+                            minlength=cell_count)
+        quadric[:, i, j] = entry
+        quadric[:, j, i] = entry
+    linear = _bincount3(corner_cells, np.repeat(weights[:, None] * offsets[:, None] * normals, 3, axis=0),
+                        cell_count)
+
+    counts = np.bincount(vertex_cell, minlength=cell_count)[:, None]
+    mean = _bincount3(vertex_cell, points, cell_count) / counts
+
+    # (Q + eps I) x = eps * mean - b pulls under-determined directions to the mean
+    eps = 1e-3 * np.trace(quadric, axis1=1, axis2=2) / 3 + 1e-9
+    quadric += eps[:, None, None] * np.eye(3)
+    optimal = np.linalg.solve(quadric, (eps[:, None] * mean - linear)[..., None])[..., 0]
+
+    # Keep each vertex near its cell so thin features do not spike
+    size = 1 << shift
+    cell_coords = np.column_stack([(cell_keys >> (2 * bits)) & ((1 << bits) - 1),
+                                   (cell_keys >> bits) & ((1 << bits) - 1),
+                                   cell_keys & ((1 << bits) - 1)]) * size - 32767
+    optimal = np.clip(optimal, cell_coords - size, cell_coords + 2 * size)
+    cell_positions = np.clip(np.rint(optimal), -32767, 32767).astype(np.int16)
+
+    cell_colors = None
+    if colors is not None:
+        cell_colors = np.rint(_bincount3(vertex_cell, colors.astype(np.float64), cell_count) / counts).astype(np.uint8)
+
+    simplified = vertex_cell[triangles]
+    simplified = simplified[(simplified[:, 0] != simplified[:, 1]) & (simplified[:, 1] != simplified[:, 2])
+                            & (simplified[:, 0] != simplified[:, 2])]
+    if len(simplified) == 0:
+        return None
+    # The same three cells can be produced by several triangles
+    _, unique_rows = np.unique(np.sort(simplified, axis=1), axis=0, return_index=True)
+    simplified = simplified[np.sort(unique_rows)]
+
+    try:
+        return weld(cell_positions, simplified, cell_colors)
+    except MeshFormatError:
+        return None
+
+
+def build_lods(quantized, triangles, colors):
+    """
+    Coarser versions of a mesh for progressive loading.
+
+    One level is tried per LOD_CLUSTER_SHIFTS entry, and a level is kept only
+    if it has at most LOD_MAX_RATIO of the triangles of the next finer one.
+
+    Returns:
+        List of (quantized positions, triangles, colors) tuples, coarsest first
+    """
+    if len(triangles) < LOD_MIN_TRIANGLES:
+        return []
+
+    lods = []
+    finer_count = len(triangles)
+    for shift in sorted(LOD_CLUSTER_SHIFTS):
+        lod = decimate(quantized, triangles, colors, shift)
+        if lod is None or len(lod[1]) < LOD_MIN_LEVEL_TRIANGLES:
+            break
+        if len(lod[1]) <= finer_count * LOD_MAX_RATIO:
+            lods.append(lod)
+            finer_count = len(lod[1])
+    return lods[::-1]
+
+
+# ---------------------------------------------------------------------------
+# Preview images
+# ---------------------------------------------------------------------------
+
+_GLB_COMPONENT_TYPES = {5120: np.int8, 5121: np.uint8, 5122: np.int16, 5123: np.uint16, 5125: np.uint32, 5126: np.float32}
+_GLB_TYPE_SIZES = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4}
+
+
+def _glb_accessor(document, binary, index):
+    accessor = document['accessors'][index]
+    view = document['bufferViews'][accessor['bufferView']]
+    dtype = np.dtype(_GLB_COMPONENT_TYPES[accessor['componentType']])
+    width = _GLB_TYPE_SIZES[accessor['type']]
+    count = accessor['count']
+    stride = view.get('byteStride') or dtype.itemsize * width
+    offset = view.get('byteOffset', 0) + accessor.get('byteOffset', 0)
+    if offset + stride * (count - 1) + dtype.itemsize * width > len(binary):
+        raise MeshFormatError('Acessor fora do buffer binário')
+    values = np.ndarray((count, width), dtype=dtype, buffer=binary, offset=offset,
+                        strides=(stride, dtype.itemsize)).astype(np.float64)
+    if accessor.get('normalized') and dtype.kind in 'iu':
+        values = np.maximum(values / np.iinfo(dtype).max, -1.0)
+    return values
+
+
+def _glb_node_matrix(node):
+    if 'matrix' in node:
+        return np.array(node['matrix'], dtype=np.float64).reshape(4, 4).T  # Stored column-major
+    x, y, z, w = node.get('rotation', [0, 0, 0, 1])
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+    matrix = np.eye(4)
+    matrix[:3, :3] = rotation * np.array(node.get('scale', [1, 1, 1]))
+    matrix[:3, 3] = node.get('translation', [0, 0, 0])
+    return matrix
+
+
+def parse_glb(data):
+    """
+    Read the triangles of a GLB file's default scene in world coordinates.
+
+    Only what a preview needs: indexed or plain triangle primitives stored in
+    the embedded binary chunk. Materials and textures are ignored, and Draco
+    or meshopt compressed primitives are not supported.
+
+    Returns:
+        Mesh without colors
+
+    Raises:
+        MeshFormatError: If the file cannot be read
+    """
+    try:
+        magic, version, _ = struct.unpack_from('<4sII', data, 0)
+        if magic != b'glTF' or version != 2:
+            raise MeshFormatError('Arquivo GLB inválido')
+        json_length, json_type = struct.unpack_from('<I4s', data, 12)
+        document = json.loads(data[20:20 + json_length])
+        binary = b''
+        if len(data) > 28 + json_length:
+            binary_length, _ = struct.unpack_from('<I4s', data, 20 + json_length)
+            binary = data[28 + json_length:28 + json_length + binary_length]
+
+        nodes = document.get('nodes', [])
+        scenes = document.get('scenes')
+        if scenes:
+            roots = scenes[document.get('scene', 0)].get('nodes', [])
+        else:
+            children = {child for node in nodes for child in node.get('children', [])}
+            roots = [index for index in range(len(nodes)) if index not in children]
+
+        positions = []
+        triangles = []
+        vertex_count = 0
+        stack = [(index, np.eye(4)) for index in roots]
+        while stack:
+            index, parent = stack.pop()
+            node = nodes[index]
+            matrix = parent @ _glb_node_matrix(node)
+            stack.extend((child, matrix) for child in node.get('children', []))
+            if 'mesh' not in node:
+                continue
+            for primitive in document['meshes'][node['mesh']]['primitives']:
+                if primitive.get('mode', 4) != 4 or 'POSITION' not in primitive['attributes']:
+                    continue
+                if primitive.get('extensions'):
+                    raise MeshFormatError('Modelos GLB comprimidos não são suportados')
+                points = _glb_accessor(document, binary, primitive['attributes']['POSITION'])
+                if 'indices' in primitive:
+                    indices = _glb_accessor(document, binary, primitive['indices']).astype(np.int64)
+                else:
+                    indices = np.arange(len(points))
+                indices = indices.reshape(-1)[:len(indices) // 3 * 3].reshape(-1, 3)
+                positions.append(points @ matrix[:3, :3].T + matrix[:3, 3])
+                triangles.append(indices + vertex_count)
+                vertex_count += len(points)
+    except MeshFormatError:
+        raise
+    except (ValueError, IndexError, KeyError, TypeError, struct.error) as exc:
+        raise MeshFormatError(f'Arquivo GLB inválido: {exc}') from exc
+
+    if not triangles:
+        raise MeshFormatError('Nenhum triângulo encontrado no arquivo GLB')
+    mesh = Mesh(np.concatenate(positions), np.concatenate(triangles), None)
+    if mesh.triangles.min() < 0 or mesh.triangles.max() >= len(mesh.positions):
+        raise MeshFormatError('Índices de faces fora do intervalo de vértices')
+    if not np.all(np.isfinite(mesh.positions)):
+        raise MeshFormatError('Coordenadas de vértices inválidas')
+    return mesh
+
+
+def render_preview(positions, triangles, colors=None, size=PREVIEW_SIZE):
+    """
+    Render a mesh to a small JPEG on the CPU.
+
+    The camera looks from the same direction as the viewer's initial view,
+    with an orthographic projection fitted to the model. Faces are flat-shaded
+    by the viewer's two lights (both sides lit, so inconsistent winding
+    does not matter) and painted back to front with Pillow on a
+    supersampled canvas. Meshes above PREVIEW_MAX_TRIANGLES are simplified
+    first by decimate().
+
+    Args:
+        positions: float (N, 3)
+        triangles: int (T, 3)
+        colors: uint8 (N, 4) vertex colors or None for the default clay color
+        size: Width and height of the image in pixels
+
+    Returns:
+        JPEG bytes
+    """
+    from PIL import Image, ImageDraw
+
+    if len(triangles) > PREVIEW_MAX_TRIANGLES:
+        quantized, translation, scale = quantize_positions(positions)
+        quantized, triangles, colors = weld(quantized, triangles, colors)
+        for shift in sorted(LOD_CLUSTER_SHIFTS):
+            simplified = decimate(quantized, triangles, colors, shift)
+            if simplified is not None and len(simplified[1]) <= PREVIEW_MAX_TRIANGLES:
+                quantized, triangles, colors = simplified
+                break
+        positions = quantized * scale + translation
+
+    eye = np.array(PREVIEW_VIEW_DIRECTION, dtype=np.float64)
+    eye /= np.linalg.norm(eye)
+    right = np.cross([0.0, 1.0, 0.0], eye)
+    right /= np.linalg.norm(right)
+    up = np.cross(eye, right)
+
+    a, b, c = (positions[triangles[:, i]] for i in range(3))
+    normals = np.cross(b - a, c - a)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+    normals[normals @ eye < 0] *= -1  # Light the side facing the camera
+
+    shade = np.full(len(triangles), PREVIEW_AMBIENT)
+    for direction, intensity in PREVIEW_LIGHTS:
+        direction = np.array(direction, dtype=np.float64) / np.linalg.norm(direction)
+        shade += intensity * np.clip(normals @ direction, 0, None)
+    if colors is not None:
+        base = colors[triangles, :3].astype(np.float64).mean(axis=1)
+    else:
+        base = np.array(PREVIEW_BASE_COLOR, dtype=np.float64)
+    face_colors = np.clip(base * shade[:, None], 0, 255).astype(np.uint8)
+
+    canvas_size = size * PREVIEW_SUPERSAMPLING
+    screen = np.column_stack([positions @ right, -(positions @ up)])
+    low = screen.min(axis=0)
+    extent = float((screen.max(axis=0) - low).max()) or 1.0
+    fit = canvas_size * (1 - 2 * PREVIEW_MARGIN) / extent
+    offset = (canvas_size - (screen.max(axis=0) - low) * fit) / 2
+    screen = (screen - low) * fit + offset
+
+    depth = (positions @ eye)[triangles].mean(axis=1)
+    order = np.argsort(depth)  # Farthest first; nearer faces paint over them
+    corners = screen[triangles[order]].tolist()
+    fills = [tuple(color) for color in face_colors[order].tolist()]
+
+    image = Image.new('RGB', (canvas_size, canvas_size), PREVIEW_BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    for corner, fill in zip(corners, fills):
+        draw.polygon([tuple(point) for point in corner], fill=fill)
+
+    output = io.BytesIO()
+    image.resize((size, size), Image.LANCZOS).save(output, 'JPEG', quality=PREVIEW_JPEG_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+def render_glb_preview(data):
+    """Preview JPEG for a GLB upload. Runs in the process pool."""
+    mesh = parse_glb(data)
+    return render_preview(mesh.positions, mesh.triangles)
+
+
+def convert_to_glb(data, extension):
+    """
+    Convert OBJ/PLY/STL bytes to an optimized GLB plus its levels of detail
+    and a preview image. Runs in the process pool.
+
+    Returns:
+        Tuple (glb bytes, stats dict with vertices and triangles,
+        list of (lod glb bytes, triangles) coarsest first, preview JPEG bytes)
+
+    Raises:
+        MeshFormatError: If the file cannot be parsed
+    """
+    mesh = load_mesh(data, extension)
+    quantized, translation, scale = quantize_positions(mesh.positions)
+    quantized, triangles, colors = weld(quantized, mesh.triangles, mesh.colors)
+    glb = write_glb(quantized, triangles, translation, scale, colors)
+
+    levels = build_lods(quantized, triangles, colors)
+    # Same translation/scale as the full model, so every level lines up in the viewer
+    lods = [
+        (write_glb(lod_positions, lod_triangles, translation, scale, lod_colors), len(lod_triangles))
+        for lod_positions, lod_triangles, lod_colors in levels
+    ]
+
+    # The finest level small enough to draw directly
+    levels.append((quantized, triangles, colors))
+    preview_positions, preview_triangles, preview_colors = next(
+        (level for level in reversed(levels) if len(level[1]) <= PREVIEW_MAX_TRIANGLES), levels[0]
+    )
+    preview = render_preview(preview_positions * scale + translation, preview_triangles, preview_colors)
+    return glb, {'vertices': len(quantized), 'triangles': len(triangles)}, lods, preview
+
+
+# ---------------------------------------------------------------------------
+# Worker pool and Scanner3D bookkeeping
+# ---------------------------------------------------------------------------
+
+_process_pool = None
+_dispatch_pool = None
+_pool_lock = threading.Lock()
+_pool_pid = None
+
+
+def _pools():
+    """Per-process pools: conversion processes plus threads that wait on them"""
+    global _process_pool, _dispatch_pool, _pool_pid
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            _process_pool = ProcessPoolExecutor(
+                max_workers=MESH_CONVERSION_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _dispatch_pool = ThreadPoolExecutor(max_workers=MESH_CONVERSION_WORKERS,
+                                                thread_name_prefix='mesh-optimizer')
+            _pool_pid = os.getpid()
+        return _process_pool, _dispatch_pool
+
+
+def _replace_process_pool(pool):
+    """Swap in a fresh process pool if `pool` is still the current one, killing its processes"""
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is not pool:
+            return  # Another thread already replaced it
+        _process_pool = ProcessPoolExecutor(
+            max_workers=MESH_CONVERSION_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    # A hung conversion would otherwise keep running (and holding memory) after shutdown
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_in_pool(function, *args):
+    """
+    Run a CPU-bound function in the conversion processes and wait for it.
+
+    A pool broken by a dying child (e.g. killed for memory on a huge scan) or
+    stuck past MESH_CONVERSION_TIMEOUT is replaced, so later conversions in
+    this worker keep working; the error is raised for the current scan.
+    """
+    process_pool, _ = _pools()
+    try:
+        return process_pool.submit(function, *args).result(timeout=MESH_CONVERSION_TIMEOUT)
+    except BrokenProcessPool as exc:
+        _replace_process_pool(process_pool)
+        raise RuntimeError('Processo de conversão interrompido (memória insuficiente?)') from exc
+    except FutureTimeoutError as exc:
+        _replace_process_pool(process_pool)
+        raise RuntimeError(f'Conversão excedeu {MESH_CONVERSION_TIMEOUT} segundos') from exc
+
+
+def _claim(scan_id, statuses):
+    """Atomically move a scan to processing; False if another worker already has it"""
+    from app import db
+    from models import Scanner3D
+
+    claimed = db.session.execute(
+        db.update(Scanner3D)
+        .where(Scanner3D.id == scan_id, Scanner3D.optimization_status.in_(statuses))
+        .values(optimization_status=STATUS_PROCESSING, optimization_updated_at=datetime.utcnow(),
+                optimization_attempts=db.func.coalesce(Scanner3D.optimization_attempts, 0) + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def optimize_scan(scan_id, force=False):
+    """
+    Convert one scan's original file to an optimized GLB and record it, or
+    only render the preview of a GLB upload.
+
+    Must run inside an app context. The conversion itself runs in the process pool.
+
+    Args:
+        scan_id: Scanner3D id
+        force: Convert again even if the scan is not pending
+
+    Returns:
+        The resulting optimization status, or None if the scan was not claimed
+    """
+    from app import db
+    from models import Scanner3D
+    from storage import download_file
+
+    statuses = [STATUS_PENDING]
+    if force:
+        statuses += [STATUS_DONE, STATUS_FAILED, STATUS_PROCESSING, STATUS_SKIPPED]
+    if not _claim(scan_id, statuses):
+        return None
+
+    scan = db.session.get(Scanner3D, scan_id)
+    extension = file_extension(scan.file_path)
+    # A GLB upload stays the viewer file even when its preview cannot be rendered
+    status = STATUS_SKIPPED if extension in PREVIEW_ONLY_EXTENSIONS else STATUS_FAILED
+    try:
+        data = download_file(scan.file_path)
+        if not data:
+            raise MeshFormatError('Arquivo original não encontrado')
+        base_name = os.path.splitext((scan.file_path or '').split('?', 1)[0].rsplit('/', 1)[-1])[0]
+        base_name = re.sub(r'^[0-9a-f]{32}_', '', base_name)  # Drop the unique prefix of the original upload
+
+        if extension in PREVIEW_ONLY_EXTENSIONS:
+            preview = _run_in_pool(render_glb_preview, data)
+            _store_preview(scan, preview, base_name)
+            scan.optimization_error = None
+            logger.info('Prévia do scan 3D %s gerada', scan_id)
+        else:
+            _convert_scan(scan, data, extension, base_name)
+            status = STATUS_DONE
+    except Exception as exc:
+        logger.exception('Falha ao otimizar o scan 3D %s', scan_id)
+        scan.optimization_error = str(exc)[:255]
+
+    scan.optimization_status = status
+    scan.optimization_updated_at = datetime.utcnow()
+    scan.optimization_attempts = 0  # Only claims that never got here count
+    db.session.commit()
+    return status
+
+
+def _convert_scan(scan, data, extension, base_name):
+    """Store the optimized GLB, levels of detail and preview of a convertible scan"""
+    from werkzeug.datastructures import FileStorage
+
+    from models import Scanner3DLod
+    from storage import delete_file, upload_file
+
+    glb, stats, lods, preview = _run_in_pool(convert_to_glb, data, extension)
+    uploaded = []
+    for filename, content in [(f'{base_name}.glb', glb)] + [
+        (f'{base_name}_lod{level}.glb', lod_glb) for level, (lod_glb, _) in enumerate(lods)
+    ]:
+        path = upload_file(
+            FileStorage(stream=io.BytesIO(content), filename=filename, content_type='model/gltf-binary'),
+            OPTIMIZED_FOLDER
+        )
+        if not path:
+            for stored in uploaded:
+                delete_file(stored)
+            raise RuntimeError('Falha ao salvar o modelo otimizado')
+        uploaded.append(path)
+
+    previous = [scan.optimized_file_path] + [lod.file_path for lod in scan.lods]
+    scan.optimized_file_path = uploaded[0]
+    scan.optimized_file_size = len(glb)
+    scan.triangle_count = stats['triangles']
+    scan.lods = [
+        Scanner3DLod(level=level, file_path=path, file_size=len(lod_glb), triangle_count=triangle_count)
+        for level, (path, (lod_glb, triangle_count)) in enumerate(zip(uploaded[1:], lods))
+    ]
+    scan.optimization_error = None
+    for path in previous:
+        if path:
+            delete_file(path)
+    try:
+        _store_preview(scan, preview, base_name)
+    except Exception:
+        # The optimized model is already stored; the list falls back to an icon
+        logger.exception('Falha ao salvar a prévia do scan 3D %s', scan.id)
+    logger.info('Scan 3D %s otimizado: %d bytes -> %d bytes, %d triângulos, níveis de detalhe: %s',
+                scan.id, len(data), len(glb), stats['triangles'],
+                [triangle_count for _, triangle_count in lods] or '-')
+
+
+def _store_preview(scan, preview, base_name):
+    """Upload a preview JPEG and replace the scan's previous one"""
+    from werkzeug.datastructures import FileStorage
+
+    from storage import delete_file, upload_file
+
+    path = upload_file(
+        FileStorage(stream=io.BytesIO(preview), filename=f'{base_name}.jpg', content_type='image/jpeg'),
+        PREVIEW_FOLDER
+    )
+    if not path:
+        raise RuntimeError('Falha ao salvar a prévia do modelo')
+    previous = scan.preview_path
+    scan.preview_path = path
+    if previous and previous != path:
+        delete_file(previous)
+
+
+def _optimize_in_background(scan_id):
+    from app import app
+
+    with app.app_context():
+        try:
+            optimize_scan(scan_id)
+        except Exception:
+            logger.exception('Falha ao otimizar o scan 3D %s', scan_id)
+
+
+def queue_scan_optimization(scan_id):
+    """Convert a committed scan in the background (no-op unless it is pending)"""
+    _, dispatch_pool = _pools()
+    dispatch_pool.submit(_optimize_in_background, scan_id)
+
+
+def pending_scan_ids(limit=None):
+    """
+    Scans waiting for conversion, including conversions lost with their worker.
+
+    A lost conversion is requeued behind the scans already waiting, and after
+    MAX_OPTIMIZATION_ATTEMPTS claims that never finished (a scan that takes
+    its worker down every time) it is marked failed instead.
+
+    Returns:
+        List of Scanner3D ids, oldest first
+    """
+    from app import db
+    from models import Scanner3D
+
+    now = datetime.utcnow()
+    lost = (Scanner3D.optimization_status == STATUS_PROCESSING,
+            Scanner3D.optimization_updated_at < now - PROCESSING_TIMEOUT)
+    attempts = db.func.coalesce(Scanner3D.optimization_attempts, 0)
+    db.session.execute(
+        db.update(Scanner3D)
+        .where(*lost, attempts >= MAX_OPTIMIZATION_ATTEMPTS)
+        .values(optimization_status=STATUS_FAILED, optimization_updated_at=now, optimization_attempts=0,
+                optimization_error=f'Conversão interrompida {MAX_OPTIMIZATION_ATTEMPTS} vezes; desistindo')
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        db.update(Scanner3D)
+        .where(*lost)
+        .values(optimization_status=STATUS_PENDING, optimization_updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    # New uploads wait since their scan date, requeued scans since they were requeued
+    query = db.select(Scanner3D.id).where(Scanner3D.optimization_status == STATUS_PENDING) \
+        .order_by(db.func.coalesce(Scanner3D.optimization_updated_at, Scanner3D.scan_date), Scanner3D.id)
+    if limit:
+        query = query.limit(limit)
+    return db.session.execute(query).scalars().all()
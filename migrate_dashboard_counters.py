@@ -0,0 +1,21 @@
+"""
+Migration script for the dashboard counters.
+Creates the dashboard_counter table and fills it from the artifact, professional
+and transport tables; afterwards it is kept up to date on every write.
+"""
+from app import app, db
+from dashboard_stats import rebuild_counters
+
+def migrate_dashboard_counters():
+    """Create and populate dashboard_counter"""
+    with app.app_context():
+        db.create_all()
+        
+        written = rebuild_counters()
+        db.session.commit()
+        
+        print(f"\nMigration completed successfully!")
+        print(f"Dashboard counters written: {written}")
+
+if __name__ == '__main__':
+    migrate_dashboard_counters()
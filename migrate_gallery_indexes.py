@@ -0,0 +1,25 @@
+"""
+Migration script to add the indexes used by the paginated gallery page and API.
+db.create_all() only creates indexes for new tables, so existing databases need them added here.
+"""
+from sqlalchemy import text
+from app import app, db
+
+GALLERY_INDEXES = {
+    'ix_photo_gallery_category_published_created': 'photo_gallery (category, is_published, created_at, id)',
+    'ix_photo_gallery_created_at_id': 'photo_gallery (created_at, id)',
+    'ix_photo_gallery_updated_at': 'photo_gallery (updated_at)',
+}
+
+def migrate_gallery_indexes():
+    """Create the gallery indexes when missing"""
+    with app.app_context():
+        for name, target in GALLERY_INDEXES.items():
+            db.session.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {target}'))
+            print(f"Index {name} ready")
+        db.session.commit()
+        
+        print(f"\nMigration completed successfully!")
+
+if __name__ == '__main__':
+    migrate_gallery_indexes()
@@ -0,0 +1,61 @@
+"""
+Migration script for the low-quality image placeholders.
+Adds artifact.photo_placeholder, photo_gallery.image_placeholder and
+professional.profile_photo_placeholder, then builds the placeholder of every
+image already in storage (Cloudinary images are fetched at thumbnail size).
+"""
+from sqlalchemy import inspect, text
+from app import app, db
+from storage import stored_image_placeholder
+
+# table -> (image column, placeholder column)
+PLACEHOLDER_COLUMNS = {
+    'artifact': ('photo_path', 'photo_placeholder'),
+    'photo_gallery': ('image_path', 'image_placeholder'),
+    'professional': ('profile_photo', 'profile_photo_placeholder'),
+}
+
+BATCH_SIZE = 100
+
+def migrate_image_placeholders():
+    """Add the placeholder columns and backfill them"""
+    with app.app_context():
+        # db.create_all() does not add columns to existing tables
+        for table, (image_column, placeholder_column) in PLACEHOLDER_COLUMNS.items():
+            columns = {column['name'] for column in inspect(db.engine).get_columns(table)}
+            if placeholder_column not in columns:
+                db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {placeholder_column} TEXT'))
+                db.session.commit()
+                print(f"Added {table}.{placeholder_column} column")
+
+        for table, (image_column, placeholder_column) in PLACEHOLDER_COLUMNS.items():
+            built = missing = 0
+            last_id = 0
+            while True:
+                rows = db.session.execute(text(
+                    f'SELECT id, {image_column} FROM {table} '
+                    f'WHERE id > :last_id AND {image_column} IS NOT NULL AND {placeholder_column} IS NULL '
+                    f'ORDER BY id LIMIT :limit'
+                ), {'last_id': last_id, 'limit': BATCH_SIZE}).all()
+                if not rows:
+                    break
+
+                for row_id, image_path in rows:
+                    placeholder = stored_image_placeholder(image_path)
+                    if placeholder:
+                        db.session.execute(
+                            text(f'UPDATE {table} SET {placeholder_column} = :placeholder WHERE id = :id'),
+                            {'placeholder': placeholder, 'id': row_id}
+                        )
+                        built += 1
+                    else:
+                        missing += 1
+                db.session.commit()
+                last_id = rows[-1][0]
+
+            print(f"{table}: {built} placeholders built, {missing} images unavailable")
+
+        print(f"\nMigration completed successfully!")
+
+if __name__ == '__main__':
+    migrate_image_placeholders()
@@ -0,0 +1,67 @@
+"""
+Migration script to move Excel import batches from observation text to the ImportBatch table.
+Adds artifact.import_batch_id (with its index) to existing databases and links artifacts
+whose observations carry the legacy "[Importado via Excel - Lote: IMPORT-XXXX]" marker.
+"""
+import re
+from sqlalchemy import inspect, text
+from app import app, db
+from models import Artifact, ImportBatch
+
+LEGACY_MARKER = re.compile(r'\s*\[Importado via Excel - Lote: (IMPORT-[0-9A-F]+)\]\s*$')
+
+def migrate_import_batches():
+    """Create the import_batch schema and backfill batches from legacy observation markers"""
+    with app.app_context():
+        db.create_all()
+
+        # db.create_all() does not add columns to existing tables
+        columns = {column['name'] for column in inspect(db.engine).get_columns('artifact')}
+        if 'import_batch_id' not in columns:
+            db.session.execute(text('ALTER TABLE artifact ADD COLUMN import_batch_id INTEGER REFERENCES import_batch (id)'))
+            db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_artifact_import_batch_id ON artifact (import_batch_id)'))
+            db.session.commit()
+            print("Added artifact.import_batch_id column and index")
+
+        # One-time LIKE scan to find legacy batches
+        legacy_artifacts = Artifact.query.filter(
+            Artifact.import_batch_id.is_(None),
+            Artifact.observations.like('%[Importado via Excel - Lote: IMPORT-%')
+        ).all()
+
+        batches = {batch.batch_code: batch for batch in ImportBatch.query.all()}
+        linked_count = 0
+
+        for artifact in legacy_artifacts:
+            match = LEGACY_MARKER.search(artifact.observations or '')
+            if not match:
+                continue
+
+            batch_code = match.group(1)
+            batch = batches.get(batch_code)
+            if not batch:
+                batch = ImportBatch(
+                    batch_code=batch_code,
+                    user_id=artifact.user_id,
+                    created_at=artifact.created_at,
+                    total_rows=0,
+                    imported_count=0,
+                    skipped_count=0
+                )
+                db.session.add(batch)
+                batches[batch_code] = batch
+                print(f"Created batch {batch_code}")
+
+            batch.total_rows += 1
+            batch.imported_count += 1
+            artifact.import_batch = batch
+            artifact.observations = LEGACY_MARKER.sub('', artifact.observations)
+            linked_count += 1
+
+        db.session.commit()
+
+        print(f"\nMigration completed successfully!")
+        print(f"Artifacts linked to import batches: {linked_count}")
+
+if __name__ == '__main__':
+    migrate_import_batches()
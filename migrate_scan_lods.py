@@ -0,0 +1,30 @@
+"""
+Migration script for the levels of detail of 3D models.
+Creates the scanner3_d_lod table and queues already optimized scans large
+enough to get LODs, so the optimize_3d_models maintenance job (or
+`flask optimize-3d-models`) reconverts them.
+"""
+from app import app, db
+from models import Scanner3D, Scanner3DLod
+from mesh_pipeline import LOD_MIN_TRIANGLES, STATUS_DONE, STATUS_PENDING
+
+def migrate_scan_lods():
+    """Create the LOD table and queue large optimized scans"""
+    with app.app_context():
+        db.create_all()
+        print(f"Table {Scanner3DLod.__tablename__} ready")
+
+        scans = Scanner3D.query.filter(
+            Scanner3D.optimization_status == STATUS_DONE,
+            Scanner3D.triangle_count >= LOD_MIN_TRIANGLES,
+            ~Scanner3D.lods.any()
+        ).all()
+        for scan in scans:
+            scan.optimization_status = STATUS_PENDING
+        db.session.commit()
+
+        print(f"\nMigration completed successfully!")
+        print(f"Scans queued for level of detail generation: {len(scans)}")
+
+if __name__ == '__main__':
+    migrate_scan_lods()
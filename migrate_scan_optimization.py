@@ -0,0 +1,46 @@
+"""
+Migration script for optimized 3D models.
+Adds the Scanner3D columns that hold the optimized GLB converted from each
+uploaded scan and marks existing OBJ/PLY/STL scans as pending, so the
+optimize_3d_models maintenance job (or `flask optimize-3d-models`) converts them.
+"""
+from sqlalchemy import inspect, text
+from app import app, db
+from models import Scanner3D
+from mesh_pipeline import STATUS_PENDING, initial_status
+
+SCAN_COLUMNS = {
+    'optimized_file_path': 'VARCHAR(500)',
+    'optimized_file_size': 'INTEGER',
+    'optimization_status': 'VARCHAR(20)',
+    'optimization_error': 'VARCHAR(255)',
+    'optimization_updated_at': 'TIMESTAMP',
+    'optimization_attempts': 'INTEGER DEFAULT 0',
+    'triangle_count': 'INTEGER',
+}
+
+def migrate_scan_optimization():
+    """Add the optimization columns and queue existing scans"""
+    with app.app_context():
+        table = Scanner3D.__tablename__
+
+        # db.create_all() does not add columns to existing tables
+        columns = {column['name'] for column in inspect(db.engine).get_columns(table)}
+        for name, column_type in SCAN_COLUMNS.items():
+            if name not in columns:
+                db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}'))
+                print(f"Added {table}.{name} column")
+        db.session.commit()
+
+        queued = 0
+        scans = Scanner3D.query.filter(Scanner3D.file_path.isnot(None), Scanner3D.optimization_status.is_(None)).all()
+        for scan in scans:
+            scan.optimization_status = initial_status(scan.file_path)
+            queued += scan.optimization_status == STATUS_PENDING
+        db.session.commit()
+
+        print(f"\nMigration completed successfully!")
+        print(f"Scans queued for optimization: {queued} of {len(scans)}")
+
+if __name__ == '__main__':
+    migrate_scan_optimization()
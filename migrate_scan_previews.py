@@ -0,0 +1,40 @@
+"""
+Migration script for the 3D model preview images.
+Adds scanner3_d.preview_path and queues existing OBJ/PLY/STL/GLB scans
+without a preview, so the optimize_3d_models maintenance job (or
+`flask optimize-3d-models`) renders them.
+"""
+from sqlalchemy import inspect, text
+from app import app, db
+from models import Scanner3D
+from mesh_pipeline import CONVERTIBLE_EXTENSIONS, PREVIEW_ONLY_EXTENSIONS, STATUS_PENDING, STATUS_PROCESSING, file_extension
+
+def migrate_scan_previews():
+    """Add the preview column and queue scans without a preview"""
+    with app.app_context():
+        table = Scanner3D.__tablename__
+
+        # db.create_all() does not add columns to existing tables
+        columns = {column['name'] for column in inspect(db.engine).get_columns(table)}
+        if 'preview_path' not in columns:
+            db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN preview_path VARCHAR(500)'))
+            db.session.commit()
+            print(f"Added {table}.preview_path column")
+
+        queued = 0
+        scans = Scanner3D.query.filter(
+            Scanner3D.file_path.isnot(None),
+            Scanner3D.preview_path.is_(None),
+            Scanner3D.optimization_status.notin_([STATUS_PENDING, STATUS_PROCESSING])
+        ).all()
+        for scan in scans:
+            if file_extension(scan.file_path) in CONVERTIBLE_EXTENSIONS | PREVIEW_ONLY_EXTENSIONS:
+                scan.optimization_status = STATUS_PENDING
+                queued += 1
+        db.session.commit()
+
+        print(f"\nMigration completed successfully!")
+        print(f"Scans queued for preview rendering: {queued}")
+
+if __name__ == '__main__':
+    migrate_scan_previews()
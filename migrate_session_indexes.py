@@ -0,0 +1,26 @@
+"""
+Migration script to add the indexes used by the session monitoring queries.
+db.create_all() only creates indexes for new tables, so existing databases need them added here.
+"""
+from sqlalchemy import text
+from app import app, db
+
+SESSION_INDEXES = {
+    'ix_user_session_user_id': 'user_session (user_id)',
+    'ix_user_session_login_at': 'user_session (login_at)',
+    'ix_user_session_logout_at': 'user_session (logout_at)',
+    'ix_user_session_active_last_activity': 'user_session (is_active, last_activity)',
+}
+
+def migrate_session_indexes():
+    """Create the user_session indexes when missing"""
+    with app.app_context():
+        for name, target in SESSION_INDEXES.items():
+            db.session.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {target}'))
+            print(f"Index {name} ready")
+        db.session.commit()
+        
+        print(f"\nMigration completed successfully!")
+
+if __name__ == '__main__':
+    migrate_session_indexes()
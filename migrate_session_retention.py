@@ -0,0 +1,53 @@
+"""
+Migration script for UserSession retention.
+Creates the user_agent lookup and user_session_archive tables (partitioned by month on
+PostgreSQL), adds user_session.user_agent_id and moves the stored User-Agent strings
+into the lookup table.
+"""
+import hashlib
+from sqlalchemy import inspect, text
+from app import app, db
+from models import UserAgent
+
+def migrate_session_retention():
+    """Create retention tables and deduplicate stored User-Agent strings"""
+    with app.app_context():
+        db.create_all()
+
+        # db.create_all() does not add columns to existing tables
+        columns = {column['name'] for column in inspect(db.engine).get_columns('user_session')}
+        if 'user_agent_id' not in columns:
+            db.session.execute(text('ALTER TABLE user_session ADD COLUMN user_agent_id INTEGER REFERENCES user_agent (id)'))
+            db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_user_session_user_agent_id ON user_session (user_agent_id)'))
+            db.session.commit()
+            print("Added user_session.user_agent_id column and index")
+
+        distinct_agents = db.session.execute(text(
+            'SELECT DISTINCT user_agent FROM user_session WHERE user_agent IS NOT NULL AND user_agent_id IS NULL'
+        )).scalars().all()
+
+        known = {row.ua_hash: row.id for row in UserAgent.query.all()}
+        for user_agent in distinct_agents:
+            if not user_agent:
+                continue
+            ua_hash = hashlib.sha256(user_agent.encode('utf-8')).hexdigest()
+            if ua_hash not in known:
+                row = UserAgent(ua_hash=ua_hash, user_agent=user_agent)
+                db.session.add(row)
+                db.session.flush()
+                known[ua_hash] = row.id
+
+            db.session.execute(
+                text('UPDATE user_session SET user_agent_id = :ua_id, user_agent = NULL WHERE user_agent = :user_agent'),
+                {'ua_id': known[ua_hash], 'user_agent': user_agent}
+            )
+
+        # Empty headers carry no information
+        db.session.execute(text("UPDATE user_session SET user_agent = NULL WHERE user_agent = ''"))
+        db.session.commit()
+
+        print(f"\nMigration completed successfully!")
+        print(f"Distinct user agents moved to lookup table: {len(distinct_agents)}")
+
+if __name__ == '__main__':
+    migrate_session_retention()
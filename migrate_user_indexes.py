@@ -0,0 +1,24 @@
+"""
+Migration script to add the indexes used by the admin user filters and pending-review queues.
+db.create_all() only creates indexes for new tables, so existing databases need them added here.
+"""
+from sqlalchemy import text
+from app import app, db
+
+USER_INDEXES = {
+    'ix_user_account_type_cv_status': '"user" (account_type, cv_status)',
+    'ix_user_account_type_institution_status': '"user" (account_type, institution_status)',
+}
+
+def migrate_user_indexes():
+    """Create the user indexes when missing"""
+    with app.app_context():
+        for name, target in USER_INDEXES.items():
+            db.session.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {target}'))
+            print(f"Index {name} ready")
+        db.session.commit()
+        
+        print(f"\nMigration completed successfully!")
+
+if __name__ == '__main__':
+    migrate_user_indexes()
@@ -3,6 +3,12 @@ from app import db
 from flask_login import UserMixin
 
 class User(UserMixin, db.Model):
+    __table_args__ = (
+        # Pending-review queues and the admin status filters
+        db.Index('ix_user_account_type_cv_status', 'account_type', 'cv_status'),
+        db.Index('ix_user_account_type_institution_status', 'account_type', 'institution_status'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -65,6 +71,7 @@ class Professional(db.Model):
     description = db.Column(db.Text)
     experience = db.Column(db.Text)
     profile_photo = db.Column(db.String(255))
+    profile_photo_placeholder = db.Column(db.Text)  # Tiny blurred preview (data URI) shown while the photo loads
     linkedin = db.Column(db.String(255))
     lattes_cv = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -80,6 +87,7 @@ class Artifact(db.Model):
     conservation_state = db.Column(db.String(100))
     observations = db.Column(db.Text)
     photo_path = db.Column(db.String(255))
+    photo_placeholder = db.Column(db.Text)  # Tiny blurred preview (data URI) shown while the photo loads
     model_3d_path = db.Column(db.String(255))
     iphan_form_path = db.Column(db.String(255))
     qr_code = db.Column(db.String(100), unique=True)
@@ -95,6 +103,27 @@ class Artifact(db.Model):
     
     # Foreign key
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    import_batch_id = db.Column(db.Integer, db.ForeignKey('import_batch.id'), index=True)
+
+class ImportBatch(db.Model):
+    """A spreadsheet import run; artifacts point back to it for listing and rollback"""
+    id = db.Column(db.Integer, primary_key=True)
+    batch_code = db.Column(db.String(20), unique=True, nullable=False)  # IMPORT-XXXXXXXX
+    source_filename = db.Column(db.String(255))
+    total_rows = db.Column(db.Integer, default=0)
+    imported_count = db.Column(db.Integer, default=0)
+    skipped_count = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(50), default='Concluído')  # Concluído, Revertido
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    rolled_back_at = db.Column(db.DateTime)
+    
+    # Foreign keys
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    rolled_back_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    
+    # Relationships
+    created_by = db.relationship('User', foreign_keys=[user_id], backref='import_batches')
+    artifacts = db.relationship('Artifact', backref='import_batch', lazy='dynamic')
 
 class Transport(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -120,6 +149,16 @@ class Scanner3D(db.Model):
     file_size = db.Column(db.Integer)  # in bytes
     notes = db.Column(db.Text)
     
+    # Optimized GLB converted from file_path for the viewer (see mesh_pipeline.py)
+    optimized_file_path = db.Column(db.String(500))
+    optimized_file_size = db.Column(db.Integer)  # in bytes
+    optimization_status = db.Column(db.String(20))  # pendente, processando, otimizado, original, nao_suportado, falhou
+    optimization_error = db.Column(db.String(255))
+    optimization_updated_at = db.Column(db.DateTime)
+    optimization_attempts = db.Column(db.Integer, default=0)  # Claims that never finished (see mesh_pipeline)
+    triangle_count = db.Column(db.Integer)
+    preview_path = db.Column(db.String(500))  # JPEG rendered from the mesh for lists
+    
     # AI Generation fields
     is_ai_generated = db.Column(db.Boolean, default=False)
     ai_task_id = db.Column(db.String(100))
@@ -132,11 +171,31 @@ class Scanner3D(db.Model):
     artifact = db.relationship('Artifact', backref='scans_3d')
     generated_by = db.relationship('User', backref='generated_3d_models')
 
+class Scanner3DLod(db.Model):
+    """Coarser version of a scan's optimized GLB, loaded first by the viewer (level 0 is the coarsest)"""
+    id = db.Column(db.Integer, primary_key=True)
+    scan_id = db.Column(db.Integer, db.ForeignKey('scanner3_d.id'), nullable=False, index=True)
+    level = db.Column(db.Integer, nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    file_size = db.Column(db.Integer)  # in bytes
+    triangle_count = db.Column(db.Integer)
+    
+    scan = db.relationship('Scanner3D', backref=db.backref('lods', order_by='Scanner3DLod.level',
+                                                           cascade='all, delete-orphan'))
+
 class PhotoGallery(db.Model):
+    __table_args__ = (
+        # Keyset pages of the gallery (newest first), with and without a category filter
+        db.Index('ix_photo_gallery_category_published_created', 'category', 'is_published', 'created_at', 'id'),
+        db.Index('ix_photo_gallery_created_at_id', 'created_at', 'id'),
+        db.Index('ix_photo_gallery_updated_at', 'updated_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     image_path = db.Column(db.String(255), nullable=False)
+    image_placeholder = db.Column(db.Text)  # Tiny blurred preview (data URI) shown while the image loads
     category = db.Column(db.String(50), default='geral')  # geral, equipe, evento
     event_name = db.Column(db.String(200))  # Nome do evento se categoria for 'evento'
     is_published = db.Column(db.Boolean, default=False)
@@ -152,25 +211,32 @@ class PhotoGallery(db.Model):
 
 class UserSession(db.Model):
     """Track user sessions for monitoring and analytics"""
+    __table_args__ = (
+        # Active-session counts and the expiry job filter on both columns
+        db.Index('ix_user_session_active_last_activity', 'is_active', 'last_activity'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     session_token = db.Column(db.String(100), unique=True, nullable=False)
     
     # Session timing
-    login_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    logout_at = db.Column(db.DateTime)
+    login_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    logout_at = db.Column(db.DateTime, index=True)
     last_activity = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Session metadata
     ip_address = db.Column(db.String(50))
-    user_agent = db.Column(db.String(500))
+    user_agent = db.Column(db.String(500))  # Legacy; new sessions reference user_agent_ref
+    user_agent_id = db.Column(db.Integer, db.ForeignKey('user_agent.id'), index=True)
     
     # Session status
     is_active = db.Column(db.Boolean, default=True)
     logout_type = db.Column(db.String(50))  # manual, expired, forced
     
-    # Relationship
+    # Relationships
     user = db.relationship('User', backref='sessions')
+    user_agent_ref = db.relationship('UserAgent')
     
     @property
     def duration_seconds(self):
@@ -190,3 +256,76 @@ class UserSession(db.Model):
         elif minutes > 0:
             return f"{minutes}m {secs}s"
         return f"{secs}s"
+
+
+class UserAgent(db.Model):
+    """Deduplicated User-Agent strings referenced by sessions"""
+    id = db.Column(db.Integer, primary_key=True)
+    ua_hash = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of user_agent
+    user_agent = db.Column(db.String(500), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UserSessionArchive(db.Model):
+    """Compact copy of closed sessions past the retention window.
+    
+    On PostgreSQL the table is range-partitioned by month on login_at; the archive
+    job creates partitions on demand, so old months can be detached or dropped.
+    """
+    __tablename__ = 'user_session_archive'
+    __table_args__ = {'postgresql_partition_by': 'RANGE (login_at)'}
+    
+    # login_at is part of the key because PostgreSQL requires it on partitioned tables
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    login_at = db.Column(db.DateTime, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    logout_at = db.Column(db.DateTime)
+    logout_type = db.Column(db.String(50))
+    duration_seconds = db.Column(db.Integer)
+    ip_address = db.Column(db.String(50))
+    user_agent_id = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SessionRollup(db.Model):
+    """Hourly/daily login aggregates maintained incrementally by the maintenance scheduler"""
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'bucket_start', name='uq_session_rollup_bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # hour, day
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    
+    # Sessions that started in the bucket
+    logins = db.Column(db.Integer, default=0)
+    active_users = db.Column(db.Integer, default=0)  # distinct users who logged in
+    
+    # Sessions that ended in the bucket (average = total_duration_seconds / completed_sessions)
+    completed_sessions = db.Column(db.Integer, default=0)
+    total_duration_seconds = db.Column(db.Float, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @property
+    def avg_duration_seconds(self):
+        """Average duration of sessions that ended in this bucket"""
+        if not self.completed_sessions:
+            return None
+        return self.total_duration_seconds / self.completed_sessions
+
+class SchedulerLock(db.Model):
+    """Lease row that elects the single process running scheduled maintenance (non-PostgreSQL databases)"""
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)  # hostname:pid
+    heartbeat_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class DashboardCounter(db.Model):
+    """Running totals behind the dashboard, kept up to date by dashboard_stats on every flush"""
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'key', name='uq_dashboard_counter_scope_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(30), nullable=False)  # artifacts, professionals, transport_status, artifact_type, conservation_state, cataloger
+    key = db.Column(db.String(200), nullable=False, default='')  # '' for totals and missing values; user id for catalogers
+    value = db.Column(db.Integer, nullable=False, default=0)
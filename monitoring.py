@@ -0,0 +1,296 @@
+"""
+Aggregate queries for the session monitoring page.
+Counts, averages and per-day/per-user figures are computed in SQL, so the
+page runs a fixed number of index-backed queries regardless of how much
+UserSession history exists. Login trends are read from SessionRollup rows,
+which the maintenance scheduler keeps up to date incrementally.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload
+
+from app import db
+from models import User, UserSession, SessionRollup
+from scheduler import SESSION_TIMEOUT_MINUTES
+
+ACTIVE_SESSIONS_LIMIT = 100
+RECENT_SESSIONS_LIMIT = 50
+TOP_USERS_LIMIT = 10
+TOP_USERS_DAYS = 30
+DAILY_LOGINS_DAYS = 7
+AVG_DURATION_DAYS = 30
+
+ROLLUP_GRANULARITIES = {'hour': timedelta(hours=1), 'day': timedelta(days=1)}
+# Expired sessions get logout_at = last_activity, up to SESSION_TIMEOUT_MINUTES in the past,
+# so each run recomputes buckets from a little before the last one already stored
+ROLLUP_LOOKBACK = timedelta(minutes=SESSION_TIMEOUT_MINUTES, hours=1)
+
+
+def duration_seconds_expr(start, end):
+    """
+    Dialect-aware SQL expression for the seconds between two datetime columns.
+
+    Args:
+        start: Start column/expression
+        end: End column/expression
+
+    Returns:
+        SQL expression evaluating to a number of seconds
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return func.extract('epoch', end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400
+
+
+def bucket_expr(column, granularity):
+    """
+    Dialect-aware date_trunc(granularity, column).
+
+    Args:
+        column: Datetime column to group by
+        granularity: 'hour' or 'day'
+
+    Returns:
+        SQL expression truncating the column to the start of its bucket
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return func.date_trunc(granularity, column)
+    pattern = '%Y-%m-%d %H:00:00' if granularity == 'hour' else '%Y-%m-%d 00:00:00'
+    return func.strftime(pattern, column)
+
+
+def truncate(moment, granularity):
+    """Python counterpart of bucket_expr for a single datetime"""
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _bucket_value(value):
+    # SQLite returns the bucket as text, PostgreSQL as a datetime
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def format_duration(seconds):
+    """Format an average duration as "1h 5m" / "12m", or "N/A" when there is no data"""
+    if seconds is None:
+        return "N/A"
+    seconds = int(seconds)
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    return f"{hours}h {minutes}m" if hours > 0 else f"{minutes}m"
+
+
+def session_overview(now=None):
+    """
+    Headline figures for the monitoring page.
+
+    The active count is an equality scan on the (is_active, last_activity) index;
+    login counts and the average duration are summed from daily rollups.
+
+    Returns:
+        Dict with active_count, today_logins, week_logins and avg_duration_seconds
+    """
+    now = now or datetime.utcnow()
+    today_start = truncate(now, 'day')
+    week_start = today_start - timedelta(days=today_start.weekday())
+    window_start = today_start - timedelta(days=AVG_DURATION_DAYS)
+
+    active_count = db.session.execute(
+        db.select(func.count(UserSession.id)).where(UserSession.is_active == True)
+    ).scalar()
+
+    row = db.session.execute(
+        db.select(
+            func.coalesce(func.sum(case((SessionRollup.bucket_start >= today_start, SessionRollup.logins))), 0).label('today_logins'),
+            func.coalesce(func.sum(case((SessionRollup.bucket_start >= week_start, SessionRollup.logins))), 0).label('week_logins'),
+            func.sum(SessionRollup.completed_sessions).label('completed_sessions'),
+            func.sum(SessionRollup.total_duration_seconds).label('total_duration_seconds'),
+        ).where(
+            SessionRollup.granularity == 'day',
+            SessionRollup.bucket_start >= window_start
+        )
+    ).one()
+
+    avg_duration_seconds = None
+    if row.completed_sessions:
+        avg_duration_seconds = row.total_duration_seconds / row.completed_sessions
+
+    return {
+        'active_count': active_count,
+        'today_logins': row.today_logins,
+        'week_logins': row.week_logins,
+        'avg_duration_seconds': avg_duration_seconds,
+    }
+
+
+def active_sessions(limit=ACTIVE_SESSIONS_LIMIT):
+    """Currently active sessions with their user eagerly loaded (most recent first)"""
+    return UserSession.query.options(joinedload(UserSession.user)).filter(
+        UserSession.is_active == True
+    ).order_by(UserSession.login_at.desc()).limit(limit).all()
+
+
+def recent_sessions(limit=RECENT_SESSIONS_LIMIT):
+    """Latest sessions with their user eagerly loaded"""
+    return UserSession.query.options(joinedload(UserSession.user)).order_by(
+        UserSession.login_at.desc()
+    ).limit(limit).all()
+
+
+def daily_login_counts(days=DAILY_LOGINS_DAYS, now=None):
+    """
+    Logins and distinct users per day, read from daily rollups.
+
+    Returns:
+        List of dicts (day, logins, users) for the last `days` days, oldest first,
+        including days without logins
+    """
+    return [
+        {'day': point['bucket'][:10], 'logins': point['logins'], 'users': point['active_users']}
+        for point in session_trends('day', days, now=now)
+    ]
+
+
+def session_trends(granularity='day', periods=30, now=None):
+    """
+    Login trend series read only from SessionRollup.
+
+    Args:
+        granularity: 'hour' or 'day'
+        periods: Number of buckets to return, ending with the current one
+        now: Reference time (defaults to now, UTC)
+
+    Returns:
+        List of dicts (bucket, logins, active_users, completed_sessions,
+        avg_duration_seconds), oldest first, with empty buckets filled with zeros
+    """
+    step = ROLLUP_GRANULARITIES[granularity]
+    now = now or datetime.utcnow()
+    start = truncate(now, granularity) - step * (periods - 1)
+
+    rollups = {
+        rollup.bucket_start: rollup
+        for rollup in SessionRollup.query.filter(
+            SessionRollup.granularity == granularity,
+            SessionRollup.bucket_start >= start
+        )
+    }
+
+    series = []
+    for offset in range(periods):
+        bucket = start + step * offset
+        rollup = rollups.get(bucket)
+        series.append({
+            'bucket': bucket.isoformat(),
+            'logins': rollup.logins if rollup else 0,
+            'active_users': rollup.active_users if rollup else 0,
+            'completed_sessions': rollup.completed_sessions if rollup else 0,
+            'avg_duration_seconds': rollup.avg_duration_seconds if rollup else None,
+        })
+    return series
+
+
+def update_session_rollups(now=None):
+    """
+    Recompute the hourly and daily rollups that may have changed since the last run.
+
+    Buckets from shortly before the newest stored hourly rollup up to now are rebuilt
+    from range queries on the login_at/logout_at indexes; older buckets are left
+    untouched. The first run backfills from the oldest session. The caller commits.
+
+    Returns:
+        Number of rollup rows written
+    """
+    now = now or datetime.utcnow()
+    latest = db.session.execute(
+        db.select(func.max(SessionRollup.bucket_start)).where(SessionRollup.granularity == 'hour')
+    ).scalar()
+    if latest is None:
+        latest = db.session.execute(db.select(func.min(UserSession.login_at))).scalar()
+        if latest is None:
+            return 0
+    since = latest - ROLLUP_LOOKBACK
+
+    written = 0
+    for granularity in ROLLUP_GRANULARITIES:
+        start = truncate(since, granularity)
+        written += _rebuild_rollups(granularity, start, now)
+    return written
+
+
+def _rebuild_rollups(granularity, start, now):
+    login_bucket = bucket_expr(UserSession.login_at, granularity).label('bucket')
+    logout_bucket = bucket_expr(UserSession.logout_at, granularity).label('bucket')
+    duration = duration_seconds_expr(UserSession.login_at, UserSession.logout_at)
+
+    buckets = {}
+    for bucket, logins, users in db.session.execute(
+        db.select(login_bucket, func.count(UserSession.id), func.count(func.distinct(UserSession.user_id)))
+        .where(UserSession.login_at >= start)
+        .group_by(login_bucket)
+    ):
+        figures = buckets.setdefault(_bucket_value(bucket), {})
+        figures.update(logins=logins, active_users=users)
+
+    for bucket, completed, total_duration in db.session.execute(
+        db.select(logout_bucket, func.count(UserSession.id), func.sum(duration))
+        .where(UserSession.logout_at >= start)
+        .group_by(logout_bucket)
+    ):
+        figures = buckets.setdefault(_bucket_value(bucket), {})
+        figures.update(completed_sessions=completed, total_duration_seconds=float(total_duration or 0))
+
+    db.session.execute(
+        db.delete(SessionRollup)
+        .where(SessionRollup.granularity == granularity, SessionRollup.bucket_start >= start)
+        .execution_options(synchronize_session=False)
+    )
+    if buckets:
+        db.session.execute(db.insert(SessionRollup), [
+            {
+                'granularity': granularity,
+                'bucket_start': bucket,
+                'logins': figures.get('logins', 0),
+                'active_users': figures.get('active_users', 0),
+                'completed_sessions': figures.get('completed_sessions', 0),
+                'total_duration_seconds': figures.get('total_duration_seconds', 0),
+                'updated_at': now,
+            }
+            for bucket, figures in buckets.items()
+        ])
+    return len(buckets)
+
+
+def top_users(days=TOP_USERS_DAYS, limit=TOP_USERS_LIMIT, now=None):
+    """
+    Per-user session figures for the last `days` days, grouped in SQL.
+
+    Returns:
+        List of dicts (username, sessions, avg_duration_seconds, avg_duration_formatted,
+        last_login), busiest first
+    """
+    now = now or datetime.utcnow()
+    start = now - timedelta(days=days)
+    duration = duration_seconds_expr(UserSession.login_at, UserSession.logout_at)
+
+    rows = db.session.execute(
+        db.select(
+            User.username,
+            func.count(UserSession.id).label('sessions'),
+            func.avg(case((UserSession.logout_at.isnot(None), duration))).label('avg_duration_seconds'),
+            func.max(UserSession.login_at).label('last_login')
+        )
+        .join(User, User.id == UserSession.user_id)
+        .where(UserSession.login_at >= start)
+        .group_by(User.id, User.username)
+        .order_by(func.count(UserSession.id).desc())
+        .limit(limit)
+    ).all()
+    result = []
+    for row in rows:
+        figures = row._asdict()
+        figures['avg_duration_formatted'] = format_duration(figures['avg_duration_seconds'])
+        result.append(figures)
+    return result
@@ -8,8 +8,11 @@ from werkzeug.utils import secure_filename
 from datetime import datetime
 
 from app import app, db, LANGUAGES
-from models import User, Artifact, Professional, Transport, Scanner3D, PhotoGallery, UserSession
+from models import User, Artifact, Professional, Transport, Scanner3D, PhotoGallery, UserSession, ImportBatch
 from forms import LoginForm, RegisterForm, ArtifactForm, ProfessionalForm, TransportForm, Scanner3DForm, AdminUserForm, PhotoGalleryForm
+import auth_cache
+import dashboard_stats
+import gallery
 from storage import upload_file, upload_artifact_photo, upload_professional_photo, upload_gallery_photo, download_file, file_exists, get_content_type, generate_qr_code_image
 
 def is_visitor():
@@ -43,70 +46,20 @@ def save_uploaded_file(file, folder='uploads'):
 
 
 # Session tracking middleware
-SESSION_TIMEOUT_MINUTES = 30
-SESSION_ACTIVITY_UPDATE_INTERVAL = 60  # Only update last_activity every 60 seconds
-_last_cleanup_check = None
-
 @app.before_request
 def update_session_activity():
-    """Update last_activity for active sessions - throttled to reduce DB writes"""
+    """Record activity for the current session; the buffer writes last_activity in bulk"""
     from flask_login import current_user
+    from session_activity import activity_buffer
+    from scheduler import maintenance_scheduler
     
     if current_user.is_authenticated:
         session_token = session.get('monitoring_session_token')
-        last_update_str = session.get('last_activity_update')
-        now = datetime.utcnow()
-        
-        # Safely parse last update timestamp
-        should_update = True
-        if last_update_str:
-            try:
-                last_update = datetime.fromisoformat(last_update_str)
-                if (now - last_update).total_seconds() < SESSION_ACTIVITY_UPDATE_INTERVAL:
-                    should_update = False
-            except (ValueError, TypeError):
-                session.pop('last_activity_update', None)
-        
-        # Only update DB if throttle interval passed
-        if session_token and should_update:
-            updated = UserSession.query.filter_by(
-                session_token=session_token, 
-                is_active=True
-            ).update({'last_activity': now})
-            if updated:
-                db.session.commit()
-            session['last_activity_update'] = now.isoformat()
-    
-    # Run cleanup periodically (every 60 seconds, not on every request)
-    cleanup_expired_sessions()
-
-
-def cleanup_expired_sessions():
-    """Expire stale sessions - runs at most once per minute using bulk update"""
-    from datetime import timedelta
-    global _last_cleanup_check
-    
-    now = datetime.utcnow()
-    if _last_cleanup_check and (now - _last_cleanup_check).total_seconds() < 60:
-        return
-    
-    _last_cleanup_check = now
-    timeout_threshold = now - timedelta(minutes=SESSION_TIMEOUT_MINUTES)
-    
-    # Bulk update using SQL expression to set logout_at to each row's last_activity
-    updated = UserSession.query.filter(
-        UserSession.is_active == True,
-        UserSession.last_activity < timeout_threshold
-    ).update({
-        'is_active': False,
-        'logout_at': UserSession.last_activity,
-        'logout_type': 'expired'
-    }, synchronize_session=False)
+        if session_token:
+            activity_buffer.record(session_token)
     
-    if updated:
-        db.session.commit()
-
-
+    # Expired-session cleanup runs in the background scheduler, never in the request
+    maintenance_scheduler.ensure_started()
 
 
 @app.route('/uploads/<path:file_path>')
@@ -124,6 +77,37 @@ def serve_uploads(file_path):
         return Response("File not found", status=404)
 
 
+@app.route('/imagem/<size>/<path:file_path>')
+def resized_image(size, file_path):
+    """Serve a local upload scaled down for a display context (local counterpart of the Cloudinary transformation)."""
+    from flask import abort
+    from storage import IMAGE_SIZES, resize_local_image
+    
+    if '..' in file_path or file_path.startswith('/') or not file_path.startswith('uploads/'):
+        abort(403)
+    if size not in IMAGE_SIZES:
+        abort(404)
+    
+    webp = 'image/webp' in request.headers.get('Accept', '')
+    try:
+        resized = resize_local_image(file_path, size, webp=webp)
+    except Exception as e:
+        current_app.logger.error(f"Error resizing image {file_path}: {str(e)}")
+        resized = None
+    
+    if resized is None:
+        # Not a resizable image (or resizing failed): fall back to the original file
+        if not os.path.isfile(file_path):
+            return Response("File not found", status=404)
+        return redirect(url_for('serve_uploads', file_path=file_path[len('uploads/'):]))
+    
+    cache_path, mimetype = resized
+    response = send_file(cache_path, mimetype=mimetype, max_age=86400)
+    response.cache_control.public = True
+    response.vary.add('Accept')
+    return response
+
+
 @app.route('/storage/<path:file_path>')
 def serve_storage_file(file_path):
     """Serve files from uploads/ or static/ directory (legacy support)."""
@@ -161,11 +145,19 @@ def entrar_visitante():
     session['role'] = 'visitor'
     return redirect(url_for('acervo_visitante'))
 
+def _acervo_artifacts():
+    """Artifacts for the acervo lists, with their 3D scan previews loaded in one extra query"""
+    from sqlalchemy.orm import selectinload
+    
+    return Artifact.query.options(
+        selectinload(Artifact.scans_3d).load_only(Scanner3D.artifact_id, Scanner3D.preview_path)
+    ).order_by(Artifact.name).all()
+
 @app.route('/acervo-publico')
 def acervo_visitante():
     if not is_visitor():
         return redirect(url_for('login'))
-    artifacts = Artifact.query.order_by(Artifact.name).all()
+    artifacts = _acervo_artifacts()
     return render_template('acervo_visitante.html', artifacts=artifacts)
 
 @app.route('/sair-visitante')
@@ -186,6 +178,9 @@ def login():
             if user.is_active_user:
                 login_user(user)
                 
+                from session_events import session_events
+                from session_retention import user_agent_id_for
+                
                 # Close any previous active sessions for this user
                 previous_sessions = UserSession.query.filter_by(
                     user_id=user.id, 
@@ -204,7 +199,7 @@ def login():
                     login_at=datetime.utcnow(),
                     last_activity=datetime.utcnow(),
                     ip_address=request.remote_addr,
-                    user_agent=request.headers.get('User-Agent', '')[:500],
+                    user_agent_id=user_agent_id_for(request.headers.get('User-Agent', '')),
                     is_active=True
                 )
                 db.session.add(user_session)
@@ -213,6 +208,13 @@ def login():
                 # Store session token in Flask session for logout tracking
                 session['monitoring_session_token'] = session_token
                 
+                # Live monitoring feed
+                for prev_session in previous_sessions:
+                    session_events.publish('forced', session_id=prev_session.id, user_id=user.id,
+                                           logout_at=prev_session.logout_at.isoformat())
+                session_events.publish('login', session_id=user_session.id, user_id=user.id,
+                                       username=user.username, login_at=user_session.login_at.isoformat())
+                
                 return redirect(url_for('dashboard'))
             else:
                 flash('Sua conta está desativada. Contate o administrador.', 'error')
@@ -344,14 +346,21 @@ def register():
 @login_required
 def logout():
     # Close session record for monitoring
+    from session_activity import activity_buffer
+    from session_events import session_events
+
     session_token = session.get('monitoring_session_token')
     if session_token:
+        activity_buffer.discard(session_token)
         user_session = UserSession.query.filter_by(session_token=session_token, is_active=True).first()
         if user_session:
             user_session.logout_at = datetime.utcnow()
+            user_session.last_activity = user_session.logout_at
             user_session.is_active = False
             user_session.logout_type = 'manual'
             db.session.commit()
+            session_events.publish('logout', session_id=user_session.id, user_id=user_session.user_id,
+                                   logout_at=user_session.logout_at.isoformat())
         session.pop('monitoring_session_token', None)
     
     logout_user()
@@ -360,16 +369,8 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    # Get some statistics
-    total_artifacts = Artifact.query.count()
-    total_professionals = Professional.query.count()
-    pending_transports = Transport.query.filter_by(status='pendente').count()
-    
-    stats = {
-        'artifacts': total_artifacts,
-        'professionals': total_professionals,
-        'pending_transports': pending_transports
-    }
+    # Read from the maintained dashboard_counter rows instead of counting the tables
+    stats = dashboard_stats.dashboard_stats()
     
     return render_template('dashboard.html', stats=stats)
 
@@ -465,12 +466,9 @@ def processar_importacao_excel():
         else:
             df = pd.read_excel(file, engine='openpyxl')
         
-        required_columns = ['nome_artefato', 'tipo', 'estado_conservacao']
-        all_columns = ['nome_artefato', 'codigo_artefato', 'data_descoberta', 'tipo', 
-                      'local_origem', 'localizacao_arqueologica', 'profundidade', 
-                      'nivel_estratigrafico', 'coordenadas', 'estado_conservacao', 'observacoes']
+        from importer import REQUIRED_IMPORT_COLUMNS
         
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in REQUIRED_IMPORT_COLUMNS if col not in df.columns]
         if missing_columns:
             flash(f'Colunas obrigatórias ausentes: {", ".join(missing_columns)}', 'error')
             return redirect(url_for('importacao_excel'))
@@ -484,7 +482,6 @@ def processar_importacao_excel():
             return redirect(url_for('importacao_excel'))
         
         artifacts_data = []
-        errors = []
         
         for idx, row in df.iterrows():
             row_num = idx + 2
@@ -509,13 +506,16 @@ def processar_importacao_excel():
                 'errors': row_errors
             }
             artifacts_data.append(artifact)
-            if row_errors:
-                errors.append({'row': row_num, 'errors': row_errors})
+        
+        # Set-based pre-flight: in-sheet duplicates and codes already in the collection
+        from importer import flag_code_conflicts
+        flag_code_conflicts(artifacts_data)
+        errors = [{'row': item['row'], 'errors': item['errors']} for item in artifacts_data if item['errors']]
         
         import_token = uuid.uuid4().hex
         import_file_path = os.path.join(tempfile.gettempdir(), f'laari_import_{current_user.id}_{import_token}.json')
         with open(import_file_path, 'w', encoding='utf-8') as f:
-            json.dump({'artifacts': artifacts_data, 'errors': errors}, f, ensure_ascii=False)
+            json.dump({'artifacts': artifacts_data, 'errors': errors, 'source_filename': secure_filename(file.filename)}, f, ensure_ascii=False)
         
         session['import_token'] = import_token
         
@@ -562,25 +562,32 @@ def confirmar_importacao_excel():
             return redirect(url_for('importacao_excel'))
         
         imported_count = 0
+        skipped_count = 0
         batch_id = f"IMPORT-{uuid.uuid4().hex[:8].upper()}"
+        import_batch = ImportBatch(
+            batch_code=batch_id,
+            source_filename=data.get('source_filename'),
+            total_rows=len(import_data),
+            user_id=current_user.id
+        )
+        db.session.add(import_batch)
+        
+        # Codes may have been cataloged since the preview; skip those rows instead of aborting the batch
+        from importer import find_existing_codes, CONSERVATION_MAP
+        taken_codes = find_existing_codes(
+            item.get('codigo_artefato', '').strip() for item in import_data if not item.get('errors')
+        )
         
         for item in import_data:
             if item.get('errors'):
                 continue
             
-            conservation_map = {
-                'excelente': 'excelente',
-                'bom': 'bom',
-                'regular': 'regular',
-                'ruim': 'ruim',
-                'inteiro': 'excelente',
-                'íntegro': 'excelente',
-                'fragmentado': 'regular',
-                'restaurado': 'bom',
-                'danificado': 'ruim'
-            }
+            if item.get('codigo_artefato', '').strip() in taken_codes:
+                skipped_count += 1
+                continue
+            
             estado = item.get('estado_conservacao', '')
-            conservation = conservation_map.get(estado.lower() if estado else '', 'regular')
+            conservation = CONSERVATION_MAP.get(estado.lower() if estado else '', 'regular')
             
             codigo = item.get('codigo_artefato', '').strip()
             if not codigo:
@@ -595,8 +602,9 @@ def confirmar_importacao_excel():
                 level=item.get('nivel_estratigrafico', ''),
                 coordinates=item.get('coordenadas', ''),
                 conservation_state=conservation,
-                observations=f"Localização arqueológica: {item.get('localizacao_arqueologica', '')}\n{item.get('observacoes', '')}\n\n[Importado via Excel - Lote: {batch_id}]",
+                observations=f"Localização arqueológica: {item.get('localizacao_arqueologica', '')}\n{item.get('observacoes', '')}",
                 user_id=current_user.id,
+                import_batch=import_batch,
                 qr_code=f"LAARI-{uuid.uuid4().hex[:8].upper()}"
             )
             
@@ -610,12 +618,16 @@ def confirmar_importacao_excel():
             db.session.add(artifact)
             imported_count += 1
         
+        import_batch.imported_count = imported_count
+        import_batch.skipped_count = len(import_data) - imported_count
         db.session.commit()
         
         os.remove(import_file_path)
         session.pop('import_token', None)
         
         flash(f'Importação concluída com sucesso! {imported_count} artefatos foram catalogados. (Lote: {batch_id})', 'success')
+        if skipped_count:
+            flash(f'{skipped_count} registro(s) ignorado(s): o código foi cadastrado no acervo após a pré-visualização.', 'warning')
         return redirect(url_for('catalogacao'))
     
     except Exception as e:
@@ -624,6 +636,86 @@ def confirmar_importacao_excel():
         flash(f'Erro ao importar dados: {str(e)}', 'error')
         return redirect(url_for('importacao_excel'))
 
+@app.route('/importacao-excel/lotes')
+@login_required
+def importacao_lotes():
+    """List import batches with their current artifact counts."""
+    from importer import batch_artifact_counts
+    
+    if not current_user.can_catalog_artifacts() and not current_user.is_admin:
+        flash('Você não tem permissão para acessar a importação de dados.', 'warning')
+        return redirect(url_for('dashboard'))
+    
+    query = ImportBatch.query
+    if not current_user.is_admin:
+        query = query.filter_by(user_id=current_user.id)
+    batches = query.order_by(ImportBatch.created_at.desc()).limit(200).all()
+    artifact_counts = batch_artifact_counts(batch.id for batch in batches)
+    
+    return render_template('importacao_lotes.html', batches=batches, artifact_counts=artifact_counts)
+
+@app.route('/api/importacao/lotes/<int:batch_id>')
+@login_required
+def api_importacao_lote(batch_id):
+    """API endpoint with per-type and per-conservation statistics for one batch."""
+    from importer import batch_statistics
+    
+    batch = ImportBatch.query.get_or_404(batch_id)
+    if batch.user_id != current_user.id and not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Acesso negado.'}), 403
+    
+    return jsonify({
+        'success': True,
+        'batch': {
+            'id': batch.id,
+            'batch_code': batch.batch_code,
+            'source_filename': batch.source_filename,
+            'status': batch.status,
+            'total_rows': batch.total_rows,
+            'imported_count': batch.imported_count,
+            'skipped_count': batch.skipped_count,
+            'created_at': batch.created_at.strftime('%d/%m/%Y %H:%M') if batch.created_at else None,
+            'created_by': batch.created_by.username if batch.created_by else 'N/A',
+            'statistics': batch_statistics(batch)
+        }
+    })
+
+@app.route('/importacao-excel/lotes/<int:batch_id>/reverter', methods=['POST'])
+@login_required
+def reverter_importacao_lote(batch_id):
+    """Undo an import batch, deleting all of its artifacts in one statement."""
+    from importer import batch_statistics, rollback_import_batch
+    from storage import delete_file
+    
+    batch = ImportBatch.query.get_or_404(batch_id)
+    if batch.user_id != current_user.id and not current_user.is_admin:
+        flash('Você não tem permissão para reverter este lote.', 'error')
+        return redirect(url_for('importacao_lotes'))
+    
+    if batch.status == 'Revertido':
+        flash(f'O lote {batch.batch_code} já foi revertido.', 'info')
+        return redirect(url_for('importacao_lotes'))
+    
+    stats = batch_statistics(batch)
+    if stats['transports'] or stats['scans_3d']:
+        flash(f'O lote {batch.batch_code} não pode ser revertido: {stats["transports"]} transporte(s) e {stats["scans_3d"]} scan(s) 3D fazem referência aos seus artefatos.', 'error')
+        return redirect(url_for('importacao_lotes'))
+    
+    try:
+        deleted, file_paths = rollback_import_batch(batch, current_user.id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Erro ao reverter lote {batch.batch_code}: {str(e)}')
+        flash('Erro ao reverter o lote. Tente novamente.', 'error')
+        return redirect(url_for('importacao_lotes'))
+    
+    for path in file_paths:
+        delete_file(path)
+    
+    flash(f'Lote {batch.batch_code} revertido: {deleted} artefato(s) removido(s) do acervo.', 'success')
+    return redirect(url_for('importacao_lotes'))
+
 @app.route('/cancelar-importacao-excel', methods=['POST'])
 @login_required
 def cancelar_importacao_excel():
@@ -677,7 +769,7 @@ def catalogar_novo():
         # Check if photo was actually provided (not just empty FileStorage)
         has_photo = form.photo.data and hasattr(form.photo.data, 'filename') and form.photo.data.filename
         if has_photo:
-            from storage import upload_artifact_photo, is_cloudinary_available
+            from storage import upload_artifact_photo, image_placeholder, is_cloudinary_available
             import logging
             logging.info(f"Photo upload attempt: filename={form.photo.data.filename}, content_type={form.photo.data.content_type}")
             
@@ -692,9 +784,15 @@ def catalogar_novo():
                 flash(messages.get(lang, messages['pt']), 'error')
                 photo_upload_failed = True
             else:
-                photo_url = upload_artifact_photo(form.photo.data)
+                photo_placeholder = image_placeholder(form.photo.data)
+                photo_url = upload_artifact_photo(
+                    form.photo.data,
+                    max_dimension=None if form.keep_original_photo.data else current_app.config['PHOTO_MAX_DIMENSION'],
+                    quality=current_app.config['PHOTO_JPEG_QUALITY']
+                )
                 if photo_url:
                     artifact.photo_path = photo_url
+                    artifact.photo_placeholder = photo_placeholder
                     logging.info(f"Photo uploaded successfully: {photo_url}")
                 else:
                     lang = session.get('language', 'pt')
@@ -781,7 +879,7 @@ def editar_artefato(id):
         # Handle new photo upload (Cloudinary required - blocks save on failure)
         photo_upload_failed = False
         if form.photo.data:
-            from storage import upload_artifact_photo, delete_file, is_cloudinary_available
+            from storage import upload_artifact_photo, image_placeholder, delete_file, is_cloudinary_available
             import logging
             logging.info(f"Photo edit upload attempt: filename={form.photo.data.filename}, content_type={form.photo.data.content_type}")
             
@@ -796,11 +894,17 @@ def editar_artefato(id):
                 flash(messages.get(lang, messages['pt']), 'error')
                 photo_upload_failed = True
             else:
-                photo_url = upload_artifact_photo(form.photo.data)
+                photo_placeholder = image_placeholder(form.photo.data)
+                photo_url = upload_artifact_photo(
+                    form.photo.data,
+                    max_dimension=None if form.keep_original_photo.data else current_app.config['PHOTO_MAX_DIMENSION'],
+                    quality=current_app.config['PHOTO_JPEG_QUALITY']
+                )
                 if photo_url:
                     if artifact.photo_path:
                         delete_file(artifact.photo_path)
                     artifact.photo_path = photo_url
+                    artifact.photo_placeholder = photo_placeholder
                     logging.info(f"Photo updated successfully: {photo_url}")
                 else:
                     lang = session.get('language', 'pt')
@@ -978,10 +1082,44 @@ def ver_artefato(id):
 @app.route('/acervo')
 @login_required
 def acervo():
-    artifacts = Artifact.query.order_by(Artifact.name).all()
+    artifacts = _acervo_artifacts()
     return render_template('acervo.html', artifacts=artifacts)
 
 
+@app.route('/acervo/exportar/<formato>')
+@login_required
+def exportar_acervo(formato):
+    """Stream the collection as CSV, JSON Lines or XLSX, honoring the acervo filters."""
+    import tempfile
+    from flask import stream_with_context
+    from exports import EXPORT_FORMATS, build_artifact_export_query, iter_rows, generate_csv, generate_jsonl, write_xlsx
+
+    if formato not in EXPORT_FORMATS:
+        flash('Formato de exportação não suportado. Use CSV, JSONL ou XLSX.', 'error')
+        return redirect(url_for('acervo'))
+
+    stmt = build_artifact_export_query(
+        search=request.args.get('search', '').strip() or None,
+        artifact_type=request.args.get('artifact_type') or None,
+        conservation_state=request.args.get('conservation_state') or None
+    )
+    mimetype, filename = EXPORT_FORMATS[formato]
+
+    if formato == 'xlsx':
+        # Write-only workbooks spool to disk; the temp file is removed when send_file closes it
+        spool = tempfile.TemporaryFile()
+        write_xlsx(iter_rows(stmt), spool)
+        spool.seek(0)
+        return send_file(spool, mimetype=mimetype, as_attachment=True, download_name=filename)
+
+    generator = generate_csv if formato == 'csv' else generate_jsonl
+    return Response(
+        stream_with_context(generator(iter_rows(stmt))),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment;filename={filename}"}
+    )
+
+
 @app.route('/regenerar_qrcodes')
 @login_required
 def regenerar_qrcodes():
@@ -1041,10 +1179,12 @@ def adicionar_profissional():
         
         # Handle profile photo upload
         if form.profile_photo.data:
-            from storage import upload_professional_photo
+            from storage import upload_professional_photo, image_placeholder
+            photo_placeholder = image_placeholder(form.profile_photo.data)
             photo_url = upload_professional_photo(form.profile_photo.data)
             if photo_url:
                 professional.profile_photo = photo_url
+                professional.profile_photo_placeholder = photo_placeholder
             else:
                 flash('Erro ao fazer upload da foto de perfil. Tente novamente.', 'warning')
         
@@ -1096,7 +1236,7 @@ def editar_profissional(id):
         # Handle new photo upload (check if file was actually provided)
         has_photo = form.profile_photo.data and hasattr(form.profile_photo.data, 'filename') and form.profile_photo.data.filename
         if has_photo:
-            from storage import upload_professional_photo, delete_file, is_cloudinary_available
+            from storage import upload_professional_photo, image_placeholder, delete_file, is_cloudinary_available
             import logging
             
             if not is_cloudinary_available():
@@ -1113,9 +1253,11 @@ def editar_profissional(id):
                 if professional.profile_photo:
                     delete_file(professional.profile_photo)
                 
+                photo_placeholder = image_placeholder(form.profile_photo.data)
                 photo_url = upload_professional_photo(form.profile_photo.data)
                 if photo_url:
                     professional.profile_photo = photo_url
+                    professional.profile_photo_placeholder = photo_placeholder
                     logging.info(f"Professional photo uploaded: {photo_url}")
                     lang = session.get('language', 'pt')
                     messages = {
@@ -1218,6 +1360,8 @@ def scanner_3d():
     form.artifact_id.choices = [(a.id, f"{a.name} - {a.qr_code}") for a in artifacts]
     
     if form.validate_on_submit():
+        import mesh_pipeline
+        
         scan = Scanner3D(
             artifact_id=form.artifact_id.data,
             scanner_type=form.scanner_type.data,
@@ -1230,6 +1374,7 @@ def scanner_3d():
             file_path = save_uploaded_file(form.scan_file.data, 'uploads/3d_scans')
             if file_path:
                 scan.file_path = file_path
+                scan.optimization_status = mesh_pipeline.initial_status(file_path)
                 # Get file size
                 full_path = os.path.join(current_app.static_folder, file_path)
                 if os.path.exists(full_path):
@@ -1239,6 +1384,9 @@ def scanner_3d():
         
         db.session.add(scan)
         db.session.commit()
+        if scan.optimization_status == mesh_pipeline.STATUS_PENDING:
+            # Converted to an optimized GLB for the viewer in the background
+            mesh_pipeline.queue_scan_optimization(scan.id)
         flash('Scan 3D registrado com sucesso!', 'success')
         return redirect(url_for('scanner_3d'))
     
@@ -1256,7 +1404,9 @@ def view_3d_model(scan_id):
         flash('Modelo 3D não disponível.', 'warning')
         return redirect(url_for('scanner_3d'))
     
-    return render_template('view_3d_model.html', scan=scan)
+    import mesh_pipeline
+    
+    return render_template('view_3d_model.html', scan=scan, viewer_files=mesh_pipeline.viewer_file_paths(scan))
 
 @app.route('/delete_3d_scan/<int:scan_id>', methods=['POST'])
 @login_required
@@ -1278,13 +1428,18 @@ def delete_3d_scan(scan_id):
     # Delete from Cloudinary if it's a cloud file
     if scan.file_path and scan.file_path.startswith('http') and 'cloudinary' in scan.file_path:
         try:
-            import cloudinary.uploader
+            from storage import get_cloudinary_uploader
             # Extract public_id from URL
             public_id = scan.file_path.split('/')[-1].rsplit('.', 1)[0]
-            cloudinary.uploader.destroy(f"laari/3d_models/{public_id}", resource_type='raw')
+            get_cloudinary_uploader().destroy(f"laari/3d_models/{public_id}", resource_type='raw')
         except Exception as e:
             current_app.logger.warning(f"Could not delete file from Cloudinary: {e}")
     
+    from storage import delete_file
+    for path in [scan.optimized_file_path, scan.preview_path] + [lod.file_path for lod in scan.lods]:
+        if path:
+            delete_file(path)
+    
     artifact_name = scan.artifact.name if scan.artifact else 'Desconhecido'
     db.session.delete(scan)
     db.session.commit()
@@ -1386,46 +1541,79 @@ def admin():
         flash('Acesso negado. Apenas administradores podem acessar esta página.', 'error')
         return redirect(url_for('dashboard'))
     
-    users = User.query.all()
+    import user_admin
+    
+    filters = user_admin.parse_user_filters(request.args)
     highlight_user_id = request.args.get('highlight', type=int)
-    active_filter = request.args.get('filter', '')
-    return render_template('admin.html', users=users, highlight_user_id=highlight_user_id, active_filter=active_filter)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    
+    # After an approval, open the page that starts at the highlighted user
+    if highlight_user_id and after is None and before is None:
+        after = highlight_user_id - 1
+    
+    users, next_after, prev_before = user_admin.search_users(filters, after=after, before=before)
+    pending_cvs, pending_cvs_total = user_admin.pending_cv_reviews()
+    pending_institutions, pending_institutions_total = user_admin.pending_institution_reviews()
+    
+    # Filter values without the cursor, for building pagination links
+    filter_args = {key: value for key, value in filters.items() if value}
+    
+    return render_template('admin.html',
+        users=users,
+        user_counts=user_admin.user_counts(),
+        pending_cvs=pending_cvs,
+        pending_cvs_total=pending_cvs_total,
+        pending_institutions=pending_institutions,
+        pending_institutions_total=pending_institutions_total,
+        filters=filters,
+        filter_args=filter_args,
+        next_after=next_after,
+        prev_before=prev_before,
+        account_types=user_admin.ACCOUNT_TYPES,
+        review_statuses=user_admin.REVIEW_STATUSES,
+        highlight_user_id=highlight_user_id,
+        active_filter=filters['filter']
+    )
 
 @app.route('/admin/export-users')
 @login_required
 def export_users():
+    """Stream the user list as CSV, JSON Lines or XLSX, honoring the /admin filters."""
     if not current_user.is_admin:
         flash('Acesso negado.', 'error')
         return redirect(url_for('dashboard'))
     
-    import csv
-    import io
+    import tempfile
+    from flask import stream_with_context
+    import user_admin
+    from exports import (USER_EXPORT_FORMATS, USER_EXPORT_HEADERS, USER_EXPORT_KEYS, build_user_export_query,
+                         iter_user_rows, generate_csv, generate_jsonl, write_xlsx)
+    
+    formato = request.args.get('formato', 'csv')
+    if formato not in USER_EXPORT_FORMATS:
+        flash('Formato de exportação não suportado. Use CSV, JSONL ou XLSX.', 'error')
+        return redirect(url_for('admin'))
     
-    users = User.query.order_by(User.id).all()
+    filters = user_admin.parse_user_filters(request.args)
+    stmt = build_user_export_query(user_admin.user_filter_conditions(filters))
+    mimetype, filename = USER_EXPORT_FORMATS[formato]
     
-    def generate():
-        output = io.StringIO()
-        writer = csv.writer(output, delimiter=';')
-        writer.writerow(['ID', 'Nome', 'Email', 'Tipo de Conta', 'Status', 'Data de Cadastro', 'Status do CV'])
-        yield output.getvalue()
-        output.seek(0)
-        output.truncate(0)
-        
-        for user in users:
-            status = 'Ativo' if user.is_active_user else 'Inativo'
-            account_type = user.account_type or 'N/A'
-            created = user.created_at.strftime('%d/%m/%Y %H:%M') if user.created_at else 'N/A'
-            cv_status = user.cv_status or 'N/A'
-            
-            writer.writerow([user.id, user.username, user.email, account_type, status, created, cv_status])
-            yield output.getvalue()
-            output.seek(0)
-            output.truncate(0)
+    if formato == 'xlsx':
+        # Write-only workbooks spool to disk; the temp file is removed when send_file closes it
+        spool = tempfile.TemporaryFile()
+        write_xlsx(iter_user_rows(stmt), spool, headers=USER_EXPORT_HEADERS, sheet_title='Usuários')
+        spool.seek(0)
+        return send_file(spool, mimetype=mimetype, as_attachment=True, download_name=filename)
     
+    if formato == 'csv':
+        chunks = generate_csv(iter_user_rows(stmt), headers=USER_EXPORT_HEADERS)
+    else:
+        chunks = generate_jsonl(iter_user_rows(stmt), keys=USER_EXPORT_KEYS)
     return Response(
-        generate(),
-        mimetype='text/csv',
-        headers={"Content-Disposition": "attachment;filename=usuarios.csv"}
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment;filename={filename}"}
     )
 
 @app.route('/admin/toggle_user/<int:user_id>')
@@ -1441,6 +1629,7 @@ def toggle_user_status(user_id):
     else:
         user.is_active_user = not user.is_active_user
         db.session.commit()
+        auth_cache.invalidate(user.id)
         status = "ativado" if user.is_active_user else "desativado"
         flash(f'Usuário {user.username} foi {status}.', 'success')
     
@@ -1459,6 +1648,7 @@ def toggle_admin_status(user_id):
     else:
         user.is_admin = not user.is_admin
         db.session.commit()
+        auth_cache.invalidate(user.id)
         status = "promovido a administrador" if user.is_admin else "removido da administração"
         flash(f'Usuário {user.username} foi {status}.', 'success')
     
@@ -1472,52 +1662,93 @@ def admin_monitoramento():
         flash('Acesso negado. Apenas administradores podem acessar esta página.', 'error')
         return redirect(url_for('dashboard'))
     
-    from datetime import timedelta
+    import monitoring
+    from session_events import live_updates_available
+    
+    # Headline counts and average duration come from one aggregate query
+    overview = monitoring.session_overview()
+    
+    return render_template('admin_monitoramento.html',
+        active_sessions=monitoring.active_sessions(),
+        active_users_count=overview['active_count'],
+        today_logins=overview['today_logins'],
+        week_logins=overview['week_logins'],
+        total_users=User.query.count(),
+        recent_sessions=monitoring.recent_sessions(),
+        avg_duration_formatted=monitoring.format_duration(overview['avg_duration_seconds']),
+        daily_logins=monitoring.daily_login_counts(),
+        top_users=monitoring.top_users(),
+        live_updates=live_updates_available()
+    )
+
+
+@app.route('/api/monitoramento/tendencias')
+@login_required
+def api_monitoramento_tendencias():
+    """API endpoint with login trends read from the hourly/daily rollup tables."""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Acesso negado.'}), 403
+    
+    import monitoring
     
-    # Run cleanup of expired sessions periodically
-    cleanup_expired_sessions()
+    granularity = request.args.get('granularidade', 'dia')
+    granularity = {'hora': 'hour', 'dia': 'day'}.get(granularity)
+    if not granularity:
+        return jsonify({'success': False, 'error': 'Granularidade inválida. Use "hora" ou "dia".'}), 400
     
-    # Active sessions (users currently online)
-    active_sessions = UserSession.query.filter_by(is_active=True).all()
-    active_users_count = len(active_sessions)
+    max_periods = 24 * 31 if granularity == 'hour' else 366 * 2
+    periods = request.args.get('periodos', 48 if granularity == 'hour' else 30, type=int)
+    periods = max(1, min(periods, max_periods))
     
-    # Total unique logins today
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_logins = UserSession.query.filter(UserSession.login_at >= today_start).count()
+    return jsonify({
+        'success': True,
+        'granularity': granularity,
+        'series': monitoring.session_trends(granularity, periods)
+    })
+
+
+@app.route('/admin/monitoramento/eventos')
+@login_required
+def admin_monitoramento_eventos():
+    """Server-Sent Events stream with session deltas (login, logout, expiry) for the monitoring page."""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Acesso negado.'}), 403
     
-    # Total logins this week
-    week_start = today_start - timedelta(days=today_start.weekday())
-    week_logins = UserSession.query.filter(UserSession.login_at >= week_start).count()
+    import json
+    import queue
+    import time
+    from session_events import live_updates_available, session_events, SSE_STREAM_SECONDS, SSE_KEEPALIVE_SECONDS
     
-    # Total registered users
-    total_users = User.query.count()
+    if not live_updates_available():
+        return jsonify({'success': False, 'error': 'Atualização ao vivo requer PostgreSQL.'}), 404
     
-    # Recent sessions (last 50)
-    recent_sessions = UserSession.query.order_by(UserSession.login_at.desc()).limit(50).all()
+    subscriber, replay = session_events.subscribe(request.headers.get('Last-Event-ID'))
     
-    # Average session duration (for completed sessions)
-    completed_sessions = UserSession.query.filter(
-        UserSession.logout_at.isnot(None)
-    ).all()
+    def format_event(event):
+        return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
     
-    if completed_sessions:
-        total_duration = sum(s.duration_seconds for s in completed_sessions)
-        avg_duration_seconds = total_duration // len(completed_sessions)
-        avg_hours = avg_duration_seconds // 3600
-        avg_minutes = (avg_duration_seconds % 3600) // 60
-        avg_duration_formatted = f"{avg_hours}h {avg_minutes}m" if avg_hours > 0 else f"{avg_minutes}m"
-    else:
-        avg_duration_formatted = "N/A"
+    def generate():
+        try:
+            # Streams end periodically so idle connections are recycled;
+            # EventSource reconnects and Last-Event-ID replays anything missed
+            yield 'retry: 1000\n\n'
+            for event in replay:
+                yield format_event(event)
+            deadline = time.monotonic() + SSE_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    event = subscriber.get(timeout=min(SSE_KEEPALIVE_SECONDS, max(0.1, deadline - time.monotonic())))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_event(event)
+        finally:
+            session_events.unsubscribe(subscriber)
     
-    return render_template('admin_monitoramento.html',
-        active_sessions=active_sessions,
-        active_users_count=active_users_count,
-        today_logins=today_logins,
-        week_logins=week_logins,
-        total_users=total_users,
-        recent_sessions=recent_sessions,
-        avg_duration_formatted=avg_duration_formatted
-    )
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 
 # CV and Institution Validation Routes
@@ -1540,6 +1771,7 @@ def validate_cv(user_id, action):
         user.cv_reviewed_by = current_user.id
         user.cv_rejection_reason = None
         db.session.commit()
+        auth_cache.invalidate(user.id)
         
         # Get current language for multilingual messages
         lang = session.get('language', 'pt')
@@ -1562,6 +1794,7 @@ def validate_cv(user_id, action):
         user.cv_rejection_reason = reason
         user.is_active_user = False  # Deactivate account when CV is rejected
         db.session.commit()
+        auth_cache.invalidate(user.id)
         
         # Get current language for multilingual messages
         lang = session.get('language', 'pt')
@@ -1594,6 +1827,7 @@ def validate_institution(user_id, action):
         user.institution_reviewed_by = current_user.id
         user.institution_rejection_reason = None
         db.session.commit()
+        auth_cache.invalidate(user.id)
         
         # Get current language for multilingual messages
         lang = session.get('language', 'pt')
@@ -1613,6 +1847,7 @@ def validate_institution(user_id, action):
         user.institution_rejection_reason = reason
         user.is_active_user = False  # Deactivate account when institution is rejected
         db.session.commit()
+        auth_cache.invalidate(user.id)
         
         # Get current language for multilingual messages
         lang = session.get('language', 'pt')
@@ -1626,6 +1861,63 @@ def validate_institution(user_id, action):
     
     return redirect(url_for('admin'))
 
+@app.route('/admin/validacao/lote', methods=['POST'])
+@login_required
+def validate_reviews_bulk():
+    """Approve or reject the CV/institution reviews of many users in one request."""
+    if not current_user.is_admin:
+        flash('Acesso negado. Apenas administradores podem validar cadastros.', 'error')
+        return redirect(url_for('dashboard'))
+    
+    import user_admin
+    
+    kind = request.form.get('tipo', 'todos')
+    action = request.form.get('action')
+    user_ids = sorted({int(value) for value in request.form.getlist('user_ids') if value.isdigit()})
+    reason = request.form.get('reason', '').strip() or None
+    
+    kinds = list(user_admin.REVIEW_KINDS) if kind == 'todos' else [kind]
+    if action not in ('approve', 'reject') or not all(k in user_admin.REVIEW_KINDS for k in kinds):
+        flash('Ação em lote inválida.', 'error')
+        return redirect(url_for('admin'))
+    if not user_ids:
+        flash('Selecione pelo menos um usuário.', 'warning')
+        return redirect(url_for('admin'))
+    if len(user_ids) > user_admin.BULK_REVIEW_MAX_USERS:
+        flash(f'Selecione no máximo {user_admin.BULK_REVIEW_MAX_USERS} usuários por vez.', 'warning')
+        return redirect(url_for('admin'))
+    
+    updated_ids = []
+    for review_kind in kinds:
+        updated_ids += user_admin.bulk_review(review_kind, action, user_ids, current_user.id, reason)
+    db.session.commit()
+    auth_cache.invalidate(*updated_ids)
+    
+    count = len(updated_ids)
+    lang = session.get('language', 'pt')
+    if action == 'approve':
+        messages = {
+            'pt': f'{count} cadastro(s) aprovado(s) com sucesso!',
+            'en': f'{count} registration(s) approved successfully!',
+            'es': f'¡{count} registro(s) aprobado(s) con éxito!',
+            'fr': f'{count} inscription(s) approuvée(s) avec succès!'
+        }
+        flash(messages.get(lang, messages['pt']), 'success')
+    else:
+        messages = {
+            'pt': f'{count} cadastro(s) rejeitado(s). As contas foram desativadas.',
+            'en': f'{count} registration(s) rejected. The accounts have been deactivated.',
+            'es': f'{count} registro(s) rechazado(s). Las cuentas han sido desactivadas.',
+            'fr': f'{count} inscription(s) rejetée(s). Les comptes ont été désactivés.'
+        }
+        flash(messages.get(lang, messages['pt']), 'warning')
+    
+    skipped = len(user_ids) - count
+    if skipped > 0 and kind != 'todos':
+        flash(f'{skipped} usuário(s) ignorado(s) por não possuírem o tipo de conta correspondente.', 'info')
+    
+    return redirect(url_for('admin'))
+
 # Language routes
 @app.route('/set_language/<language>')
 def set_language(language=None):
@@ -1638,8 +1930,8 @@ def set_language(language=None):
 @login_required
 def galeria():
     # Show published photos for regular users, all photos for admins
-    page = request.args.get('page', 1, type=int)
     category = request.args.get('category', 'all', type=str)
+    cursor = request.args.get('cursor') or None
     
     query = PhotoGallery.query
     
@@ -1651,44 +1943,55 @@ def galeria():
     if category != 'all':
         query = query.filter_by(category=category)
     
-    photos = query.order_by(PhotoGallery.created_at.desc()).paginate(
-        page=page, per_page=12, error_out=False
-    )
+    # Keyset "load more" pages: no COUNT(*), and deep pages cost the same as the first
+    try:
+        photos, next_cursor = gallery.photo_page(query, cursor, gallery.GALLERY_PAGE_SIZE)
+    except gallery.InvalidCursor:
+        return redirect(url_for('galeria', category=category))
     
-    return render_template('galeria.html', photos=photos, current_category=category)
+    return render_template('galeria.html', photos=photos, next_cursor=next_cursor,
+                           is_first_page=cursor is None, current_category=category)
 
 @app.route('/api/galeria/photos')
 def api_gallery_photos():
     """
     API endpoint para retornar fotos da galeria em formato JSON
-    Retorna apenas fotos publicadas da categoria 'equipe' para usuários não autenticados
+    Retorna apenas fotos publicadas da categoria 'equipe', paginadas por cursor
+    (?cursor=&limit=). As respostas levam ETag/Last-Modified e ficam em cache por
+    versão da galeria; requisições condicionais válidas recebem 304.
     """
+    from werkzeug.http import is_resource_modified
+    
     try:
-        # Se o usuário não estiver autenticado, retornar apenas fotos públicas da equipe
-        query = PhotoGallery.query.filter_by(is_published=True, category='equipe')
-        
-        # Buscar todas as fotos
-        photos = query.order_by(PhotoGallery.created_at.desc()).all()
-        
-        # Serializar as fotos para JSON
-        photos_data = []
-        for photo in photos:
-            photos_data.append({
-                'id': photo.id,
-                'title': photo.title,
-                'description': photo.description or '',
-                'image_path': photo.image_path,
-                'category': photo.category,
-                'event_name': photo.event_name or '',
-                'created_at': photo.created_at.strftime('%d/%m/%Y'),
-                'created_by': photo.created_by.username if photo.created_by else 'Desconhecido'
-            })
-        
+        limit = request.args.get('limit', gallery.GALLERY_API_PAGE_SIZE, type=int)
+        limit = min(max(limit, 1), gallery.GALLERY_API_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor') or None
+        
+        version = gallery.gallery_version()
+        etag = gallery.make_etag(version, cursor, limit)
+        last_modified = version[0]
+        
+        response = Response(mimetype='application/json')
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        # Public, but always revalidated so admin changes show up immediately
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            response.status_code = 304
+            return response
+        
+        response.set_data(gallery.public_team_photos(version, cursor, limit))
+        return response
+    except gallery.InvalidCursor:
         return jsonify({
-            'success': True,
-            'photos': photos_data,
-            'total': len(photos_data)
-        })
+            'success': False,
+            'error': 'Cursor de paginação inválido.',
+            'photos': [],
+            'total': 0
+        }), 400
     except Exception as e:
         # Log erro detalhado no servidor, mas retorna mensagem genérica para o cliente
         app.logger.error(f'Erro ao buscar fotos da galeria: {str(e)}', exc_info=True)
@@ -1719,19 +2022,23 @@ def admin_galeria():
         
         # Handle image upload
         if form.image.data:
-            from storage import upload_gallery_photo
+            from storage import upload_gallery_photo, image_placeholder
+            image_placeholder_uri = image_placeholder(form.image.data)
             image_url = upload_gallery_photo(form.image.data)
             if image_url:
                 photo.image_path = image_url
+                photo.image_placeholder = image_placeholder_uri
                 db.session.add(photo)
                 db.session.commit()
+                gallery.invalidate_cache()
                 flash('Foto adicionada à galeria com sucesso!', 'success')
                 return redirect(url_for('admin_galeria'))
             else:
                 flash('Erro ao fazer upload da imagem. Tente novamente.', 'error')
     
     photos = PhotoGallery.query.order_by(PhotoGallery.created_at.desc()).all()
-    return render_template('admin_galeria.html', form=form, photos=photos)
+    return render_template('admin_galeria.html', form=form, photos=photos,
+                           bulk_max_files=gallery.GALLERY_BULK_MAX_FILES)
 
 @app.route('/admin/galeria/toggle/<int:photo_id>')
 @login_required
@@ -1743,6 +2050,7 @@ def toggle_photo_publication(photo_id):
     photo = PhotoGallery.query.get_or_404(photo_id)
     photo.is_published = not photo.is_published
     db.session.commit()
+    gallery.invalidate_cache()
     
     status = "publicada" if photo.is_published else "despublicada"
     flash(f'Foto "{photo.title}" foi {status}.', 'success')
@@ -1764,9 +2072,50 @@ def delete_photo(photo_id):
     
     db.session.delete(photo)
     db.session.commit()
+    gallery.invalidate_cache()
     flash(f'Foto "{photo.title}" foi removida da galeria.', 'success')
     return redirect(url_for('admin_galeria'))
 
+@app.route('/admin/galeria/lote', methods=['POST'])
+@login_required
+def upload_gallery_batch():
+    """Upload several gallery photos at once; returns a JSON result per file."""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'error': 'Acesso negado. Apenas administradores podem adicionar fotos.'}), 403
+    
+    images = [image for image in request.files.getlist('images') if image and image.filename]
+    if not images:
+        return jsonify({'success': False, 'error': 'Nenhuma imagem foi enviada.'}), 400
+    if len(images) > gallery.GALLERY_BULK_MAX_FILES:
+        return jsonify({
+            'success': False,
+            'error': f'Envie no máximo {gallery.GALLERY_BULK_MAX_FILES} imagens por requisição.'
+        }), 400
+    
+    category = request.form.get('category', 'geral')
+    if category not in ('geral', 'equipe', 'evento'):
+        return jsonify({'success': False, 'error': 'Categoria inválida.'}), 400
+    
+    results = gallery.bulk_upload_photos(
+        images,
+        user_id=current_user.id,
+        category=category,
+        title=request.form.get('title', '').strip()[:190],
+        description=request.form.get('description', '').strip(),
+        event_name=request.form.get('event_name', '').strip()[:200] or None,
+        is_published=request.form.get('is_published') in ('1', 'true', 'on')
+    )
+    
+    uploaded = sum(1 for result in results if result['success'])
+    current_app.logger.info(f'{uploaded}/{len(results)} fotos enviadas em lote por {current_user.username} (ID: {current_user.id})')
+    
+    return jsonify({
+        'success': uploaded > 0,
+        'uploaded': uploaded,
+        'failed': len(results) - uploaded,
+        'results': results
+    })
+
 @app.route('/api/team/upload_photo', methods=['POST'])
 @login_required
 def upload_team_photo():
@@ -1808,7 +2157,8 @@ def upload_team_photo():
             current_app.logger.error('Upload de foto da equipe falhou: arquivo vazio')
             return jsonify({'success': False, 'error': 'Arquivo vazio. Por favor, selecione uma imagem válida.'}), 400
         
-        from storage import upload_gallery_photo
+        from storage import upload_gallery_photo, image_placeholder
+        image_placeholder_uri = image_placeholder(image)
         image_url = upload_gallery_photo(image)
         
         if not image_url:
@@ -1821,11 +2171,13 @@ def upload_team_photo():
             category='equipe',
             is_published=True,
             user_id=current_user.id,
-            image_path=image_url
+            image_path=image_url,
+            image_placeholder=image_placeholder_uri
         )
         
         db.session.add(photo)
         db.session.commit()
+        gallery.invalidate_cache()
         
         current_app.logger.info(f'Foto da equipe "{title}" adicionada com sucesso por {current_user.username} (ID: {current_user.id})')
         
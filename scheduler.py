@@ -0,0 +1,239 @@
+"""
+Background scheduler for periodic maintenance (expired-session cleanup and friends).
+
+Every gunicorn worker starts a scheduler thread, but only the elected leader runs
+jobs: on PostgreSQL through a session-level advisory lock held on a dedicated
+connection, elsewhere through a lease row in the scheduler_lock table that the
+leader renews on every tick. Jobs never run inside user requests.
+"""
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', '1') not in ('0', 'false', 'False')
+SCHEDULER_TICK_SECONDS = int(os.environ.get('SCHEDULER_TICK_SECONDS', 15))
+SCHEDULER_LEASE_SECONDS = 90  # A lease row not renewed for this long can be taken over
+SCHEDULER_LOCK_NAME = 'maintenance'
+SCHEDULER_ADVISORY_LOCK_KEY = 727274  # Arbitrary application-wide key for pg_try_advisory_lock
+
+SESSION_TIMEOUT_MINUTES = 30
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceScheduler:
+    """Runs registered jobs at fixed intervals in the elected leader process"""
+
+    def __init__(self, tick_seconds=SCHEDULER_TICK_SECONDS):
+        self.tick_seconds = tick_seconds
+        self.jobs = {}
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._leader_conn = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def job(self, name, interval_seconds):
+        """Decorator registering a maintenance job.
+
+        Args:
+            name: Unique job name (used in logs and by `flask run-maintenance --job`)
+            interval_seconds: Minimum time between two runs
+        """
+        def decorator(func):
+            self.jobs[name] = {'func': func, 'interval': interval_seconds, 'last_run': None}
+            return func
+        return decorator
+
+    def ensure_started(self):
+        """Start the scheduler thread in this process (once per worker, again after fork)"""
+        if not SCHEDULER_ENABLED:
+            return
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.owner = f'{socket.gethostname()}:{self._pid}'
+            self._leader_conn = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='maintenance-scheduler', daemon=True)
+            self._thread.start()
+
+    def run_pending(self, force=False, only=None):
+        """Run jobs whose interval has elapsed. Must be called inside an app context.
+
+        Args:
+            force: Run every selected job regardless of its interval
+            only: Optional job name to restrict the run to
+
+        Returns:
+            Dict of job name -> job result for the jobs that ran
+        """
+        from app import db
+
+        results = {}
+        now = datetime.utcnow()
+        for name, job in self.jobs.items():
+            if only and name != only:
+                continue
+            if not force and job['last_run'] and (now - job['last_run']).total_seconds() < job['interval']:
+                continue
+            job['last_run'] = now
+            try:
+                results[name] = job['func']()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception('Falha na tarefa de manutenção %s', name)
+        return results
+
+    def _run(self):
+        from app import app
+
+        while not self._stop.wait(self.tick_seconds):
+            try:
+                with app.app_context():
+                    if self._acquire_leadership():
+                        self.run_pending()
+            except Exception:
+                logger.exception('Falha no agendador de manutenção')
+
+    def _acquire_leadership(self):
+        from app import db
+
+        if db.engine.dialect.name == 'postgresql':
+            return self._acquire_advisory_lock(db.engine)
+        return self._acquire_lease(db)
+
+    def _acquire_advisory_lock(self, engine):
+        # The lock lives as long as this connection, so it stays checked out while we lead
+        if self._leader_conn is not None:
+            try:
+                self._leader_conn.execute(text('SELECT 1'))
+                self._leader_conn.commit()
+                return True
+            except Exception:
+                logger.warning('Conexão do líder do agendador perdida; nova eleição no próximo ciclo')
+                self._leader_conn.invalidate()
+                self._leader_conn = None
+                return False
+
+        conn = engine.connect()
+        acquired = conn.execute(
+            text('SELECT pg_try_advisory_lock(:key)'), {'key': SCHEDULER_ADVISORY_LOCK_KEY}
+        ).scalar()
+        conn.commit()
+        if acquired:
+            self._leader_conn = conn
+            logger.info('Processo %s assumiu o agendador de manutenção', self.owner)
+            return True
+        conn.close()
+        return False
+
+    def _acquire_lease(self, db):
+        from models import SchedulerLock
+
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=SCHEDULER_LEASE_SECONDS)
+        renewed = db.session.execute(
+            db.update(SchedulerLock)
+            .where(
+                SchedulerLock.name == SCHEDULER_LOCK_NAME,
+                db.or_(SchedulerLock.owner == self.owner, SchedulerLock.heartbeat_at < stale_before)
+            )
+            .values(owner=self.owner, heartbeat_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if renewed:
+            db.session.commit()
+            return True
+
+        try:
+            db.session.add(SchedulerLock(name=SCHEDULER_LOCK_NAME, owner=self.owner, heartbeat_at=now))
+            db.session.commit()
+            logger.info('Processo %s assumiu o agendador de manutenção', self.owner)
+            return True
+        except IntegrityError:
+            # Another process holds a live lease
+            db.session.rollback()
+            return False
+
+
+maintenance_scheduler = MaintenanceScheduler()
+
+
+@maintenance_scheduler.job('expire_sessions', interval_seconds=60)
+def expire_stale_sessions():
+    """Close sessions idle for longer than SESSION_TIMEOUT_MINUTES with a bulk UPDATE.
+
+    Returns:
+        Number of sessions expired
+    """
+    from app import db
+    from models import UserSession
+    from session_events import session_events
+
+    timeout_threshold = datetime.utcnow() - timedelta(minutes=SESSION_TIMEOUT_MINUTES)
+
+    # logout_at is set to each row's own last_activity
+    expired = db.session.execute(
+        db.update(UserSession)
+        .where(UserSession.is_active == True, UserSession.last_activity < timeout_threshold)
+        .values(is_active=False, logout_at=UserSession.last_activity, logout_type='expired')
+        .returning(UserSession.id, UserSession.user_id, UserSession.logout_at)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+
+    for session_id, user_id, logout_at in expired:
+        session_events.publish('expired', session_id=session_id, user_id=user_id, logout_at=logout_at.isoformat())
+    return len(expired)
+
+
+@maintenance_scheduler.job('session_rollups', interval_seconds=60)
+def refresh_session_rollups():
+    """Fold recent logins/logouts into the hourly and daily SessionRollup rows"""
+    from monitoring import update_session_rollups
+
+    return update_session_rollups()
+
+
+@maintenance_scheduler.job('archive_sessions', interval_seconds=3600)
+def archive_sessions():
+    """Move closed sessions past SESSION_RETENTION_DAYS into the archive table"""
+    from session_retention import archive_old_sessions
+
+    return archive_old_sessions()
+
+
+@maintenance_scheduler.job('optimize_3d_models', interval_seconds=300)
+def optimize_3d_models():
+    """Queue 3D scans still waiting for an optimized GLB (e.g. after a worker restart)"""
+    from mesh_pipeline import pending_scan_ids, queue_scan_optimization
+
+    # Conversions can take minutes; they run on the mesh pools so this thread (and the
+    # other jobs and the leader lease) never waits on them. A scan already queued is
+    # skipped by optimize_scan's atomic claim.
+    scan_ids = pending_scan_ids(limit=5)
+    for scan_id in scan_ids:
+        queue_scan_optimization(scan_id)
+    return len(scan_ids)
+
+
+@maintenance_scheduler.job('reconcile_dashboard_counters', interval_seconds=86400)
+def reconcile_dashboard_counters():
+    """Recompute the dashboard counters, correcting drift from writes made outside the ORM"""
+    from app import db
+    from dashboard_stats import rebuild_counters
+
+    written = rebuild_counters()
+    db.session.commit()
+    return written
@@ -0,0 +1,108 @@
+"""
+Write-behind buffer for UserSession.last_activity.
+
+Authenticated requests only record the activity timestamp in memory; a background
+thread in each worker writes the buffered timestamps in one batched UPDATE every
+ACTIVITY_FLUSH_INTERVAL seconds, or sooner once ACTIVITY_FLUSH_MAX_ENTRIES sessions
+are pending. The buffer is also flushed when the worker shuts down.
+"""
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam
+
+# Keeps last_activity within the 60-second tolerance used by the monitoring page
+ACTIVITY_FLUSH_INTERVAL = int(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 30))
+ACTIVITY_FLUSH_MAX_ENTRIES = int(os.environ.get('ACTIVITY_FLUSH_MAX_ENTRIES', 200))
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    """In-process buffer of session_token -> latest activity timestamp"""
+
+    def __init__(self, flush_interval=ACTIVITY_FLUSH_INTERVAL, max_entries=ACTIVITY_FLUSH_MAX_ENTRIES):
+        self.flush_interval = flush_interval
+        self.max_entries = max_entries
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, session_token, timestamp=None):
+        """Record activity for a session; the database write happens later in bulk.
+
+        Args:
+            session_token: UserSession.session_token of the current request
+            timestamp: Activity time (defaults to now, UTC)
+        """
+        self._ensure_flusher()
+        with self._lock:
+            self._pending[session_token] = timestamp or datetime.utcnow()
+            if len(self._pending) >= self.max_entries:
+                self._wakeup.set()
+
+    def discard(self, session_token):
+        """Drop a pending timestamp, e.g. when the session is closed on logout"""
+        with self._lock:
+            self._pending.pop(session_token, None)
+
+    def flush(self):
+        """Write all pending timestamps in a single executemany UPDATE.
+
+        Returns:
+            Number of session timestamps written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        from app import app, db
+        from models import UserSession
+
+        table = UserSession.__table__
+        stmt = table.update().where(
+            table.c.session_token == bindparam('b_token'),
+            table.c.is_active == True
+        ).values(last_activity=bindparam('b_activity'))
+        params = [{'b_token': token, 'b_activity': ts} for token, ts in pending.items()]
+
+        try:
+            with app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(stmt, params)
+        except Exception:
+            logger.exception('Falha ao gravar atividade de %d sessões', len(params))
+            # Put the timestamps back unless newer ones arrived meanwhile
+            with self._lock:
+                for token, ts in pending.items():
+                    if token not in self._pending:
+                        self._pending[token] = ts
+            return 0
+        return len(params)
+
+    def _ensure_flusher(self):
+        # Started lazily (and again after fork) so each gunicorn worker owns its thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='session-activity-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+activity_buffer = ActivityBuffer()
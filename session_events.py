@@ -0,0 +1,141 @@
+"""
+In-process event bus for live session monitoring (login, logout, expiry).
+
+Routes and the expiry job publish small events after their commit; the
+monitoring page receives them over Server-Sent Events. Events travel through
+PostgreSQL NOTIFY so every gunicorn worker and replica sees them: a listener
+thread in each process that has SSE subscribers re-publishes them locally.
+
+Other databases have no cross-process channel, and events published by the
+scheduler leader (expiries) or by another worker would never reach a stream,
+so live updates are disabled there (live_updates_available()) and the
+monitoring page falls back to periodic reloads.
+
+Each open stream holds a request thread for SSE_STREAM_SECONDS, which is why
+the deploy configs run gunicorn with gthread workers instead of sync ones.
+"""
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from collections import deque
+
+SESSION_EVENTS_CHANNEL = 'laari_session_events'
+SESSION_EVENTS_HISTORY = 200  # Events kept for Last-Event-ID replay after a reconnect
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# gthread workers keep heartbeating while a thread streams; clients reconnect transparently
+# and Last-Event-ID replays anything published in between
+SSE_STREAM_SECONDS = 300
+SSE_KEEPALIVE_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+
+def live_updates_available():
+    """True when events reach every process (PostgreSQL LISTEN/NOTIFY)"""
+    from app import db
+
+    return db.engine.dialect.name == 'postgresql'
+
+
+class SessionEventBus:
+    """Fan-out of session events to the SSE streams of this process"""
+
+    def __init__(self, history_size=SESSION_EVENTS_HISTORY):
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def publish(self, event_type, **data):
+        """Publish an event; call after the change it describes has been committed.
+
+        Args:
+            event_type: login, logout, forced or expired
+            **data: JSON-serializable event fields (session_id, user_id, username, ...)
+        """
+        if not live_updates_available():
+            return
+
+        # Nanosecond timestamps double as ordered ids across processes
+        event = dict(data, id=str(time.time_ns()), type=event_type)
+
+        from app import db
+
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    db.select(db.func.pg_notify(SESSION_EVENTS_CHANNEL, json.dumps(event, default=str)))
+                )
+        except Exception:
+            logger.exception('Falha ao publicar evento de sessão %s', event_type)
+
+    def subscribe(self, last_event_id=None):
+        """Register an SSE stream.
+
+        Args:
+            last_event_id: Last event the client saw; newer buffered events are replayed
+
+        Returns:
+            Tuple (queue, replayed events)
+        """
+        self._ensure_listener()
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            replay = []
+            if last_event_id and last_event_id.isdigit():
+                replay = [event for event in self._history if int(event['id']) > int(last_event_id)]
+        return subscriber, replay
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _deliver(self, event):
+        with self._lock:
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A stalled client only loses live events; it reloads on reconnect
+                pass
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='session-events-listener', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        from app import app, db
+
+        while True:
+            try:
+                with app.app_context():
+                    raw = db.engine.raw_connection()
+                try:
+                    conn = raw.driver_connection
+                    conn.autocommit = True
+                    conn.cursor().execute(f'LISTEN {SESSION_EVENTS_CHANNEL}')
+                    while True:
+                        if select.select([conn], [], [], 5) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            notify = conn.notifies.pop(0)
+                            self._deliver(json.loads(notify.payload))
+                finally:
+                    raw.invalidate()
+            except Exception:
+                logger.exception('Listener de eventos de sessão interrompido; reconectando')
+                time.sleep(5)
+
+
+session_events = SessionEventBus()
@@ -0,0 +1,155 @@
+"""
+Retention for the UserSession table.
+Closed sessions older than SESSION_RETENTION_DAYS are moved in batches to the
+compact user_session_archive table (monthly range partitions on PostgreSQL);
+their login and duration figures already live in SessionRollup. User-Agent
+strings are stored once in the user_agent lookup table.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import UserSession, UserSessionArchive, UserAgent
+
+SESSION_RETENTION_DAYS = int(os.environ.get('SESSION_RETENTION_DAYS', 180))
+ARCHIVE_BATCH_SIZE = 2000
+ARCHIVE_MAX_BATCHES_PER_RUN = 25
+
+# Keeps id IN (...) lists well below SQLite's bound-parameter limit
+DELETE_CHUNK_SIZE = 500
+
+USER_AGENT_CACHE_SIZE = 1000
+
+# Per-process caches: sha256 -> user_agent.id, and archive partitions known to exist
+_user_agent_ids = {}
+_archive_partitions = set()
+
+
+def user_agent_id_for(user_agent):
+    """
+    Return the id of the lookup row for a User-Agent string, creating it if needed.
+
+    Args:
+        user_agent: Raw User-Agent header (truncated to 500 characters)
+
+    Returns:
+        user_agent.id, or None for an empty header
+    """
+    if not user_agent:
+        return None
+    user_agent = user_agent[:500]
+    ua_hash = hashlib.sha256(user_agent.encode('utf-8')).hexdigest()
+
+    ua_id = _user_agent_ids.get(ua_hash)
+    if ua_id is not None:
+        return ua_id
+
+    ua_id = db.session.execute(db.select(UserAgent.id).where(UserAgent.ua_hash == ua_hash)).scalar()
+    if ua_id is None:
+        try:
+            with db.session.begin_nested():
+                row = UserAgent(ua_hash=ua_hash, user_agent=user_agent)
+                db.session.add(row)
+            ua_id = row.id
+        except IntegrityError:
+            # Another worker inserted the same string first
+            ua_id = db.session.execute(db.select(UserAgent.id).where(UserAgent.ua_hash == ua_hash)).scalar()
+
+    if len(_user_agent_ids) >= USER_AGENT_CACHE_SIZE:
+        _user_agent_ids.clear()
+    _user_agent_ids[ua_hash] = ua_id
+    return ua_id
+
+
+def _month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(month_start):
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+
+def ensure_archive_partitions(start, end):
+    """
+    Create the monthly user_session_archive partitions covering [start, end] (PostgreSQL only).
+
+    Args:
+        start: Earliest login_at to be archived
+        end: Latest login_at to be archived
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+
+    month = _month_start(start)
+    while month <= end:
+        name = f'user_session_archive_{month:%Y_%m}'
+        if name not in _archive_partitions:
+            db.session.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF user_session_archive "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+            ))
+            _archive_partitions.add(name)
+        month = _next_month(month)
+
+
+def archive_old_sessions(now=None, batch_size=ARCHIVE_BATCH_SIZE, max_batches=ARCHIVE_MAX_BATCHES_PER_RUN):
+    """
+    Move closed sessions older than the retention window into user_session_archive.
+
+    Works in batches of `batch_size` rows, committing after each one, and stops after
+    `max_batches` so a large backlog is spread over several scheduler runs.
+
+    Returns:
+        Number of sessions archived
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=SESSION_RETENTION_DAYS)
+    archived = 0
+
+    for _ in range(max_batches):
+        rows = db.session.execute(
+            db.select(
+                UserSession.id, UserSession.user_id, UserSession.login_at, UserSession.logout_at,
+                UserSession.logout_type, UserSession.ip_address, UserSession.user_agent_id
+            )
+            .where(UserSession.is_active == False, UserSession.login_at < cutoff)
+            .order_by(UserSession.login_at)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        ensure_archive_partitions(rows[0].login_at, rows[-1].login_at)
+        db.session.execute(db.insert(UserSessionArchive), [
+            {
+                'id': row.id,
+                'login_at': row.login_at,
+                'user_id': row.user_id,
+                'logout_at': row.logout_at,
+                'logout_type': row.logout_type,
+                'duration_seconds': int((row.logout_at - row.login_at).total_seconds()) if row.logout_at else None,
+                'ip_address': row.ip_address,
+                'user_agent_id': row.user_agent_id,
+                'archived_at': now,
+            }
+            for row in rows
+        ])
+
+        ids = [row.id for row in rows]
+        for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+            db.session.execute(
+                db.delete(UserSession)
+                .where(UserSession.id.in_(ids[i:i + DELETE_CHUNK_SIZE]))
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        archived += len(rows)
+
+        if len(rows) < batch_size:
+            break
+
+    return archived
@@ -16,8 +16,10 @@ function initializeApp() {
     initializeModals();
     initializeFormValidation();
     initializeFileUpload();
+    initializePhotoDownscaling();
     initializeSearch();
     initializeAnimations();
+    initializeLazyImages();
     initializeThemeControls();
     
     console.log('L.A.A.R.I System Initialized');
@@ -105,12 +107,128 @@ function validateField(field) {
 function initializeFileUpload() {
     // File upload preview and validation
     document.querySelectorAll('input[type="file"]').forEach(function(input) {
+        // Photo inputs that are downscaled validate the resized file instead
+        if (input.dataset.maxDimension) return;
+        
         input.addEventListener('change', function(e) {
             handleFileUpload(e.target);
         });
     });
 }
 
+/**
+ * Downscale photos in the browser before upload
+ * File inputs with data-max-dimension (and optionally data-quality and
+ * data-keep-original, the id of a "keep original" checkbox) get the selected
+ * JPEG/PNG replaced by a JPEG of at most that many pixels on its longest side.
+ */
+function initializePhotoDownscaling() {
+    document.querySelectorAll('input[type="file"][data-max-dimension]').forEach(function(input) {
+        const maxDimension = parseInt(input.dataset.maxDimension, 10);
+        const quality = parseFloat(input.dataset.quality || '0.82');
+        const keepOriginal = input.dataset.keepOriginal ? document.getElementById(input.dataset.keepOriginal) : null;
+        const submitButtons = input.form ? input.form.querySelectorAll('[type="submit"]') : [];
+        let original = null;
+        
+        function setBusy(busy) {
+            submitButtons.forEach(function(button) {
+                button.disabled = busy;
+            });
+        }
+        
+        function apply() {
+            if (!original) return;
+            
+            if (keepOriginal && keepOriginal.checked) {
+                setInputFile(input, original);
+                handleFileUpload(input);
+                return;
+            }
+            
+            setBusy(true);
+            downscaleImage(original, maxDimension, quality)
+                .then(function(file) {
+                    setInputFile(input, file);
+                })
+                .catch(function(error) {
+                    console.warn('Photo downscaling failed, sending the original:', error);
+                    setInputFile(input, original);
+                })
+                .then(function() {
+                    setBusy(false);
+                    handleFileUpload(input);
+                });
+        }
+        
+        input.addEventListener('change', function() {
+            original = input.files && input.files[0] ? input.files[0] : null;
+            apply();
+        });
+        
+        if (keepOriginal) {
+            keepOriginal.addEventListener('change', apply);
+        }
+    });
+}
+
+/**
+ * Replace the file selected in an input (no change event is fired)
+ */
+function setInputFile(input, file) {
+    if (!window.DataTransfer || input.files[0] === file) return;
+    
+    const transfer = new DataTransfer();
+    transfer.items.add(file);
+    input.files = transfer.files;
+}
+
+/**
+ * Re-encode an image as JPEG no larger than maxDimension pixels
+ * Browsers apply the EXIF orientation when drawing an <img>, so the pixels of
+ * the result are upright and it needs no orientation tag.
+ * Resolves with the original file when it is not a JPEG/PNG, is already small
+ * enough, or re-encoding would not make it smaller.
+ */
+function downscaleImage(file, maxDimension, quality) {
+    if (!/^image\/(jpeg|png)$/.test(file.type) || !window.DataTransfer || !window.URL) {
+        return Promise.resolve(file);
+    }
+    
+    const url = URL.createObjectURL(file);
+    const image = new Image();
+    image.src = url;
+    
+    return image.decode()
+        .then(function() {
+            const scale = Math.min(1, maxDimension / Math.max(image.naturalWidth, image.naturalHeight));
+            if (scale === 1 && file.type === 'image/jpeg') return file;
+            
+            const canvas = document.createElement('canvas');
+            canvas.width = Math.round(image.naturalWidth * scale);
+            canvas.height = Math.round(image.naturalHeight * scale);
+            
+            const context = canvas.getContext('2d');
+            context.fillStyle = '#fff';  // Transparent PNG areas become white in the JPEG
+            context.fillRect(0, 0, canvas.width, canvas.height);
+            context.imageSmoothingQuality = 'high';
+            context.drawImage(image, 0, 0, canvas.width, canvas.height);
+            
+            return new Promise(function(resolve) {
+                canvas.toBlob(function(blob) {
+                    if (!blob || blob.size >= file.size) {
+                        resolve(file);
+                        return;
+                    }
+                    const name = file.name.replace(/\.[^.]+$/, '') + '.jpg';
+                    resolve(new File([blob], name, { type: 'image/jpeg', lastModified: file.lastModified }));
+                }, 'image/jpeg', quality);
+            });
+        })
+        .finally(function() {
+            URL.revokeObjectURL(url);
+        });
+}
+
 /**
  * Handle file upload with preview and validation
  */
@@ -279,6 +397,53 @@ function initializeAnimations() {
     });
 }
 
+/**
+ * Lazy image loading
+ * Images rendered with their stored placeholder as src keep the real URL in
+ * data-src; it is swapped in shortly before the image scrolls into view.
+ */
+let lazyImageObserver = null;
+
+function loadLazyImage(img) {
+    const source = img.dataset.src;
+    if (!source) return;
+    
+    const reveal = function() {
+        img.removeAttribute('data-src');
+    };
+    img.addEventListener('load', reveal, { once: true });
+    img.addEventListener('error', reveal, { once: true });
+    img.src = source;
+}
+
+function observeLazyImages(root) {
+    const images = (root || document).querySelectorAll('img.lazy-image[data-src]');
+    
+    if (!window.IntersectionObserver) {
+        images.forEach(loadLazyImage);
+        return;
+    }
+    
+    if (!lazyImageObserver) {
+        lazyImageObserver = new IntersectionObserver(function(entries, observer) {
+            entries.forEach(function(entry) {
+                if (entry.isIntersecting) {
+                    observer.unobserve(entry.target);
+                    loadLazyImage(entry.target);
+                }
+            });
+        }, { rootMargin: '200px 0px' });
+    }
+    
+    images.forEach(function(img) {
+        lazyImageObserver.observe(img);
+    });
+}
+
+function initializeLazyImages() {
+    observeLazyImages(document);
+}
+
 /**
  * Initialize theme controls
  */
@@ -578,6 +743,7 @@ window.LAARI = {
     copyToClipboard,
     generateQRCode,
     exportTableToCSV,
+    observeLazyImages,
     Storage
 };
 
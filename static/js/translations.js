@@ -418,6 +418,7 @@ const translations = {
         "gallery_photos_team": "Galeria de Fotos da Equipe",
         "gallery_loading": "Carregando...",
         "gallery_loading_text": "Carregando galeria...",
+        "gallery_load_more": "Carregar mais",
         "gallery_no_photos": "Nenhuma foto disponível",
         "gallery_empty_text": "A galeria está vazia no momento.",
         "gallery_team_badge": "Equipe",
@@ -465,7 +466,7 @@ const translations = {
         "model_3d_btn_download": "Download",
         "model_3d_btn_details": "Detalhes",
         "model_3d_btn_register": "Registrar Modelo",
-        "model_3d_file_formats": "Formatos aceitos: OBJ, PLY, STL, FBX (Máx. 16MB)",
+        "model_3d_file_formats": "Formatos aceitos: OBJ, PLY, STL, GLB, GLTF, FBX (Máx. 16MB). Arquivos FBX ficam disponíveis apenas para download, sem visualização 3D.",
         "model_3d_placeholder_scanner": "Ex: Artec Eva, NextEngine, etc.",
         "model_3d_placeholder_resolution": "Ex: 0.1mm, 0.5mm, etc.",
         "model_3d_placeholder_notes": "Adicione observações sobre o processo de digitalização, qualidade do scan, etc.",
@@ -626,6 +627,8 @@ const translations = {
         "catalog_info_5": "As informações podem ser editadas posteriormente se necessário",
         "catalog_photo_selected": "Foto selecionada:",
         "catalog_model3d_selected": "Modelo 3D selecionado:",
+        "catalog_field_keep_original": "Manter foto original (sem redução)",
+        "catalog_photo_resize_hint": "Fotos grandes são reduzidas no navegador antes do envio.",
         
         "excel_import_title": "Importação via EXCEL",
         "excel_import_subtitle": "Integre acervos já catalogados anteriormente ao sistema L.A.A.R.I",
@@ -1196,6 +1199,7 @@ const translations = {
         "gallery_photos_team": "Team Photo Gallery",
         "gallery_loading": "Loading...",
         "gallery_loading_text": "Loading gallery...",
+        "gallery_load_more": "Load more",
         "gallery_no_photos": "No photos available",
         "gallery_empty_text": "The gallery is empty at the moment.",
         "gallery_team_badge": "Team",
@@ -1243,7 +1247,7 @@ const translations = {
         "model_3d_btn_download": "Download",
         "model_3d_btn_details": "Details",
         "model_3d_btn_register": "Register Model",
-        "model_3d_file_formats": "Accepted formats: OBJ, PLY, STL, FBX (Max. 16MB)",
+        "model_3d_file_formats": "Accepted formats: OBJ, PLY, STL, GLB, GLTF, FBX (Max. 16MB). FBX files are kept for download only, without a 3D preview.",
         "model_3d_placeholder_scanner": "Ex: Artec Eva, NextEngine, etc.",
         "model_3d_placeholder_resolution": "Ex: 0.1mm, 0.5mm, etc.",
         "model_3d_placeholder_notes": "Add notes about the scanning process, scan quality, etc.",
@@ -1404,6 +1408,8 @@ const translations = {
         "catalog_info_5": "Information can be edited later if necessary",
         "catalog_photo_selected": "Photo selected:",
         "catalog_model3d_selected": "3D model selected:",
+        "catalog_field_keep_original": "Keep original photo (no downscaling)",
+        "catalog_photo_resize_hint": "Large photos are downscaled in the browser before upload.",
         
         "excel_import_title": "Excel Import",
         "excel_import_subtitle": "Integrate previously cataloged collections into the L.A.A.R.I system",
@@ -1974,6 +1980,7 @@ const translations = {
         "gallery_photos_team": "Galería de Fotos del Equipo",
         "gallery_loading": "Cargando...",
         "gallery_loading_text": "Cargando galería...",
+        "gallery_load_more": "Cargar más",
         "gallery_no_photos": "No hay fotos disponibles",
         "gallery_empty_text": "La galería está vacía en este momento.",
         "gallery_team_badge": "Equipo",
@@ -2021,7 +2028,7 @@ const translations = {
         "model_3d_btn_download": "Descargar",
         "model_3d_btn_details": "Detalles",
         "model_3d_btn_register": "Registrar Modelo",
-        "model_3d_file_formats": "Formatos aceptados: OBJ, PLY, STL, FBX (Máx. 16MB)",
+        "model_3d_file_formats": "Formatos aceptados: OBJ, PLY, STL, GLB, GLTF, FBX (Máx. 16MB). Los archivos FBX quedan solo para descarga, sin visualización 3D.",
         "model_3d_placeholder_scanner": "Ej: Artec Eva, NextEngine, etc.",
         "model_3d_placeholder_resolution": "Ej: 0.1mm, 0.5mm, etc.",
         "model_3d_placeholder_notes": "Agregue observaciones sobre el proceso de digitalización, calidad del escaneo, etc.",
@@ -2182,6 +2189,8 @@ const translations = {
         "catalog_info_5": "La información puede editarse posteriormente si es necesario",
         "catalog_photo_selected": "Foto seleccionada:",
         "catalog_model3d_selected": "Modelo 3D seleccionado:",
+        "catalog_field_keep_original": "Mantener foto original (sin reducción)",
+        "catalog_photo_resize_hint": "Las fotos grandes se reducen en el navegador antes del envío.",
         
         "excel_import_title": "Importación vía EXCEL",
         "excel_import_subtitle": "Integre colecciones previamente catalogadas al sistema L.A.A.R.I",
@@ -2752,6 +2761,7 @@ const translations = {
         "gallery_photos_team": "Galerie de Photos de l'Équipe",
         "gallery_loading": "Chargement...",
         "gallery_loading_text": "Chargement de la galerie...",
+        "gallery_load_more": "Charger plus",
         "gallery_no_photos": "Aucune photo disponible",
         "gallery_empty_text": "La galerie est vide pour le moment.",
         "gallery_team_badge": "Équipe",
@@ -2799,7 +2809,7 @@ const translations = {
         "model_3d_btn_download": "Télécharger",
         "model_3d_btn_details": "Détails",
         "model_3d_btn_register": "Enregistrer le Modèle",
-        "model_3d_file_formats": "Formats acceptés: OBJ, PLY, STL, FBX (Max. 16MB)",
+        "model_3d_file_formats": "Formats acceptés: OBJ, PLY, STL, GLB, GLTF, FBX (Max. 16MB). Les fichiers FBX sont conservés pour téléchargement uniquement, sans aperçu 3D.",
         "model_3d_placeholder_scanner": "Ex: Artec Eva, NextEngine, etc.",
         "model_3d_placeholder_resolution": "Ex: 0.1mm, 0.5mm, etc.",
         "model_3d_placeholder_notes": "Ajoutez des observations sur le processus de numérisation, la qualité du scan, etc.",
@@ -2960,6 +2970,8 @@ const translations = {
         "catalog_info_5": "Les informations peuvent être modifiées ultérieurement si nécessaire",
         "catalog_photo_selected": "Photo sélectionnée:",
         "catalog_model3d_selected": "Modèle 3D sélectionné:",
+        "catalog_field_keep_original": "Conserver la photo originale (sans réduction)",
+        "catalog_photo_resize_hint": "Les grandes photos sont réduites dans le navigateur avant l'envoi.",
         
         "excel_import_title": "Importation via EXCEL",
         "excel_import_subtitle": "Intégrez des collections déjà cataloguées au système L.A.A.R.I",
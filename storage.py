@@ -5,9 +5,8 @@ Falls back to local storage if Cloudinary is not configured.
 """
 import os
 import uuid
+import hashlib
 import logging
-import cloudinary
-import cloudinary.uploader
 from werkzeug.utils import secure_filename
 
 logger = logging.getLogger(__name__)
@@ -20,29 +19,46 @@ GALLERY_FOLDER = os.path.join(UPLOAD_FOLDER, 'gallery')
 CVS_FOLDER = os.path.join(UPLOAD_FOLDER, 'cvs')
 QRCODES_FOLDER = os.path.join(UPLOAD_FOLDER, 'qrcodes')
 PROFILES_FOLDER = os.path.join(UPLOAD_FOLDER, 'profiles')
+RESIZED_FOLDER = os.path.join(UPLOAD_FOLDER, 'resized')  # Cache of locally resized images
 
 # Create local folders as fallback
 for folder in [ARTEFATOS_FOLDER, EQUIPE_FOLDER, GALLERY_FOLDER, CVS_FOLDER, QRCODES_FOLDER, PROFILES_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 
 # Configure Cloudinary (strip whitespace from credentials)
-CLOUDINARY_CONFIGURED = False
 CLOUDINARY_CLOUD_NAME = (os.environ.get('CLOUDINARY_CLOUD_NAME') or '').strip()
 CLOUDINARY_API_KEY = (os.environ.get('CLOUDINARY_API_KEY') or '').strip()
 CLOUDINARY_API_SECRET = (os.environ.get('CLOUDINARY_API_SECRET') or '').strip()
+CLOUDINARY_CONFIGURED = bool(CLOUDINARY_CLOUD_NAME and CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET)
 
-if CLOUDINARY_CLOUD_NAME and CLOUDINARY_API_KEY and CLOUDINARY_API_SECRET:
-    cloudinary.config(
-        cloud_name=CLOUDINARY_CLOUD_NAME,
-        api_key=CLOUDINARY_API_KEY,
-        api_secret=CLOUDINARY_API_SECRET,
-        secure=True
-    )
-    CLOUDINARY_CONFIGURED = True
+if CLOUDINARY_CONFIGURED:
     logger.info("Cloudinary configured successfully for permanent storage")
 else:
     logger.warning("Cloudinary not configured. Using local storage (files may be lost on rebuild)")
 
+_cloudinary_uploader = None
+
+
+def get_cloudinary_uploader():
+    """
+    Import and configure the Cloudinary SDK on first use.
+
+    The SDK is only loaded when a file is actually uploaded or deleted,
+    keeping it out of the application's cold-start import path.
+    """
+    global _cloudinary_uploader
+    if _cloudinary_uploader is None:
+        import cloudinary
+        import cloudinary.uploader
+        cloudinary.config(
+            cloud_name=CLOUDINARY_CLOUD_NAME,
+            api_key=CLOUDINARY_API_KEY,
+            api_secret=CLOUDINARY_API_SECRET,
+            secure=True
+        )
+        _cloudinary_uploader = cloudinary.uploader
+    return _cloudinary_uploader
+
 
 def is_cloudinary_available():
     """Check if Cloudinary is configured and available."""
@@ -87,7 +103,7 @@ def upload_to_cloudinary(file, folder='laari'):
         
         public_id = f"{folder}/{uuid.uuid4().hex}_{original_filename.rsplit('.', 1)[0]}"
         
-        result = cloudinary.uploader.upload(
+        result = get_cloudinary_uploader().upload(
             file_content,
             public_id=public_id,
             resource_type="auto",
@@ -166,19 +182,75 @@ def upload_file(file, folder='uploads'):
         return upload_file_local(file, folder)
 
 
-def upload_artifact_photo(file, require_cloudinary=True):
+def downscale_photo(file, max_dimension, quality):
+    """
+    Shrink a camera photo to at most max_dimension pixels on its longest side.
+
+    The browser normally resizes photos before upload; this re-checks what
+    arrived so a photo sent without JavaScript (or from an older page) is not
+    stored at full camera resolution. EXIF orientation is applied to the
+    pixels. GIFs and photos already within the limit are returned unchanged.
+
+    Args:
+        file: FileStorage object from Flask request
+        max_dimension: Maximum width/height in pixels
+        quality: JPEG quality (1-95)
+
+    Returns:
+        FileStorage: The original file or a JPEG re-encoded copy
+    """
+    try:
+        import io
+        from PIL import Image, ImageOps
+        from werkzeug.datastructures import FileStorage
+
+        file.seek(0)
+        with Image.open(file.stream) as image:
+            if image.format == 'GIF' or max(image.size) <= max_dimension:
+                return file
+            original_size = image.size
+            image.draft('RGB', (max_dimension, max_dimension))  # Fast JPEG decode at reduced scale
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    except Exception as e:
+        logger.warning(f"Could not downscale photo {file.filename}: {str(e)}")
+        file.seek(0)
+        return file
+
+    buffer.seek(0)
+    logger.info(f"Downscaled photo {file.filename} from {original_size[0]}x{original_size[1]} "
+                f"to {image.size[0]}x{image.size[1]} ({buffer.getbuffer().nbytes} bytes)")
+    name = os.path.splitext(file.filename)[0] + '.jpg'
+    return FileStorage(stream=buffer, filename=name, content_type='image/jpeg')
+
+
+def upload_artifact_photo(file, require_cloudinary=True, max_dimension=None, quality=85):
     """
     Upload an artifact photo to Cloudinary.
     
     Args:
         file: FileStorage object from Flask request
         require_cloudinary: If True, fails when Cloudinary is not configured
+        max_dimension: Downscale larger photos to this many pixels (None keeps the original)
+        quality: JPEG quality used when downscaling
         
     Returns:
         str: The Cloudinary URL of the uploaded file, or None on failure
     """
     if not file or not file.filename:
         return None
+    
+    if max_dimension:
+        file = downscale_photo(file, max_dimension, quality)
         
     if CLOUDINARY_CONFIGURED:
         return upload_to_cloudinary(file, 'laari/artefatos')
@@ -242,7 +314,7 @@ def generate_qr_code_image(qr_code_string, artifact_id):
             img_buffer.seek(0)
             
             public_id = f"laari/qrcodes/qrcode_{artifact_id}"
-            result = cloudinary.uploader.upload(
+            result = get_cloudinary_uploader().upload(
                 img_buffer,
                 public_id=public_id,
                 resource_type="image",
@@ -333,7 +405,7 @@ def delete_file(storage_key):
                 public_id = extract_public_id_from_url(storage_key)
                 if public_id:
                     try:
-                        result = cloudinary.uploader.destroy(public_id)
+                        result = get_cloudinary_uploader().destroy(public_id)
                         logger.info(f"File deleted from Cloudinary: {public_id}, result: {result}")
                     except Exception as cloud_err:
                         logger.warning(f"Cloudinary deletion failed for {public_id}: {str(cloud_err)}")
@@ -440,6 +512,198 @@ def get_image_url(path, default=None):
     return default
 
 
+# Display context -> maximum width in pixels
+IMAGE_SIZES = {
+    'thumb': 320,   # Admin lists, professional avatars
+    'card': 640,    # Gallery, acervo and catalog cards
+    'detail': 1280, # Modals and detail pages
+}
+
+# Local resize endpoint (routes.resized_image), same contract as the Cloudinary transformation
+RESIZED_IMAGE_URL = '/imagem/{size}/{path}'
+RESIZED_IMAGE_QUALITY = 80
+
+# Formats re-encoded by the local resizer; others (e.g. animated GIF) are served as stored
+RESIZABLE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp'}
+
+
+def cloudinary_transform_url(url, size):
+    """
+    Add a width-limited, automatic format/quality transformation to a Cloudinary delivery URL.
+
+    Args:
+        url: Cloudinary secure_url as stored at upload time
+        size: Key of IMAGE_SIZES
+
+    Returns:
+        str: URL delivering at most IMAGE_SIZES[size] pixels wide, as WebP/AVIF where supported
+    """
+    marker = '/upload/'
+    if marker not in url:
+        return url
+    prefix, rest = url.split(marker, 1)
+    transformation = f'c_limit,w_{IMAGE_SIZES[size]},f_auto,q_auto'
+    # URLs stored at upload time start with the version (v123...) or the public id
+    first_segment = rest.split('/', 1)[0]
+    if ',' in first_segment or first_segment.startswith(('w_', 'c_', 'f_', 'q_')):
+        return url
+    return f'{prefix}{marker}{transformation}/{rest}'
+
+
+def resized_display_url(url, size):
+    """
+    Rewrite an already resolved display URL (see get_image_url) for a display context.
+
+    Cloudinary images get a URL transformation; local uploads are routed through
+    the resize-and-cache endpoint (RESIZED_IMAGE_URL). Other URLs (placeholders,
+    external links, animated GIFs) are returned unchanged.
+
+    Args:
+        url: Display URL of the original image
+        size: Key of IMAGE_SIZES
+
+    Returns:
+        str: The URL to display the scaled-down image
+    """
+    if not url or size not in IMAGE_SIZES:
+        return url
+    if is_cloudinary_url(url):
+        return cloudinary_transform_url(url, size)
+    if url.startswith('/uploads/') and url.rsplit('.', 1)[-1].lower() in RESIZABLE_EXTENSIONS:
+        return RESIZED_IMAGE_URL.format(size=size, path=url.lstrip('/'))
+    return url
+
+
+def get_resized_image_url(path, size, default=None):
+    """
+    Get the display URL for an image scaled down for a display context.
+
+    Args:
+        path: The stored path/URL
+        size: Key of IMAGE_SIZES ('thumb', 'card' or 'detail')
+        default: Default image to return if path is invalid (uses SVG placeholder if None)
+
+    Returns:
+        str: The URL to display the image
+    """
+    return resized_display_url(get_image_url(path, default), size)
+
+
+def resize_local_image(path, size, webp=True):
+    """
+    Resize a local image for a display context, caching the result on disk.
+
+    The cache key includes the source modification time, so a replaced file is
+    resized again. Images narrower than the target width are only re-encoded.
+
+    Args:
+        path: Relative path of the source image under uploads/
+        size: Key of IMAGE_SIZES
+        webp: Encode as WebP (client accepts it); otherwise keep JPEG/PNG
+
+    Returns:
+        tuple: (cache file path, MIME type), or None if the source is not a resizable local image
+    """
+    if size not in IMAGE_SIZES or not os.path.isfile(path):
+        return None
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+    if extension not in RESIZABLE_EXTENSIONS:
+        return None
+
+    output_format = 'webp' if webp else ('png' if extension == 'png' else 'jpeg')
+    stat = os.stat(path)
+    key = hashlib.sha1(f'{path}:{stat.st_mtime_ns}:{stat.st_size}'.encode()).hexdigest()
+    cache_path = os.path.join(RESIZED_FOLDER, size, f'{key}.{output_format}')
+    mimetype = f'image/{output_format}'
+
+    if os.path.exists(cache_path):
+        return cache_path, mimetype
+
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        width = IMAGE_SIZES[size]
+        if image.width > width:
+            image.thumbnail((width, width * 10), Image.LANCZOS)
+        if output_format == 'jpeg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Written under a temporary name so concurrent requests never serve a partial file
+        temp_path = f'{cache_path}.{uuid.uuid4().hex}.tmp'
+        image.save(temp_path, format=output_format.upper(), quality=RESIZED_IMAGE_QUALITY, optimize=True)
+        os.replace(temp_path, cache_path)
+
+    return cache_path, mimetype
+
+
+# Low-quality image placeholders (LQIP) stored with the row and inlined as a data URI
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_QUALITY = 50
+
+
+def image_placeholder(source):
+    """
+    Build a tiny blurred-preview JPEG of an image as a data URI (a few hundred bytes).
+
+    Args:
+        source: FileStorage/file object (its position is restored) or a local path
+
+    Returns:
+        str: data:image/jpeg;base64,... or None if the source is not a readable image
+    """
+    if not source:
+        return None
+    try:
+        import base64
+        import io
+        from PIL import Image, ImageOps
+
+        stream = source.stream if hasattr(source, 'stream') else source
+        position = stream.tell() if hasattr(stream, 'tell') else None
+        try:
+            with Image.open(stream) as image:
+                image.draft('RGB', (PLACEHOLDER_WIDTH * 8, PLACEHOLDER_WIDTH * 8))  # Fast JPEG decode at reduced scale
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4))
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                buffer = io.BytesIO()
+                image.save(buffer, format='JPEG', quality=PLACEHOLDER_QUALITY, optimize=True)
+        finally:
+            if position is not None:
+                stream.seek(position)
+        return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+    except Exception as e:
+        logger.warning(f"Could not build image placeholder: {str(e)}")
+        return None
+
+
+def stored_image_placeholder(path):
+    """
+    Build the placeholder for an image that is already in storage (used by backfills).
+
+    Cloudinary images are fetched through a small thumbnail transformation.
+
+    Args:
+        path: The stored path/URL
+
+    Returns:
+        str: data URI, or None if the image is unavailable
+    """
+    if not path:
+        return None
+    if is_cloudinary_url(path):
+        import io
+        content = download_file(cloudinary_transform_url(path, 'thumb'))
+        return image_placeholder(io.BytesIO(content)) if content else None
+    if path.startswith('http') or not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        return image_placeholder(f)
+
+
 def validate_image_url(url):
     """
     Validate if an image URL is accessible.
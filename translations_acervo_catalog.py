@@ -78,6 +78,7 @@ ACERVO_CATALOG_TRANSLATIONS = {
         'Ex: 1.5m, 150cm': 'E.g.: 1.5m, 150cm',
         'Ex: Nível III, Camada A': 'E.g.: Level III, Layer A',
         'Ex: -23.5505, -46.6333': 'E.g.: -23.5505, -46.6333',
+        'Exportar': 'Export',
     },
     'es': {
         'Consulte todos os artefatos catalogados no sistema L.A.A.R.I': 'Consulte todos los artefactos catalogados en el sistema L.A.A.R.I',
@@ -158,6 +159,7 @@ ACERVO_CATALOG_TRANSLATIONS = {
         'Ex: 1.5m, 150cm': 'Ej.: 1.5m, 150cm',
         'Ex: Nível III, Camada A': 'Ej.: Nivel III, Capa A',
         'Ex: -23.5505, -46.6333': 'Ej.: -23.5505, -46.6333',
+        'Exportar': 'Exportar',
     },
     'fr': {
         'Consulte todos os artefatos catalogados no sistema L.A.A.R.I': 'Consultez tous les artefacts catalogués dans le système L.A.A.R.I',
@@ -238,5 +240,6 @@ ACERVO_CATALOG_TRANSLATIONS = {
         'Ex: 1.5m, 150cm': 'Ex: 1.5m, 150cm',
         'Ex: Nível III, Camada A': 'Ex: Niveau III, Couche A',
         'Ex: -23.5505, -46.6333': 'Ex: -23.5505, -46.6333',
+        'Exportar': 'Exporter',
     }
 }
@@ -0,0 +1,233 @@
+"""
+Queries behind the /admin user management page.
+Filtering, search and pagination happen in SQL: the user table is paged with a
+keyset cursor on id, and the pending CV/institution queues are separate queries
+served by the (account_type, cv_status) and (account_type, institution_status)
+indexes. Only the columns each table displays are loaded.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.orm import load_only
+
+from app import db
+from models import User
+
+USERS_PAGE_SIZE = 50
+PENDING_QUEUE_LIMIT = 100
+
+PENDING_STATUS = 'Em análise'
+
+# ?filter= presets of the status buttons -> review status
+STATUS_PRESETS = {
+    'aprovados': 'Aprovado',
+    'pendentes': 'Em análise',
+    'rejeitados': 'Rejeitado',
+}
+
+ACCOUNT_TYPES = ['profissional', 'universitaria', 'estudante']
+REVIEW_STATUSES = ['Em análise', 'Aprovado', 'Rejeitado']
+
+# Review kind -> (account type, status/reviewed_at/reviewed_by/rejection_reason columns, default reason)
+REVIEW_KINDS = {
+    'cv': ('profissional', 'cv_status', 'cv_reviewed_at', 'cv_reviewed_by', 'cv_rejection_reason',
+           'Currículo não atende aos requisitos.'),
+    'instituicao': ('universitaria', 'institution_status', 'institution_reviewed_at', 'institution_reviewed_by',
+                    'institution_rejection_reason', 'Dados institucionais não foram verificados.'),
+}
+
+# Keeps id IN (...) lists well below SQLite's bound-parameter limit
+BULK_REVIEW_MAX_USERS = 500
+
+USER_LIST_COLUMNS = (User.id, User.username, User.email, User.created_at, User.is_active_user,
+                     User.is_admin, User.account_type, User.cv_status, User.institution_status)
+
+PENDING_CV_COLUMNS = (User.id, User.username, User.email, User.created_at, User.lattes_url)
+
+PENDING_INSTITUTION_COLUMNS = (User.id, User.username, User.institution_name, User.institution_cnpj,
+                               User.institution_responsible_name, User.institution_contact_email,
+                               User.city, User.state, User.country)
+
+
+def review_status_condition(status):
+    """
+    SQL condition for a user's effective review status.
+
+    Professionals are reviewed through cv_status and institutions through
+    institution_status; every other account counts as approved.
+    """
+    condition = or_(
+        and_(User.account_type == 'profissional', User.cv_status == status),
+        and_(User.account_type == 'universitaria', User.institution_status == status)
+    )
+    if status == 'Aprovado':
+        condition = or_(
+            condition,
+            User.account_type.is_(None),
+            User.account_type.notin_(['profissional', 'universitaria'])
+        )
+    return condition
+
+
+def parse_user_filters(args):
+    """
+    Read the admin filters from the query string, ignoring unknown values.
+
+    Returns:
+        Dict with filter, q, tipo, cv_status, institution_status and ativo
+    """
+    active = args.get('ativo', '')
+    return {
+        'filter': args.get('filter', '') if args.get('filter') in STATUS_PRESETS else '',
+        'q': args.get('q', '').strip()[:100],
+        'tipo': args.get('tipo', '') if args.get('tipo') in ACCOUNT_TYPES else '',
+        'cv_status': args.get('cv_status', '') if args.get('cv_status') in REVIEW_STATUSES else '',
+        'institution_status': args.get('institution_status', '') if args.get('institution_status') in REVIEW_STATUSES else '',
+        'ativo': active if active in ('1', '0') else '',
+    }
+
+
+def user_filter_conditions(filters):
+    """
+    SQL conditions for the admin filters, shared by the user list and the export.
+
+    Args:
+        filters: Dict from parse_user_filters
+
+    Returns:
+        List of SQL conditions
+    """
+    conditions = []
+    if filters['filter']:
+        conditions.append(review_status_condition(STATUS_PRESETS[filters['filter']]))
+    if filters['tipo']:
+        conditions.append(User.account_type == filters['tipo'])
+    if filters['cv_status']:
+        conditions.append(User.cv_status == filters['cv_status'])
+    if filters['institution_status']:
+        conditions.append(User.institution_status == filters['institution_status'])
+    if filters['ativo']:
+        conditions.append(User.is_active_user == (filters['ativo'] == '1'))
+    if filters['q']:
+        pattern = f"%{filters['q']}%"
+        conditions.append(or_(User.username.ilike(pattern), User.email.ilike(pattern)))
+    return conditions
+
+
+def _filtered_query(filters):
+    return User.query.options(load_only(*USER_LIST_COLUMNS)).filter(*user_filter_conditions(filters))
+
+
+def search_users(filters, after=None, before=None, page_size=USERS_PAGE_SIZE):
+    """
+    One keyset page of users matching the filters, ordered by id.
+
+    Args:
+        filters: Dict from parse_user_filters
+        after: Return users with id greater than this (next page)
+        before: Return users with id lower than this (previous page)
+        page_size: Users per page
+
+    Returns:
+        Tuple (users, next_after, prev_before); the cursors are None at either end
+    """
+    query = _filtered_query(filters)
+
+    if before is not None:
+        rows = query.filter(User.id < before).order_by(User.id.desc()).limit(page_size + 1).all()
+        has_previous = len(rows) > page_size
+        users = list(reversed(rows[:page_size]))
+        has_next = True
+    else:
+        if after is not None:
+            query = query.filter(User.id > after)
+        rows = query.order_by(User.id).limit(page_size + 1).all()
+        has_next = len(rows) > page_size
+        users = rows[:page_size]
+        has_previous = after is not None
+
+    next_after = users[-1].id if users and has_next else None
+    prev_before = users[0].id if users and has_previous else None
+    return users, next_after, prev_before
+
+
+def user_counts():
+    """
+    Totals for the admin statistics cards in a single aggregate query.
+
+    Returns:
+        Dict with total, active, inactive and admins
+    """
+    row = db.session.execute(
+        db.select(
+            func.count(User.id).label('total'),
+            func.count(case((User.is_active_user == True, 1))).label('active'),
+            func.count(case((User.is_admin == True, 1))).label('admins'),
+        )
+    ).one()
+    return {'total': row.total, 'active': row.active, 'inactive': row.total - row.active, 'admins': row.admins}
+
+
+def pending_cv_reviews(limit=PENDING_QUEUE_LIMIT):
+    """
+    Professional accounts waiting for CV review, oldest first.
+
+    Returns:
+        Tuple (users, total pending)
+    """
+    condition = and_(User.account_type == 'profissional', User.cv_status == PENDING_STATUS)
+    total = db.session.execute(db.select(func.count(User.id)).where(condition)).scalar()
+    users = User.query.options(load_only(*PENDING_CV_COLUMNS)).filter(condition).order_by(User.id).limit(limit).all()
+    return users, total
+
+
+def pending_institution_reviews(limit=PENDING_QUEUE_LIMIT):
+    """
+    University accounts waiting for institution review, oldest first.
+
+    Returns:
+        Tuple (users, total pending)
+    """
+    condition = and_(User.account_type == 'universitaria', User.institution_status == PENDING_STATUS)
+    total = db.session.execute(db.select(func.count(User.id)).where(condition)).scalar()
+    users = User.query.options(load_only(*PENDING_INSTITUTION_COLUMNS)).filter(condition).order_by(User.id).limit(limit).all()
+    return users, total
+
+
+def bulk_review(kind, action, user_ids, reviewer_id, reason=None):
+    """
+    Approve or reject many CV/institution reviews with a single UPDATE.
+
+    Mirrors validate_cv/validate_institution: the reviewer and timestamp are
+    recorded, approval clears the rejection reason and rejection deactivates the
+    account. Users of a different account type are left untouched. The caller
+    commits and invalidates cached identities.
+
+    Args:
+        kind: 'cv' or 'instituicao'
+        action: 'approve' or 'reject'
+        user_ids: Ids of the selected users (at most BULK_REVIEW_MAX_USERS)
+        reviewer_id: Id of the admin performing the review
+        reason: Rejection reason (defaults to the single-review default)
+
+    Returns:
+        List of ids that were updated
+    """
+    account_type, status_col, reviewed_at_col, reviewed_by_col, reason_col, default_reason = REVIEW_KINDS[kind]
+
+    values = {
+        status_col: 'Aprovado' if action == 'approve' else 'Rejeitado',
+        reviewed_at_col: datetime.utcnow(),
+        reviewed_by_col: reviewer_id,
+        reason_col: None if action == 'approve' else (reason or default_reason),
+    }
+    if action == 'reject':
+        values['is_active_user'] = False  # Rejected accounts are deactivated
+
+    return db.session.execute(
+        db.update(User)
+        .where(User.id.in_(user_ids), User.account_type == account_type)
+        .values(**values)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()